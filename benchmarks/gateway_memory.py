@@ -0,0 +1,171 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Measures how much memory pycord's caches hold after logging in to a large guild, in the full and the lean gateway mode
+(see ``bot.gateway.gateway_options``).
+
+A synthetic READY payload and GUILD_CREATE for a guild with many members, presences and channels is replayed through
+pycord's own parser, followed by a stream of MESSAGE_CREATE events, and the memory still allocated afterwards is
+measured with tracemalloc. The same payloads are replayed in both modes, so the members and presences stand in for
+what chunking at startup would load in the full mode. Run ``python -m benchmarks.gateway_memory``.
+"""
+import argparse
+import asyncio
+import gc
+import tracemalloc
+from typing import Any
+
+import discord
+
+from bot.gateway import gateway_options
+
+BOT_ID = 1_000_000
+GUILD_ID = 2_000_000
+
+
+def user(user_id: int) -> dict[str, Any]:
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None, "global_name": None}
+
+
+def guild_create(members: int, channels: int) -> dict[str, Any]:
+    member_ids = [BOT_ID] + [10_000_000 + n for n in range(members)]
+    return {
+        "id": str(GUILD_ID),
+        "name": "Large Guild",
+        "icon": None,
+        "owner_id": str(member_ids[1]),
+        "region": "us-east",
+        "afk_timeout": 300,
+        "verification_level": 1,
+        "default_message_notifications": 1,
+        "explicit_content_filter": 0,
+        "features": [],
+        "mfa_level": 0,
+        "premium_tier": 0,
+        "preferred_locale": "en-US",
+        "large": True,
+        "member_count": len(member_ids),
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "roles": [{
+            "id": str(GUILD_ID),
+            "name": "@everyone",
+            "permissions": "1071698660929",
+            "position": 0,
+            "color": 0,
+            "colors": {"primary_color": 0, "secondary_color": None, "tertiary_color": None},
+            "hoist": False,
+            "managed": False,
+            "mentionable": False,
+        }],
+        "emojis": [],
+        "stickers": [],
+        "channels": [
+            {"id": str(3_000_000 + n), "type": 0, "name": f"channel-{n}", "position": n, "permission_overwrites": []}
+            for n in range(channels)
+        ],
+        "threads": [],
+        "voice_states": [],
+        "members": [
+            {"user": user(member_id), "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False,
+             "mute": False, "flags": 0}
+            for member_id in member_ids
+        ],
+        "presences": [
+            {"user": {"id": str(member_id)}, "status": "online", "activities": [],
+             "client_status": {"desktop": "online"}}
+            for member_id in member_ids[1::2]
+        ],
+    }
+
+
+def message_create(n: int, channels: int, members: int) -> dict[str, Any]:
+    author = 10_000_000 + n % members
+    return {
+        "id": str(4_000_000 + n),
+        "type": 0,
+        "channel_id": str(3_000_000 + n % channels),
+        "guild_id": str(GUILD_ID),
+        "author": user(author),
+        "member": {"roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0},
+        "content": f"message {n} " + "x" * 80,
+        "timestamp": "2024-01-01T00:00:00+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+    }
+
+
+async def replay(lean: bool, members: int, channels: int, messages: int) -> tuple[int, dict[str, int]]:
+    """
+    Replays the payloads through a fresh client, and returns the memory held afterwards and the size of each cache.
+    """
+    payloads = guild_create(members, channels), [message_create(n, channels, members) for n in range(messages)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    client = discord.Client(**gateway_options(lean))
+    state = client._connection  # pylint: disable=protected-access
+    state.parse_ready({
+        "v": 10,
+        "user": user(BOT_ID) | {"bot": True},
+        "guilds": [{"id": str(GUILD_ID), "unavailable": True}],
+        "session_id": "benchmark",
+        "application": {"id": str(BOT_ID), "flags": 0},
+    })
+    # Nothing is connected, so don't let the client finish logging in
+    state._ready_task.cancel()  # pylint: disable=protected-access
+    state.parse_guild_create(payloads[0])
+    for message in payloads[1]:
+        state.parse_message_create(message)
+    del payloads
+    gc.collect()
+
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    held = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    guild = client.get_guild(GUILD_ID)
+    caches = {
+        "members": len(guild.members) if guild is not None else 0,
+        "presences": sum(member.status is not discord.Status.offline for member in guild.members) if guild else 0,
+        "messages": len(client.cached_messages),
+    }
+    return held, caches
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=50_000, help="Members of the synthetic guild")
+    parser.add_argument("--channels", type=int, default=200, help="Text channels of the synthetic guild")
+    parser.add_argument("--messages", type=int, default=5_000, help="Messages to replay after logging in")
+    args = parser.parse_args()
+
+    print(f"Guild with {args.members:,} members and {args.channels} channels, then {args.messages:,} messages")
+    results = {}
+    for mode, lean in (("full", False), ("lean", True)):
+        held, caches = results[mode] = await replay(lean, args.members, args.channels, args.messages)
+        print(f"{mode:>5}: {held / 2 ** 20:7.1f} MiB held, " + ", ".join(f"{n:,} {name}" for name, n in caches.items()))
+    print(f"Lean mode holds {1 - results["lean"][0] / results["full"][0]:.0%} less memory")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
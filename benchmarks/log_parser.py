@@ -0,0 +1,135 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Replays a recorded hunter log through the log parsing pipeline and reports how much faster than real time it runs.
+
+Record a log with ``docker logs --timestamps hunter_bot_container > hunter.log``, then run
+``python -m benchmarks.log_parser hunter.log``. Without a file, a synthetic log is generated instead.
+"""
+import argparse
+import collections
+import datetime
+import io
+import random
+import time
+from collections.abc import Iterator
+
+from bot.logs import EventStore, iter_lines, parse_events, split_timestamps
+
+CHUNK_SIZE = 64 * 1024
+
+
+def synthesize(hours: float, lines_per_second: float, seed: int = 0) -> bytes:
+    """
+    Generates a log in the format of ``docker logs --timestamps``, with a realistic mix of noise and events.
+
+    Parameters
+    ----------
+    hours: float
+        The duration the log should cover.
+    lines_per_second: float
+        The average number of lines per second.
+    seed: int
+        The random seed.
+
+    Returns
+    -------
+    bytes
+        The log.
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 3, 1, tzinfo=datetime.timezone.utc)
+    callsigns = [f"OPFOR{i}" for i in range(10)]
+    templates = (
+        (80, lambda: f"INFO - Updating position of {rng.choice(('tank', 'ship', 'sam'))}_{rng.randrange(50)}"),
+        (10, lambda: f"DEBUG - MP packet from {rng.choice(callsigns)} ({rng.randrange(2000)} bytes)"),
+        (3, lambda: f"INFO - Spawned asset: {rng.choice(('tank', 'ship', 'sam'))}_{rng.randrange(50)}"),
+        (3, lambda: f"INFO - {rng.choice(('tank', 'ship', 'sam'))}_{rng.randrange(50)} was destroyed"),
+        (2, lambda: f"INFO - Client {rng.choice(callsigns)} connected"),
+        (2, lambda: f"INFO - Client {rng.choice(callsigns)} disconnected"),
+    )
+    weights = [weight for weight, _ in templates]
+    out = io.StringIO()
+    now = 0.0
+    out.write(f"{start.isoformat().replace('+00:00', 'Z')} INFO - Scenario 'nevada' loaded\n")
+    while now < hours * 3600:
+        now += rng.expovariate(lines_per_second)
+        stamp = (start + datetime.timedelta(seconds=now)).strftime("%Y-%m-%dT%H:%M:%S.%f") + "123Z"
+        if rng.random() < 0.0005:
+            for line in (
+                    "Traceback (most recent call last):",
+                    '  File "/hunter/hunter/mp_targets.py", line 512, in run',
+                    "    self._update()",
+                    "KeyError: 'position'",
+            ):
+                out.write(f"{stamp} {line}\n")
+            continue
+        out.write(f"{stamp} {rng.choices(templates, weights)[0][1]()}\n")
+    return out.getvalue().encode()
+
+
+def chunks(data: bytes) -> Iterator[bytes]:
+    """
+    Splits data into chunks the size of a typical docker log stream read.
+    """
+    for i in range(0, len(data), CHUNK_SIZE):
+        yield data[i:i + CHUNK_SIZE]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", nargs="?", help="A log recorded with `docker logs --timestamps`")
+    parser.add_argument("--hours", type=float, default=6, help="Duration of the synthetic log")
+    parser.add_argument("--rate", type=float, default=20, help="Lines per second of the synthetic log")
+    args = parser.parse_args()
+
+    if args.log is not None:
+        with open(args.log, "rb") as f:
+            data = f.read()
+    else:
+        data = synthesize(args.hours, args.rate)
+
+    store = EventStore()
+    first = last = None
+    line_count = 0
+
+    def count_lines(lines):
+        nonlocal first, last, line_count
+        for line in lines:
+            line_count += 1
+            if line.timestamp is not None:
+                first = line.timestamp if first is None else first
+                last = line.timestamp
+            yield line
+
+    start = time.perf_counter()
+    for event in parse_events(count_lines(split_timestamps(iter_lines(chunks(data))))):
+        store.add(event)
+    elapsed = time.perf_counter() - start
+
+    kinds = collections.Counter(event.kind for event in store.find())
+    print(f"Parsed {line_count:,} lines ({len(data) / 2 ** 20:.1f} MiB) in {elapsed:.3f}s")
+    print(f"Throughput: {line_count / elapsed:,.0f} lines/s, {len(data) / 2 ** 20 / elapsed:.1f} MiB/s")
+    if first is not None and last is not None and last > first:
+        duration = datetime.timedelta(seconds=round(last - first))
+        print(f"Log covers {duration}, replayed at {(last - first) / elapsed:,.0f}x real time")
+    for kind, count in sorted(kinds.items()):
+        print(f"  {kind}: {count:,}")
+
+
+if __name__ == "__main__":
+    main()
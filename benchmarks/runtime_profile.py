@@ -0,0 +1,128 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Compares the runtime profiles of ``bot.runtime`` on gateway event dispatch.
+
+Each profile runs in its own interpreter, since the loop policy and GC settings are process-wide. The process first
+loads a large guild into pycord's caches, standing in for the long-lived state of a running bot, and then replays
+MESSAGE_CREATE events through pycord's parser, each of which is dispatched to an ``on_message`` listener. It reports
+the dispatch throughput and the distribution of garbage collector pauses. Run ``python -m benchmarks.runtime_profile``.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import discord
+
+from benchmarks.gateway_memory import BOT_ID, GUILD_ID, guild_create, message_create, user
+from bot.gateway import gateway_options
+from bot.runtime import PROFILES, RuntimeProfile, configure_loop, freeze, install
+
+
+async def dispatch(profile: RuntimeProfile, members: int, messages: int) -> dict[str, float]:
+    configure_loop(profile)
+    client = discord.Client(**gateway_options(lean=False, max_messages=1000))
+    state = client._connection  # pylint: disable=protected-access
+    state.parse_ready({
+        "v": 10,
+        "user": user(BOT_ID) | {"bot": True},
+        "guilds": [{"id": str(GUILD_ID), "unavailable": True}],
+        "session_id": "benchmark",
+        "application": {"id": str(BOT_ID), "flags": 0},
+    })
+    state._ready_task.cancel()  # pylint: disable=protected-access
+    state.parse_guild_create(guild_create(members, channels=50))
+    freeze(profile)
+
+    handled = 0
+    done = asyncio.Event()
+
+    @client.event
+    async def on_message(message: discord.Message) -> None:
+        nonlocal handled
+        handled += 1
+        if handled == messages:
+            done.set()
+
+    payloads = [message_create(n, 50, members) for n in range(messages)]
+    pauses: list[float] = []
+    started = 0.0
+
+    def on_gc(phase: str, _info: dict[str, int]) -> None:
+        nonlocal started
+        if phase == "start":
+            started = time.perf_counter()
+        else:
+            pauses.append((time.perf_counter() - started) * 1000)
+
+    gc.callbacks.append(on_gc)
+    start = time.perf_counter()
+    for n, payload in enumerate(payloads):
+        state.parse_message_create(payload)
+        # Let the loop run, as it would between gateway frames
+        if n % 100 == 99:
+            await asyncio.sleep(0)
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    gc.callbacks.remove(on_gc)
+
+    return {
+        "loop": type(asyncio.get_running_loop()).__module__.split(".")[0],
+        "throughput": messages / elapsed,
+        "collections": len(pauses),
+        "pause_p50": statistics.median(pauses) if pauses else 0.0,
+        "pause_p99": statistics.quantiles(pauses, n=100, method="inclusive")[98] if len(pauses) > 1 else
+        max(pauses, default=0.0),
+        "pause_max": max(pauses, default=0.0),
+        "pause_total": sum(pauses),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=50_000, help="Members of the cached guild")
+    parser.add_argument("--messages", type=int, default=50_000, help="Messages to dispatch")
+    parser.add_argument("--profile", choices=PROFILES, help="Run a single profile and print the results as JSON")
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        profile = PROFILES[args.profile]
+        install(profile)
+        print(json.dumps(asyncio.run(dispatch(profile, args.members, args.messages))))
+        return
+
+    print(f"{args.messages:,} messages dispatched with {args.members:,} cached members")
+    print(f"{"profile":>8} {"loop":>8} {"msg/s":>9} {"GCs":>5} {"p50 ms":>7} {"p99 ms":>7} {"max ms":>7} "
+          f"{"total ms":>9}")
+    for name in PROFILES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.runtime_profile", "--profile", name,
+             "--members", str(args.members), "--messages", str(args.messages)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(output.splitlines()[-1])
+        print(f"{name:>8} {r["loop"]:>8} {r["throughput"]:>9,.0f} {r["collections"]:>5} {r["pause_p50"]:>7.2f} "
+              f"{r["pause_p99"]:>7.2f} {r["pause_max"]:>7.2f} {r["pause_total"]:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
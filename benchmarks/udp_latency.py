@@ -0,0 +1,132 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Compares UDP round trip latency of a direct path, like hunter on the host network, with a path through a userland
+relay, an approximation of Docker's userland proxy in front of a published port on the bridge network.
+
+Everything runs on the loopback interface: a UDP echo server stands in for hunter, and the relay forwards each datagram
+to it from a per-client socket, the way docker-proxy does. The relay is a threaded Python relay rather than
+docker-proxy, and Docker's NAT isn't involved at all, so the numbers only show the order of the overhead. Run
+``python -m benchmarks.udp_latency``.
+"""
+import argparse
+import socket
+import statistics
+import threading
+import time
+
+
+def echo_server(sock: socket.socket, stop: threading.Event) -> None:
+    """
+    Sends every datagram back to where it came from.
+    """
+    sock.settimeout(0.2)
+    while not stop.is_set():
+        try:
+            data, address = sock.recvfrom(65535)
+        except TimeoutError:
+            continue
+        sock.sendto(data, address)
+
+
+def relay(sock: socket.socket, target: tuple[str, int], stop: threading.Event) -> None:
+    """
+    Forwards datagrams to a target and relays the replies, with one upstream socket per client.
+    """
+    sock.settimeout(0.2)
+    upstreams: dict[tuple[str, int], socket.socket] = {}
+
+    def pump(upstream: socket.socket, client: tuple[str, int]) -> None:
+        upstream.settimeout(0.2)
+        while not stop.is_set():
+            try:
+                data = upstream.recv(65535)
+            except TimeoutError:
+                continue
+            sock.sendto(data, client)
+
+    while not stop.is_set():
+        try:
+            data, client = sock.recvfrom(65535)
+        except TimeoutError:
+            continue
+        if (upstream := upstreams.get(client)) is None:
+            upstream = upstreams[client] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            upstream.connect(target)
+            threading.Thread(target=pump, args=(upstream, client), daemon=True).start()
+        upstream.send(data)
+
+
+def measure(address: tuple[str, int], count: int, size: int) -> list[float]:
+    """
+    Sends datagrams one at a time and returns the round trip time of each, in microseconds.
+    """
+    payload = b"x" * size
+    rtts = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(1)
+        sock.connect(address)
+        for _ in range(count):
+            start = time.perf_counter_ns()
+            sock.send(payload)
+            sock.recv(65535)
+            rtts.append((time.perf_counter_ns() - start) / 1000)
+    return rtts
+
+
+def bind() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+def report(name: str, rtts: list[float]) -> float:
+    quantiles = statistics.quantiles(rtts, n=100)
+    median = statistics.median(rtts)
+    print(f"{name:>8}: p50 {median:7.1f}us  p90 {quantiles[89]:7.1f}us  p99 {quantiles[98]:7.1f}us")
+    return median
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20_000, help="Datagrams per path")
+    parser.add_argument("--size", type=int, default=200, help="Datagram size in bytes, MP packets are a few hundred")
+    parser.add_argument("--warmup", type=int, default=1_000, help="Datagrams to send before measuring")
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    server = bind()
+    proxy = bind()
+    threading.Thread(target=echo_server, args=(server, stop), daemon=True).start()
+    threading.Thread(target=relay, args=(proxy, server.getsockname(), stop), daemon=True).start()
+
+    try:
+        measure(server.getsockname(), args.warmup, args.size)
+        measure(proxy.getsockname(), args.warmup, args.size)
+        print(f"{args.count:,} round trips of {args.size} bytes")
+        direct = report("direct", measure(server.getsockname(), args.count, args.size))
+        relayed = report("relay", measure(proxy.getsockname(), args.count, args.size))
+        print(
+            f"The userland relay (an approximation of bridge networking) adds {relayed - direct:.1f}us "
+            f"({relayed / direct:.2f}x) per round trip at the median"
+        )
+    finally:
+        stop.set()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import io
+import os
+import time
+
+import discord
+import humanize
+from discord import ApplicationContext, SlashCommandGroup, option
+from discord.ext import commands
+from discord.ext.commands import Cog
+
+from ..core import Bot
+from ..profiler import allocation_growth, profile_stacks
+from ..utils import embed
+
+
+class Debug(Cog):
+    """Commands for diagnosing the bot"""
+
+    debug_group = SlashCommandGroup("debug", "Diagnose the bot")
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+
+    @debug_group.command()
+    @commands.is_owner()
+    @option("minutes", description="The period to count errors in", required=False, min_value=1, max_value=24 * 60)
+    async def errors(self, ctx: ApplicationContext, minutes: int = 60):
+        """
+        Show the most frequent unexpected errors.
+
+        Parameters
+        ----------
+        ctx: Ctx
+            The context of the command.
+        minutes: int
+            The period to count errors in.
+        """
+        top = self.bot.errors.top(limit=10, period=minutes * 60)
+        em = embed(title=f"Top errors of the last {minutes} minutes")
+        if not top:
+            em.description = "No errors"
+        for stats in top:
+            em.add_field(
+                name=f"{stats.name} ({stats.recent}, {stats.recent / minutes:.2f}/min)",
+                value=f"`{os.path.relpath(stats.location)}`\n"
+                      f"{discord.utils.escape_markdown(stats.message[:200]) or "*No message*"}\n"
+                      f"Total: `{stats.total}`, last {discord.utils.format_dt(stats.last_seen, "R")}",
+                inline=False,
+            )
+        await ctx.respond(embed=em, ephemeral=True)
+
+    @debug_group.command()
+    @commands.is_owner()
+    async def outbound(self, ctx: ApplicationContext):
+        """
+        Show the state of the outbound message queue.
+
+        Parameters
+        ----------
+        ctx: Ctx
+            The context of the command.
+        """
+        outbound = self.bot.outbound
+        wait_time = outbound.wait_time
+        em = embed(title="Outbound Messages")
+        em.add_field(name="Queued", value=f"`{outbound.depth}` in `{outbound.lanes}` queues")
+        em.add_field(name="Deepest Queue", value=f"`{outbound.max_depth}`")
+        em.add_field(name="Requests", value=f"`{outbound.requests}`")
+        em.add_field(name="Merged Edits", value=f"`{outbound.merged}`")
+        em.add_field(name="Rate Limited", value=f"`{outbound.rate_limited}`")
+        if wait_time.count():
+            em.add_field(
+                name="Queue Wait",
+                value=f"p50 `{wait_time.quantile(0.5):.2f}`s, p95 `{wait_time.quantile(0.95):.2f}`s",
+            )
+        await ctx.respond(embed=em, ephemeral=True)
+
+    @debug_group.command()
+    @commands.is_owner()
+    async def throttled(self, ctx: ApplicationContext):
+        """
+        Show how often commands were rejected by the rate limiter.
+
+        Parameters
+        ----------
+        ctx: Ctx
+            The context of the command.
+        """
+        limiter = self.bot.rate_limiter
+        em = embed(title="Throttled Commands", description=f"`{len(limiter)}` active buckets")
+        for (action, scope), count in sorted(limiter.throttled.items(), key=lambda item: item[1], reverse=True)[:25]:
+            em.add_field(name=f"/{action}", value=f"`{count:.0f}` by the {scope} limit")
+        await ctx.respond(embed=em, ephemeral=True)
+
+    @debug_group.command()
+    @commands.is_owner()
+    async def edits(self, ctx: ApplicationContext):
+        """
+        Show how many message edits were skipped instead of processed as commands.
+
+        Parameters
+        ----------
+        ctx: Ctx
+            The context of the command.
+        """
+        edits = self.bot.listeners.edits
+        em = embed(title="Edited Messages")
+        em.add_field(name="Processed", value=f"`{edits.processed}`")
+        for (reason,), count in edits.skipped.items():
+            em.add_field(name=f"Skipped: {reason.capitalize()}", value=f"`{count:.0f}`")
+        await ctx.respond(embed=em, ephemeral=True)
+
+    @debug_group.command()
+    @commands.is_owner()
+    async def reload(self, ctx: ApplicationContext):
+        """
+        Reload the modules that changed since they were loaded, and the modules that import them.
+
+        Parameters
+        ----------
+        ctx: Ctx
+            The context of the command.
+        """
+        result = await self.bot.reloader.reload()
+        em = embed(
+            title="Reload Failed" if result.error else "Reloaded",
+            description=f"`{len(result.reloaded)}` modules in `{result.elapsed * 1000:.0f}`ms, "
+                        f"`{result.rebound}` live objects moved to their new classes",
+        )
+        if result.reloaded:
+            em.add_field(name="Reloaded", value="\n".join(f"`{name}`" for name in result.reloaded)[:1024])
+        if result.pinned:
+            em.add_field(
+                name="Needs a Restart",
+                value="\n".join(f"`{name}`" for name in result.pinned)[:1024],
+            )
+        if result.error:
+            em.add_field(name="Error", value=f"```{result.error[:1000]}```", inline=False)
+        elif not result.changed:
+            em.description = "Nothing changed"
+        await ctx.respond(embed=em, ephemeral=True)
+
+    @debug_group.command()
+    @commands.is_owner()
+    @option("seconds", description="How long to profile for", min_value=1, max_value=120)
+    async def profile(self, ctx: ApplicationContext, seconds: int):
+        """
+        Sample the CPU stacks of the event loop, as collapsed stacks for a flame graph.
+
+        Parameters
+        ----------
+        ctx: Ctx
+            The context of the command.
+        seconds: int
+            How long to profile for.
+        """
+        await ctx.defer(ephemeral=True)
+        result = await profile_stacks(seconds)
+        em = embed(
+            title="CPU Profile",
+            description=f"`{result.samples}` samples over `{result.seconds:.1f}`s, one per 5ms of CPU time, "
+                        f"`{result.idle}` more found the loop idle while other threads used the CPU",
+        )
+        if top := result.top_functions():
+            em.add_field(
+                name="Top Functions",
+                value="\n".join(
+                    f"`{count / result.samples:5.1%}` `{discord.utils.escape_markdown(label)[:80]}`"
+                    for label, count in top
+                )[:1024],
+                inline=False,
+            )
+        file = discord.File(io.BytesIO(result.collapsed().encode()), filename=f"profile-{int(time.time())}.txt")
+        await ctx.respond(embed=em, file=file, ephemeral=True)
+
+    @debug_group.command()
+    @commands.is_owner()
+    @option("seconds", description="How long to trace allocations for", min_value=1, max_value=300)
+    async def alloc(self, ctx: ApplicationContext, seconds: int):
+        """
+        Find the lines whose allocations grow the most over a period.
+
+        Parameters
+        ----------
+        ctx: Ctx
+            The context of the command.
+        seconds: int
+            How long to trace allocations for.
+        """
+        await ctx.defer(ephemeral=True)
+        sites = await allocation_growth(seconds)
+        em = embed(title=f"Allocation Growth over {seconds}s")
+        if not sites:
+            em.description = "Nothing grew"
+        for site in sites:
+            em.add_field(
+                name=f"+{humanize.naturalsize(site.size_diff, binary=True)} ({site.count_diff:+} blocks)",
+                value=f"`{os.path.relpath(site.location)}`\n"
+                      f"Now {humanize.naturalsize(site.size, binary=True)}",
+                inline=False,
+            )
+        await ctx.respond(embed=em, ephemeral=True)
+
+
+def setup(bot: Bot) -> None:
+    return bot.add_cog(Debug(bot))
@@ -62,7 +62,7 @@ class General(Cog):
             name=em.fields[0].name,
             value=f"`{round_trip.ms_time():.2f}`ms"
         )
-        await ctx.edit(embed=em)
+        await self.bot.outbound.edit_original(ctx.interaction, embed=em)
 
 
 def setup(bot: Bot) -> None:
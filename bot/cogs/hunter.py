@@ -15,23 +15,70 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import asyncio
+import datetime
 import os
 import re
+from collections.abc import Awaitable, Callable
+from functools import partial
 from itertools import batched
+from typing import Any
 
 import discord
-from discord import command, ApplicationContext, slash_command, option, SlashCommandGroup
+import humanize
+from discord import command, ApplicationContext, slash_command, option, SlashCommandGroup, ApplicationCommandInvokeError
 from discord.ext import commands
 from discord.ext.commands import Cog
 from discord.ext.pages import Paginator
-from discord.ui import View, button, Button
-from docker.errors import APIError
+from discord.ui import View, button
 
 from ..core import Bot
-from ..error import WarningExc, ErrorExc, InfoExc
+from ..error import BaseError, WarningExc, InfoExc
 from ..hunter import HunterConfig, available_scenarios
-from ..models import Ping
-from ..utils import embed, Timer
+from ..lifecycle import ProgressReporter
+from ..live_status import StatusSnapshot
+from ..log_search import highlight
+from ..models import Ping, HunterSession, ScheduledSession, ScheduleState
+from ..ratelimit import RateLimitedError
+from ..utils import embed, paginate_string, Timer
+
+
+# The number of rate limit tokens each action costs, roughly by how much work it makes the Docker daemon do. Anything
+# else costs one token
+_COSTS = {
+    "hunter run": 5,
+    "hunter status start": 5,
+    "hunter status restart": 5,
+    "hunter logs": 3,
+    "hunter stop": 2,
+    "hunter status stop": 2,
+    "hunter schedule add": 2,
+}
+
+
+async def _with_progress(
+        title: str,
+        edit: Callable[[str], Awaitable[Any]],
+        operation: Callable[[ProgressReporter], Awaitable[Any]],
+        result: str,
+) -> Any:
+    reporter = ProgressReporter(title, edit)
+    try:
+        value = await operation(reporter)
+    except Exception:
+        await reporter.finish(failed=True)
+        raise
+    await reporter.finish(result)
+    return value
+
+
+def _ready_message(bot: Bot, user: discord.abc.User, elapsed: float) -> str:
+    hunter = bot.hunter
+    message = f"{user.mention} Hunter is up in `{hunter.config.scenario}`, ready after {elapsed:.0f}s"
+    key = (hunter.config.scenario, hunter.version)
+    if bot.lifecycle.time_to_ready.count(key) > 1:
+        message += f" (median {bot.lifecycle.time_to_ready.quantile(0.5, key):.0f}s)"
+    return message
 
 
 async def _run_hunter(
@@ -41,38 +88,195 @@ async def _run_hunter(
         hostility: str = "0_0_0_0_0",
         human_defenders: str = ""
 ):
+    config = HunterConfig(
+        scenario=scenario,
+        gci=gci,
+        hostility=hostility,
+        human_defenders=human_defenders,
+    )
+    # Acknowledge right away, Docker can take longer than the 3 seconds an interaction has to be acknowledged
+    await ctx.defer()
+    elapsed = await _with_progress(
+        f"Starting hunter in `{scenario}`",
+        lambda content: ctx.bot.outbound.edit_original(ctx.interaction, content=content),
+        lambda progress: ctx.bot.lifecycle.run(config, ctx.author.id, ctx.channel_id, progress=progress),
+        "Hunter is ready",
+    )
+    # Edits don't notify, so the requester gets a new message once hunter is actually up
+    await ctx.respond(_ready_message(ctx.bot, ctx.author, elapsed))
+
+
+async def _stop_hunter(ctx: ApplicationContext):
+    await ctx.defer()
+    await _with_progress(
+        "Stopping hunter",
+        lambda content: ctx.bot.outbound.edit_original(ctx.interaction, content=content),
+        lambda progress: ctx.bot.lifecycle.stop(progress=progress),
+        "Hunter stopped",
+    )
+
+
+def _parse_time(value: str) -> datetime.datetime:
+    if value.isdigit():
+        return datetime.datetime.fromtimestamp(int(value), datetime.timezone.utc)
     try:
-        if ctx.bot.hunter.running:
-            raise InfoExc("Hunter is already running!")
-        config = HunterConfig(
-            scenario=scenario,
-            gci=gci,
-            hostility=hostility,
-            human_defenders=human_defenders,
+        run_at = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise InfoExc(
+            f"`{value}` is not a valid time",
+            recommendation_title="Usage",
+            recommendation="Use `YYYY-MM-DD HH:MM` (UTC unless an offset is given), or a unix timestamp",
+        ) from None
+    if run_at.tzinfo is None:
+        run_at = run_at.replace(tzinfo=datetime.timezone.utc)
+    return run_at
+
+
+def _history_embed(sessions: list[HunterSession]) -> discord.Embed:
+    em = embed(title="Hunter History")
+    if not sessions:
+        em.description = "No sessions found"
+    for session in sessions:
+        if session.stopped_at is None:
+            ended = "Running"
+        else:
+            ended = f"Ran for {humanize.naturaldelta(session.duration)}, exit code `{session.exit_code}`"
+        em.add_field(
+            name=f"{session.config["scenario"].title()} ({session.version})",
+            value="\n".join((
+                f"ID: `{session.id}`",
+                f"Started {discord.utils.format_dt(session.started_at, "R")}"
+                + (f" by <@{session.started_by}>" if session.started_by is not None else ""),
+                ended,
+            )),
+            inline=False,
         )
-        ctx.bot.hunter.run(config)
-        await ctx.respond(f"Starting hunter in `{scenario}`")
-    except APIError as e:
-        raise ErrorExc(
-            "Could not start session. Likely the docker daemon is disconnected, please contact the owner of this bot"
-        ) from e
+    return em
 
 
-async def _stop_hunter(ctx: ApplicationContext):
-    if not ctx.bot.hunter.running:
-        raise InfoExc("Hunter is not running yet!")
-    ctx.bot.hunter.stop()
-    await ctx.respond("Hunter is stopping")
+class HistoryView(View):
+    page_size = 10
+
+    def __init__(self, sessions: list[HunterSession], started_by: int | None = None):
+        super().__init__(timeout=120)
+        self.sessions = sessions
+        self.started_by = started_by
+        self.update_buttons()
+
+    @classmethod
+    async def fetch(cls, before: int | None = None, started_by: int | None = None) -> list[HunterSession]:
+        return await HunterSession.page(before=before, limit=cls.page_size, started_by=started_by)
+
+    def update_buttons(self):
+        self.older_button.disabled = len(self.sessions) < self.page_size
+
+    async def on_timeout(self):
+        self.disable_all_items()
+        await self.message.edit(view=self)
+
+    @button(label="Older", style=discord.ButtonStyle.secondary, emoji="⏩")
+    async def older_button(self, b, interaction):
+        # Keyset pagination: the cursor is the lowest ID on the current page
+        self.sessions = await self.fetch(before=self.sessions[-1].id, started_by=self.started_by)
+        self.update_buttons()
+        await interaction.response.edit_message(embed=_history_embed(self.sessions), view=self)
+
+
+class StatusView(View):
+    """
+    The lifecycle buttons of status messages. One instance is registered as a persistent view at startup and handles
+    the buttons of every status message, including messages sent before the bot restarted.
+    """
+
+    def __init__(self, bot: Bot, snapshot: StatusSnapshot | None = None):
+        super().__init__(timeout=None)
+        self.bot = bot
+        if snapshot is not None:
+            self.update(snapshot)
+
+    @classmethod
+    def render(cls, bot: Bot, snapshot: StatusSnapshot) -> "StatusView":
+        """
+        Creates a view to send with a status message. The view is stopped, so it is never stored: the buttons are
+        handled by the registered persistent view instead.
+        """
+        view = cls(bot, snapshot)
+        view.stop()
+        return view
+
+    def update(self, snapshot: StatusSnapshot):
+        self.start_button.disabled = snapshot.running or not snapshot.exists
+        self.restart_button.disabled = not snapshot.running
+        self.stop_button.disabled = not snapshot.running
+
+    async def handle(self, interaction: discord.Interaction, action: str):
+        lifecycle = self.bot.lifecycle
+        # Lifecycle operations are serialized, and duplicate clicks are collapsed into one operation
+        match action:
+            case "start":
+                verb, result = "Starting", "Hunter is ready"
+                operation = partial(lifecycle.start, interaction.user.id, interaction.channel_id)
+            case "restart":
+                verb, result = "Restarting", "Hunter is ready"
+                operation = lifecycle.restart
+            case "stop":
+                verb, result = "Stopping", "Hunter stopped"
+                operation = lifecycle.stop
+            case _:
+                raise ValueError(f"Unknown status action {action!r}")
+        name = f"hunter status {action}"
+        self.bot.rate_limiter.check(name, interaction.user.id, interaction.guild_id, _COSTS.get(name, 1))
+        title = f"{verb} hunter (requested by {interaction.user.mention})"
+        await interaction.response.send_message(title)
+        if interaction.message is not None:
+            # The message may have stopped receiving updates, e.g. if it was sent before a restart
+            self.bot.live_status.register(interaction.message)
+        elapsed = await _with_progress(
+            title,
+            lambda content: self.bot.outbound.edit_original(interaction, content=content),
+            lambda progress: operation(progress=progress),
+            result,
+        )
+        if elapsed is not None:
+            await interaction.followup.send(_ready_message(self.bot, interaction.user, elapsed))
+
+    async def on_error(self, error: Exception, item, interaction: discord.Interaction):
+        if isinstance(error, BaseError):
+            await error.handle(interaction)
+        else:
+            await super().on_error(error, item, interaction)
+
+    @button(label="Start", style=discord.ButtonStyle.green, emoji="▶", custom_id="hunter:status:start")
+    async def start_button(self, b, interaction):
+        await self.handle(interaction, "start")
+
+    @button(label="Restart", style=discord.ButtonStyle.primary, emoji="🔄", custom_id="hunter:status:restart")
+    async def restart_button(self, b, interaction):
+        await self.handle(interaction, "restart")
+
+    @button(label="Stop", style=discord.ButtonStyle.red, emoji="⏹", custom_id="hunter:status:stop")
+    async def stop_button(self, b, interaction):
+        await self.handle(interaction, "stop")
 
 
 class Hunter(Cog):
     """Hunter commands"""
 
     hunter_group = SlashCommandGroup("hunter", "Hunter-related commands")
+    schedule_group = hunter_group.create_subgroup("schedule", "Schedule hunter sessions")
 
     def __init__(self, bot: Bot):
         self.bot = bot
 
+    async def cog_check(self, ctx: ApplicationContext) -> bool:
+        name = ctx.command.qualified_name
+        try:
+            self.bot.rate_limiter.check(name, ctx.author.id, ctx.guild_id, _COSTS.get(name, 1))
+        except RateLimitedError as e:
+            # Only Discord exceptions raised by checks reach the error handler, which unwraps the original error
+            raise ApplicationCommandInvokeError(e) from e
+        return True
+
     @hunter_group.command()
     @option("scenario", choices=available_scenarios)
     async def run(
@@ -85,6 +289,66 @@ class Hunter(Cog):
     ):
         await _run_hunter(ctx, scenario, gci=gci, hostility=hostility, human_defenders=human_defenders)
 
+    @schedule_group.command(name="add")
+    @option("scenario", choices=available_scenarios)
+    @option("time", description="When to start, as YYYY-MM-DD HH:MM (UTC) or a unix timestamp")
+    async def schedule_add(
+            self,
+            ctx: ApplicationContext,
+            scenario: str,
+            time: str,
+            gci: bool = False,
+            hostility: str = "0_0_0_0_0",
+            human_defenders: str = ""
+    ):
+        run_at = _parse_time(time)
+        if run_at <= datetime.datetime.now(datetime.timezone.utc):
+            raise InfoExc("That time is in the past")
+        # Validated now, so mistakes are reported to the user instead of when the job runs
+        config = HunterConfig(
+            scenario=scenario,
+            gci=gci,
+            hostility=hostility,
+            human_defenders=human_defenders,
+        )
+        job = await self.bot.scheduler.add(config, run_at, ctx.author.id, ctx.channel_id)
+        await ctx.respond(
+            f"Scheduled `{scenario}` for {discord.utils.format_dt(run_at)} ({discord.utils.format_dt(run_at, "R")}). "
+            f"Job ID: `{job.id}`"
+        )
+
+    @schedule_group.command(name="list")
+    @option("user", description="Only show sessions scheduled by this user", required=False)
+    async def schedule_list(self, ctx: ApplicationContext, user: discord.User = None):
+        jobs = await ScheduledSession.pending(created_by=user.id if user is not None else None)
+        em = embed(title="Scheduled Sessions")
+        if not jobs:
+            em.description = "No sessions are scheduled"
+        for job in jobs[:25]:
+            em.add_field(
+                name=job.config["scenario"].title(),
+                value="\n".join((
+                    f"ID: `{job.id}`",
+                    f"Starts {discord.utils.format_dt(job.run_at)} ({discord.utils.format_dt(job.run_at, "R")})",
+                    f"Scheduled by <@{job.created_by}>",
+                )),
+                inline=False,
+            )
+        if len(jobs) > 25:
+            em.set_footer(text=f"And {len(jobs) - 25} more")
+        await ctx.respond(embed=em)
+
+    @schedule_group.command(name="cancel")
+    @option("job", description="The job ID")
+    async def schedule_cancel(self, ctx: ApplicationContext, job: str):
+        scheduled = await ScheduledSession.get_or_none(id=int(job)) if job.isdigit() else None
+        if scheduled is None or scheduled.state != ScheduleState.PENDING:
+            raise InfoExc(f"No pending session with ID `{job}`")
+        if scheduled.created_by != ctx.author.id and not await self.bot.is_owner(ctx.author):
+            raise InfoExc("Only the user who scheduled this session can cancel it")
+        await self.bot.scheduler.cancel(scheduled)
+        await ctx.respond(f"Cancelled scheduled session `{job}`")
+
     @hunter_group.command()
     async def stop(self, ctx: ApplicationContext):
         # TODO: Should this be tied to the user that started hunter?
@@ -92,103 +356,109 @@ class Hunter(Cog):
 
     @hunter_group.command()
     @commands.is_owner()
-    async def logs(self, ctx: ApplicationContext):
-        if not self.bot.hunter.exists:
-            raise InfoExc("Hunter container unavailable!")
+    @option("session", description="The session ID. Defaults to the latest session", required=False)
+    @option("page", description="The log chunk to show. Defaults to the newest", required=False, min_value=0)
+    @option("search", description="Only show lines containing all of these words", required=False)
+    @option("pattern", description="Only show lines matching this regex", required=False)
+    async def logs(
+            self,
+            ctx: ApplicationContext,
+            session: str = None,
+            page: int = None,
+            search: str = None,
+            pattern: str = None,
+    ):
+        archives = self.bot.hunter.archives
+        name = session if session is not None else str(self.bot.hunter.session_id)
+        if search is not None or pattern is not None:
+            if name != str(self.bot.hunter.session_id) and name not in archives:
+                raise InfoExc(f"No logs are archived for session `{name}`")
+            await self._search_logs(ctx, name, search or "", pattern)
+            return
+        if name not in archives:
+            if session is not None:
+                raise InfoExc(f"No logs are archived for session `{session}`")
+            # Containers created before log archiving only have the logs docker kept
+            if not self.bot.hunter.exists:
+                raise InfoExc("Hunter container unavailable!")
+            paginator = Paginator(
+                pages=list(map(lambda _: f"```{"".join(_)}```", batched(self.bot.hunter.logs(), n=1994)))
+            )
+            await paginator.respond(ctx.interaction, ephemeral=True)
+            return
+
+        # Only the requested chunk is decompressed. Lines that aren't written to disk yet form the last page.
+        archive = await asyncio.to_thread(archives.open, name)
+        pending = archives.pending(name)
+        page_count = len(archive) + bool(pending)
+        if page_count == 0:
+            raise InfoExc(f"No logs have been archived for session `{name}` yet")
+        if page is None:
+            page = page_count - 1
+        if page >= page_count:
+            raise InfoExc(f"Session `{name}` only has {page_count} page{"s" if page_count != 1 else ""} of logs")
+        lines = await asyncio.to_thread(archive.read_chunk, page) if page < len(archive) else pending
+
+        header = f"Session `{name}`, page {page}/{page_count - 1}\n"
         paginator = Paginator(
-            pages=list(map(lambda _: f"```{"".join(_)}```", batched(self.bot.hunter.logs(), n=1994)))
+            pages=[f"{header}```{part}```" for part in paginate_string("\n".join(lines), 2000 - len(header) - 6)]
+        )
+        await paginator.respond(ctx.interaction, ephemeral=True)
+
+    async def _search_logs(self, ctx: ApplicationContext, name: str, search: str, pattern: str | None):
+        try:
+            compiled = re.compile(pattern, re.IGNORECASE) if pattern is not None else None
+        except re.error as e:
+            raise InfoExc(f"`{pattern}` is not a valid regex: {e}") from e
+
+        # Only the lines the index selects are matched against the pattern
+        index = await asyncio.to_thread(self.bot.hunter.index_for, name)
+        with Timer() as timer:
+            hits, truncated = await asyncio.to_thread(index.search, search, compiled, 25)
+        if not hits:
+            raise InfoExc(f"No lines in session `{name}` match your search")
+
+        blocks = []
+        for hit in hits:
+            lines = [f"  {number:>6} | {text}" for number, text in hit.before]
+            lines.append(f"> {hit.line:>6} | {highlight(hit.text, hit.spans)}")
+            lines.extend(f"  {number:>6} | {text}" for number, text in hit.after)
+            blocks.append("\n".join(lines))
+
+        header = (
+            f"{"Newest " if truncated else ""}{len(hits)} match{"es" if len(hits) != 1 else ""} "
+            f"in session `{name}` ({timer.ms_time():.2f}ms)\n"
+        )
+        paginator = Paginator(
+            pages=[
+                f"{header}```ansi\n{part}```"
+                for part in paginate_string("\n\n".join(blocks), 2000 - len(header) - 11)
+            ]
         )
         await paginator.respond(ctx.interaction, ephemeral=True)
-        # await ctx.respond
+
+    @hunter_group.command()
+    @option("before", description="Only show sessions older than this session ID", required=False)
+    @option("user", description="Only show sessions started by this user", required=False)
+    async def history(self, ctx: ApplicationContext, before: str = None, user: discord.User = None):
+        if before is not None and not before.isdigit():
+            raise InfoExc(f"`{before}` is not a valid session ID")
+        started_by = user.id if user is not None else None
+        sessions = await HistoryView.fetch(before=int(before) if before is not None else None, started_by=started_by)
+        view = HistoryView(sessions, started_by=started_by)
+        view.message = await ctx.respond(embed=_history_embed(sessions), view=view)
 
     @hunter_group.command()
     async def status(self, ctx: ApplicationContext):
         # Include: Container status, started by, runtime, more?
-        # Possibly: Last session details?
-        def make_embed():
-            em = embed(
-                title="Hunter Status",
-                description=self.bot.hunter.container.status.title() if self.bot.hunter.exists else "Unavailable",
-            )
-            if self.bot.hunter.config is not None:
-                em.add_field(
-                    name="Scenario",
-                    value=self.bot.hunter.config.scenario.title(),
-                ),
-                em.add_field(
-                    name="GCI",
-                    value=self.bot.hunter.config.gci,
-                )
-                em.add_field(
-                    name="Hostility",
-                    value=self.bot.hunter.config.hostility,
-                )
-                em.add_field(
-                    name="Human Defenders",
-                    value=self.bot.hunter.config.human_defenders,
-                )
-            return em
-
-        class MyView(View):
-            async def on_timeout(self):
-                self.disable_all_items()
-                await self.message.edit(embed=make_embed(), view=self)
-
-            def update_buttons(self):
-                for child in self.children:
-                    if not isinstance(child, Button):
-                        continue
-                    match child.label.casefold():
-                        case "start":
-                            child.disabled = ctx.bot.hunter.running or not ctx.bot.hunter.exists
-                        case ("restart" | "stop"):
-                            child.disabled = not ctx.bot.hunter.running
-
-            @button(
-                label="Start",
-                style=discord.ButtonStyle.green,
-                emoji="▶",
-                disabled=self.bot.hunter.running or not self.bot.hunter.exists,
-            )
-            async def start_button(self, b, interaction):
-                ctx.bot.hunter.start()
-                self.update_buttons()
-                await interaction.response.send_message(
-                    f"Starting hunter (requested by {interaction.user.mention})"
-                )
-                await self.message.edit(embed=make_embed(), view=self)
-
-            @button(
-                label="Restart",
-                style=discord.ButtonStyle.primary,
-                emoji="🔄",
-                disabled=not self.bot.hunter.running,
-            )
-            async def restart_button(self, b, interaction):
-                ctx.bot.hunter.restart()
-                self.update_buttons()
-                await interaction.response.send_message(
-                    f"Restarting hunter (requested by {interaction.user.mention})"
-                )
-                await self.message.edit(embed=make_embed(), view=self)
-
-            @button(
-                label="Stop",
-                style=discord.ButtonStyle.red,
-                emoji="⏹",
-                disabled=not self.bot.hunter.running,
-            )
-            async def stop_button(self, b, interaction):
-                ctx.bot.hunter.stop()
-                self.update_buttons()
-                await interaction.response.send_message(
-                    f"Stopping hunter (requested by {interaction.user.mention})"
-                )
-                await self.message.edit(embed=make_embed(), view=self)
-
-        view = MyView(timeout=120)
-        view.message = await ctx.respond(embed=make_embed(), view=view)
+        # Every status message shares one snapshot, so viewing status doesn't scale daemon calls with viewers
+        snapshot = await self.bot.live_status.get_snapshot()
+        view = StatusView.render(self.bot, snapshot)
+        await ctx.respond(embed=snapshot.to_embed(), view=view)
+        self.bot.live_status.register(view.message)
 
 
 def setup(bot: Bot) -> None:
+    bot.add_persistent_view(lambda: StatusView(bot))
+    bot.live_status.render_view = lambda snapshot: StatusView.render(bot, snapshot)
     return bot.add_cog(Hunter(bot))
@@ -15,20 +15,25 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import asyncio
 import datetime
+import hashlib
+import json
 import logging
 import os
 import random
-import traceback
+from collections.abc import Callable
 from itertools import batched
 from typing import Any
 import re
 
 from discord import Intents, ApplicationContext, option, ApplicationCommandError, Permissions, Message, \
     Activity, ActivityType, Object, Guild, Forbidden
-from discord.utils import copy_doc, get_or_fetch
+from discord.ui import View
+from discord.utils import copy_doc, find, get_or_fetch
 from tortoise import Tortoise
 
+from .edits import EditDeduplicator
 from .error import BaseError, InfoExc, ErrorExc, BotPermissionError
 from discord.ext.pages import Paginator
 # from git import Repo  # type: ignore
@@ -36,24 +41,52 @@ from discord.ext.commands import Bot as _Bot, CommandError, CommandNotFound, Mis
     BotMissingPermissions, Context, CheckFailure, MissingRole
 
 from .hunter import Hunter
+from .idle import IdleMonitor
+from .lifecycle import LifecycleQueue
+from .live_status import LiveStatus
+from .metrics import ErrorAggregator
+from .outbound import Outbound
+from .ratelimit import RateLimiter
+from .reloader import Reloader
+from .runtime import PROFILES, RuntimeProfile, configure_loop, freeze
+from .scheduler import Scheduler
 
 _log = logging.getLogger(__name__)
 
 
 class Bot(_Bot):
     default_prefixes = "h.", "hunter."
-    extensions_to_load = "general", "hunter"
+    extensions_to_load = "general", "hunter", "debug"
     home_guild: Object | Guild = Object(id=742628032111706194)
 
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
+    def __init__(self, *args: Any, runtime: RuntimeProfile = PROFILES["default"], **kwargs: Any) -> None:
 
         super().__init__(*args, **kwargs)
+        self.runtime = runtime
+        self._pending_views: list[Callable[[], View]] = []
         self.listeners: Listeners = Listeners(self)
+        self.errors = ErrorAggregator()
+        self.outbound = Outbound()
+        self.rate_limiter = RateLimiter()
+        self.reloader = Reloader(self)
         self.start_time = datetime.datetime.now(datetime.timezone.utc)
         # self.version_info = VersionInfo.from_repo()
         self.load_jsk()
         self.hunter = Hunter(os.getenv("HUNTER_VERSION"))
         self.hunter.pull()
+        self.live_status = LiveStatus(self)
+        self.lifecycle = LifecycleQueue(self)
+        self.idle_monitor = IdleMonitor(
+            self,
+            timeout=float(os.getenv("HUNTER_IDLE_TIMEOUT", 30)) * 60,
+            warning=float(os.getenv("HUNTER_IDLE_WARNING", 5)) * 60,
+        )
+        # Only once the idle monitor is subscribed to the log events
+        self.hunter.resume()
+        self.scheduler = Scheduler(
+            self,
+            grace=datetime.timedelta(minutes=float(os.getenv("HUNTER_SCHEDULE_GRACE", 15))),
+        )
         # try:
         #     self.hunter.pull()
         # except:
@@ -73,6 +106,23 @@ class Bot(_Bot):
         }
         self.load_extension("jishaku")
 
+    def add_persistent_view(self, factory: Callable[[], View]) -> None:
+        """
+        Registers a persistent view. Views can only be created while the event loop is running, so if it isn't yet, the
+        view is created and registered when the bot starts.
+
+        Parameters
+        ----------
+        factory: Callable[[], View]
+            A callable that creates the view.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._pending_views.append(factory)
+        else:
+            self.add_view(factory())
+
     def uptime(self) -> datetime.timedelta:
         """
         Returns the uptime of the bot.
@@ -116,7 +166,7 @@ class Bot(_Bot):
         """
         Sets up the database.
         """
-        models = "core", "ping"
+        models = "core", "ping", "schedule", "session"
         # await tortoise.init(
         #     {
         #         "connections": {
@@ -145,13 +195,93 @@ class Bot(_Bot):
         """
         Starts the bot, and sets up the database.
         """
+        configure_loop(self.runtime)
         await self.setup_database()
+        for factory in self._pending_views:
+            self.add_view(factory())
+        self._pending_views.clear()
+        self.idle_monitor.start()
+        await self.scheduler.start()
         await super().start(token, reconnect=reconnect)
 
+    def command_tree_hash(self) -> str:
+        """
+        Hashes the locally defined application commands: their names, options, choices, permissions and guilds, i.e.
+        everything that is registered with Discord.
+
+        Returns
+        -------
+        str
+            The hex digest.
+        """
+        tree = sorted(
+            (json.dumps([sorted(cmd.guild_ids or ()), cmd.to_dict()], sort_keys=True, default=str)
+             for cmd in self.pending_application_commands),
+        )
+        return hashlib.sha256("\n".join(tree).encode()).hexdigest()
+
+    async def sync_command_tree(self) -> bool:
+        """
+        Registers the application commands with Discord, in a single bulk overwrite per scope, if they changed since
+        they were last registered. The hash of the registered commands is kept in the persistent store.
+
+        Otherwise, the IDs of the registered commands are fetched, one request per scope, since interactions are routed
+        to commands by ID. Commands that turn out to be missing are registered after all. Once every command has an ID,
+        e.g. on a reconnect, nothing is requested.
+
+        Returns
+        -------
+        bool
+            Whether the commands were registered.
+        """
+        digest = self.command_tree_hash()
+        store = self.hunter.persistent_store
+        if store.command_tree_hash == digest:
+            if all(cmd.id is not None for cmd in self.pending_application_commands):
+                return False
+            if await self._map_command_ids():
+                return False
+            _log.warning("Registered application commands don't match the stored hash, registering them again")
+        else:
+            _log.info("Application commands changed, registering them")
+        # Forced, so the existing commands are overwritten without being fetched first
+        await self.sync_commands(method="bulk", force=True)
+        store.command_tree_hash = digest
+        store.save()
+        return True
+
+    async def _map_command_ids(self) -> bool:
+        pending = self.pending_application_commands
+        scopes = {None} | {guild_id for cmd in pending for guild_id in cmd.guild_ids or ()}
+        mapped = set()
+        for guild_id in scopes:
+            if guild_id is None:
+                registered = await self.http.get_global_commands(self.application_id)
+            else:
+                registered = await self.http.get_guild_commands(self.application_id, guild_id)
+            for data in registered:
+                cmd = find(
+                    lambda c: c.name == data["name"] and c.type == data.get("type")
+                    and (c.guild_ids is None if guild_id is None else guild_id in (c.guild_ids or ())),
+                    pending,
+                )
+                if cmd is not None:
+                    cmd.id = data["id"]
+                    self._application_commands[cmd.id] = cmd
+                    mapped.add(cmd.qualified_name)
+        return all(cmd.qualified_name in mapped for cmd in pending)
+
+    async def on_connect(self) -> None:
+        # Replaces the default, which fetches and compares the registered commands on every connect
+        await self.sync_command_tree()
+
     async def close(self) -> None:
         """
         Closes the bot, cleans up the database connection, and saves persistent store data.
         """
+        self.idle_monitor.stop()
+        self.scheduler.stop()
+        self.hunter.close()
         self.hunter.persistent_store.save()
         await Tortoise.close_connections()
         await super().close()
@@ -192,6 +322,42 @@ class Bot(_Bot):
         )
 
 
+def _missing_permissions(_ctx: Context | ApplicationContext, error: BotMissingPermissions) -> BaseError:
+    return BotPermissionError(Permissions(**{p: True for p in error.missing_permissions}))
+
+
+def _missing_argument(ctx: Context | ApplicationContext, error: MissingRequiredArgument) -> BaseError:
+    if (prefix := getattr(ctx, "prefix", None)) is not None and (command := getattr(ctx, "command", None)) is not None:
+        return InfoExc(
+            f"`{error.param.name}` is a required argument that is missing.",
+            recommendation_title="Usage",
+            recommendation=f"`{prefix}{command.qualified_name} {command.signature}`",
+        )
+    return ErrorExc("Missing required argument. While handling this error, another error occurred.")
+
+
+def _missing_role(_ctx: Context | ApplicationContext, error: MissingRole) -> BaseError:
+    # The default message is fine, but if missing_role is a snowflake, make it a mention
+    if isinstance(error.missing_role, int):
+        error = MissingRole(f"<@&{error.missing_role}>")
+    return InfoExc(error.args[0])
+
+
+def _user_facing(_ctx: Context | ApplicationContext, error: Exception) -> BaseError:
+    return InfoExc(error.args[0])
+
+
+# Command errors that are converted into errors shown to the user. The first matching entry wins, so subclasses must
+# come before their base classes
+_ERROR_CONVERTERS: tuple[tuple[type[Exception], Callable[[Any, Any], BaseError]], ...] = (
+    (BotMissingPermissions, _missing_permissions),
+    (MissingRequiredArgument, _missing_argument),
+    (UserInputError, _user_facing),
+    (MissingRole, _missing_role),
+    (CheckFailure, _user_facing),
+)
+
+
 class Listeners:
     """
     Listeners for the bot.
@@ -204,6 +370,7 @@ class Listeners:
 
     def __init__(self, bot: Bot) -> None:
         self.bot = bot
+        self.edits = EditDeduplicator(self._invocation, bot.process_commands)
         listeners = (
             "connect",
             "ready",
@@ -221,13 +388,15 @@ class Listeners:
         """
         Connect handler
         """
-        print("Connected to discord. Registering commands and waiting for READY...")
+        _log.info("Connected to discord. Registering commands and waiting for READY...")
 
     async def on_ready(self) -> None:
         """
         Ready handler
         """
-        print(f"Ready. Logged in as {self.bot.user}")
+        _log.info("Ready. Logged in as %s", self.bot.user)
+        # Everything that exists now (caches, commands, modules) lives until shutdown
+        freeze(self.bot.runtime)
         if isinstance(self.bot.home_guild, Object):
             try:
                 self.bot.home_guild = await get_or_fetch(self.bot, "guild", self.bot.home_guild.id)
@@ -239,62 +408,52 @@ class Listeners:
         """
         Disconnect handler
         """
-        print("Disconnected from discord.")
+        _log.info("Disconnected from discord.")
 
     @staticmethod
     async def on_reconnect() -> None:
         """
         Reconnect handler
         """
-        print("Reconnected to discord. Waiting for READY...")
+        _log.info("Reconnected to discord. Waiting for READY...")
 
     async def on_message_edit(self, before: Message, after: Message) -> None:
         """
         Message edit handler
         """
-        if before.content != after.content:
-            await self.bot.process_commands(after)
+        self.edits.edited(before, after)
+
+    async def _invocation(self, message: Message) -> tuple[str, str] | None:
+        if message.author.bot:
+            return None
+        ctx = await self.bot.get_context(message)
+        if ctx.command is None:
+            return None
+        return ctx.command.qualified_name, ctx.view.read_rest().strip()
 
     @classmethod
     async def _command_error(cls, ctx: Context | ApplicationContext, error: CommandError | ApplicationCommandError) -> None:
         """
         Command error handler
         """
-        if isinstance(original := getattr(error, "original", None), BaseError):
-            await original.handle(ctx)
+        original = getattr(error, "original", None)
+        if isinstance(original, BaseError):
+            exc: BaseError | None = original
         else:
-            try:
-                if isinstance(error, BotMissingPermissions):
-                    raise BotPermissionError(Permissions(**{p: True for p in error.missing_permissions}))
-                if isinstance(error, UserInputError):
-                    if isinstance(error, MissingRequiredArgument):
-                        if ((prefix := getattr(ctx, "prefix", None)) is not None
-                                and (command := getattr(ctx, "command", None)) is not None):
-                            raise InfoExc(
-                                f"`{error.param.name}` is a required argument that is missing.",
-                                recommendation_title="Usage",
-                                recommendation=f"`{prefix}{command.qualified_name} {command.signature}`",
-                            )
-                        raise ErrorExc(
-                            "Missing required argument. While handling this error, another error occurred.",
-                        )
-                    raise InfoExc(error.args[0])
-
-                if isinstance(error, CheckFailure):
-                    if isinstance(error, MissingRole):
-                        # The default message is fine, but if missing_role is a snowflake, make it a mention
-                        if isinstance(error.missing_role, int):
-                            error = MissingRole(f"<@&{error.missing_role}>")
-
-                    raise InfoExc(error.args[0])
-
-                if isinstance(error, CommandNotFound):
-                    return
-                traceback.print_exception(type(error), error, error.__traceback__)
-            except BaseError as exc:
-                mock_cmd_error = CommandError("Mock command error")
-                mock_cmd_error.original = exc  # type: ignore[attr-defined]
-                await cls._command_error(ctx, mock_cmd_error)
+            exc = next((convert(ctx, error) for kind, convert in _ERROR_CONVERTERS if isinstance(error, kind)), None)
+        if exc is None:
+            if not isinstance(error, CommandNotFound):
+                cls._report(ctx, original or error)
+            return
+        if exc.is_fatal():
+            ctx.bot.errors.record(exc)
+        await exc.handle(ctx)
+
+    @staticmethod
+    def _report(ctx: Context | ApplicationContext, error: BaseException) -> None:
+        ctx.bot.errors.record(error)
+        # Repeated tracebacks are collapsed by the logging filter
+        _log.error("Unhandled error in command %s", getattr(ctx.command, "qualified_name", None), exc_info=error)
 
     @classmethod
     async def on_command_error(cls, ctx: Context, error: CommandError) -> None:
@@ -0,0 +1,130 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+
+from discord import Message
+
+from .metrics import Counter
+
+__all__ = ("EditDeduplicator",)
+
+_log = logging.getLogger(__name__)
+
+
+class EditDeduplicator:
+    """
+    Decides when an edited message should have its command processed again.
+
+    Edits to a message are debounced: processing waits until the message has not been edited for ``debounce`` seconds,
+    and edits in between replace the pending one. The message is then only processed if its command invocation (the
+    command and its arguments, see ``invocation``) differs from the last one processed for that message, so edits that
+    only change the prefix, whitespace outside the arguments or nothing the bot parses don't run the command again.
+
+    The last invocation of each message is kept in an LRU of at most ``max_size`` messages, and entries expire after
+    ``ttl`` seconds, after which edits are treated like new messages.
+
+    Parameters
+    ----------
+    invocation: Callable[[Message], Awaitable[Hashable | None]]
+        Returns the invocation of a message, or None if the message does not invoke a command.
+    process: Callable[[Message], Awaitable[None]]
+        Processes the command of a message.
+    debounce: float
+        The number of seconds a message must stay unchanged before it is processed.
+    max_size: int
+        The maximum number of messages to remember.
+    ttl: float
+        The number of seconds a message is remembered for.
+    """
+
+    def __init__(
+            self,
+            invocation: Callable[[Message], Awaitable[Hashable | None]],
+            process: Callable[[Message], Awaitable[None]],
+            debounce: float = 1.5,
+            max_size: int = 1024,
+            ttl: float = 15 * 60,
+    ) -> None:
+        self.invocation = invocation
+        self.process = process
+        self.debounce = debounce
+        self.max_size = max_size
+        self.ttl = ttl
+        self.processed = 0
+        self.skipped = Counter()
+        self._seen: OrderedDict[int, tuple[int, float]] = OrderedDict()
+        self._pending: dict[int, tuple[Message, asyncio.Task[None]]] = {}
+
+    def _remember(self, message_id: int, invocation: Hashable | None) -> None:
+        self._seen[message_id] = hash(invocation), time.monotonic()
+        self._seen.move_to_end(message_id)
+        while len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+
+    def _recall(self, message_id: int) -> int | None:
+        if (entry := self._seen.get(message_id)) is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl:
+            del self._seen[message_id]
+            return None
+        return entry[0]
+
+    def edited(self, before: Message, after: Message) -> None:
+        """
+        Handles a message edit. Processing happens later, if at all.
+
+        Parameters
+        ----------
+        before: Message
+            The message before the edit.
+        after: Message
+            The message after the edit.
+        """
+        if before.content == after.content:
+            # E.g. embeds being unfurled
+            self.skipped.inc(("content unchanged",))
+            return
+        if (pending := self._pending.get(after.id)) is not None:
+            pending[1].cancel()
+            self.skipped.inc(("debounced",))
+        # The original message was processed when it was sent
+        first = pending[0] if pending is not None else before
+        self._pending[after.id] = first, asyncio.create_task(self._settle(first, after))
+
+    async def _settle(self, before: Message, after: Message) -> None:
+        await asyncio.sleep(self.debounce)
+        del self._pending[after.id]
+        try:
+            previous = self._recall(after.id)
+            if previous is None:
+                previous = hash(await self.invocation(before))
+            invocation = await self.invocation(after)
+            self._remember(after.id, invocation)
+            if invocation is None:
+                self.skipped.inc(("no command",))
+            elif hash(invocation) == previous:
+                self.skipped.inc(("invocation unchanged",))
+            else:
+                self.processed += 1
+                await self.process(after)
+        except Exception:  # pylint: disable=broad-except
+            _log.exception("Failed to process edited message %s", after.id)
@@ -15,8 +15,8 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import logging
 import random
-import traceback
 from abc import ABC, abstractmethod
 from enum import IntEnum
 from typing import TYPE_CHECKING, TypeVar, Any, Self
@@ -28,6 +28,8 @@ __all__ = "ErrorSeverity", "BaseError", "InfoExc", "WarningExc", "ErrorExc", "Cr
 
 from .utils import humanize_sequence, var_to_title, embed, error_embed
 
+_log = logging.getLogger(__name__)
+
 
 class ErrorSeverity(IntEnum):
     """
@@ -242,7 +244,7 @@ class BaseError(ABC, Exception):
         if self.should_propagate():
             raise RuntimeError("A fatal exception occurred during execution") from self
         if self.is_fatal():
-            traceback.print_exception(type(self), self, self.__traceback__)
+            _log.error("Fatal error: %s", self.message, exc_info=self)
 
 
 class InfoExc(BaseError):
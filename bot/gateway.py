@@ -0,0 +1,59 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from typing import Any
+
+from discord import Intents, MemberCacheFlags
+
+__all__ = ("gateway_options",)
+
+
+def gateway_options(lean: bool, max_messages: int | None = None) -> dict[str, Any]:
+    """
+    Returns the client options that control what the gateway sends and what the client caches.
+
+    The full mode subscribes to every intent, caches every member and chunks every guild at startup. The lean mode only
+    subscribes to what the bot uses: guilds (for the home guild), and guild and direct messages with their content (for
+    prefixed commands and their edits). Slash commands and buttons need no intents. No members are cached, other than
+    the bot's own, and guilds are not chunked.
+
+    Parameters
+    ----------
+    lean: bool
+        Whether to use the lean mode.
+    max_messages: int | None
+        The number of messages to cache, which bounds the edits the bot can react to. Defaults to 1000 in the full
+        mode, pycord's default, and 200 in the lean mode.
+
+    Returns
+    -------
+    dict[str, Any]
+        The keyword arguments for the client.
+    """
+    if not lean:
+        return {
+            "intents": Intents.all(),
+            "member_cache_flags": MemberCacheFlags.all(),
+            "max_messages": max_messages or 1000,
+            "chunk_guilds_at_startup": True,
+        }
+    return {
+        "intents": Intents(guilds=True, guild_messages=True, dm_messages=True, message_content=True),
+        "member_cache_flags": MemberCacheFlags.none(),
+        "max_messages": max_messages or 200,
+        "chunk_guilds_at_startup": False,
+    }
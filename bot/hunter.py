@@ -17,6 +17,10 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import os
 import re
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
 
 import docker
 import docker.errors
@@ -26,7 +30,23 @@ from docker.models.containers import Container
 __all__ = "scenario_dir", "available_scenarios", "Hunter", "HunterConfig"
 
 from bot.error import InfoExc, ErrorExc
+from bot.log_archive import LogArchive, LogArchiveStore
+from bot.log_search import InvertedIndex
+from bot.logs import EventStore, LogFollower, LogLine, parse_events
 from bot.persistent_store import PersistentStore
+from bot.ports import (
+    PORT_LABEL,
+    PortAllocator,
+    PortBlock,
+    PortConflictError,
+    find_udp_conflicts,
+    on_host_network,
+    parse_port_range,
+)
+from bot.readiness import DEFAULT_READY_PATTERN, ReadinessProbe
+from bot.resources import CorePlanner, ResourceProfile, load_profiles, parse_cpuset
+from bot.snowflake import Snowflake
+from bot.stats import StatsSampler
 
 scenario_dir = f"{os.path.dirname(os.path.dirname(os.path.realpath(__file__)))}/hunter-scenarios"
 available_scenarios = list(
@@ -84,16 +104,60 @@ class HunterConfig:
             raise HunterConfigError(f"Hostility `{self.hostility}` is not valid")
         self._validate_callsigns(self.human_defenders, "Human defender")
 
+    def to_dict(self) -> dict:
+        return {
+            "scenario": self.scenario,
+            "gci": self.gci,
+            "hostility": self.hostility,
+            "human_defenders": self.human_defenders,
+        }
+
 
 class Hunter:
+    # The MP ports hunter listens on inside the container
+    mp_ports = range(5001, 5111)
+
     def __init__(self, version: str):
         self.client = docker.from_env()
         self.version = version
         self.container_name = "hunter_bot_container"
         self.image_name = "vanosten/hunter_container"
         self.container: Container | None = None
-        self.persistent_store = PersistentStore(os.environ["PERSISTENT_STORE_FILE"], ["config"])
+        self.persistent_store = PersistentStore(
+            os.environ["PERSISTENT_STORE_FILE"],
+            ["config", "session_id", "idle_reclaimed", "idle_stopped", "command_tree_hash"],
+        )
         self._config: HunterConfig | None = self.persistent_store.config
+        # Docker emits one stats sample per second
+        self.stats = StatsSampler(capacity=int(os.getenv("HUNTER_STATS_WINDOW", 10)) * 60)
+        self.events = EventStore()
+        self.log_follower = LogFollower(self.events)
+        self.archives = LogArchiveStore(
+            os.getenv("LOG_ARCHIVE_DIR", "/var/run/hunter-logs"),
+            max_bytes=int(os.getenv("LOG_ARCHIVE_MAX_BYTES", 1024 ** 3)),
+        )
+        self.search_index = InvertedIndex()
+        self.readiness = ReadinessProbe(re.compile(os.getenv("HUNTER_READY_PATTERN", DEFAULT_READY_PATTERN)))
+        # The monotonic time the container was last (re)started at
+        self.started_at: float | None = None
+        self._archive_indexes: OrderedDict[str, InvertedIndex] = OrderedDict()
+        self.log_follower.add_sink(self.archives.append)
+        self.log_follower.add_sink(self.search_index.add)
+        self.log_follower.add_sink(self.readiness.feed)
+        self.log_follower.add_end_callback(self.archives.flush)
+        self.ports = PortAllocator(
+            *parse_port_range(os.getenv("HUNTER_PORT_RANGE", f"{self.mp_ports[0]}-{self.mp_ports[-1]}")),
+            block_size=len(self.mp_ports),
+        )
+        # "host" skips Docker's NAT and userland proxy for MP traffic, but hunter then binds its ports on the host
+        self.network_mode = os.getenv("HUNTER_NETWORK_MODE", "bridge")
+        self.default_profile, self.profiles = load_profiles(os.getenv("HUNTER_RESOURCE_PROFILES"))
+        self.core_planner = CorePlanner(
+            self.client.info()["NCPU"],
+            # Keep the cores the bot (and its database) runs on free
+            reserved=parse_cpuset(os.getenv("HUNTER_RESERVED_CORES", "0")),
+        )
+        self.reclaim_resources()
 
         try:
             if self.client.containers.get(self.container_name):
@@ -101,6 +165,31 @@ class Hunter:
         except docker.errors.NotFound:
             pass
 
+        if self.running:
+            if self.session_id is not None:
+                # Resume the archive where it left off, so lines from before the restart aren't archived twice
+                writer = self.archives.begin(str(self.session_id))
+                archive = self.archives.open(str(self.session_id))
+                self.log_follower.line_count = writer.next_line
+                self.log_follower.last_timestamp = archive.last_timestamp
+                self._replay(archive)
+
+    def resume(self):
+        """
+        Starts following the container if it was already running when the bot started. Call this once everything that
+        subscribes to :attr:`events` is in place, so no event of the resumed session is missed.
+        """
+        if self.running:
+            self._follow()
+
+    def _replay(self, archive: LogArchive):
+        # The follower only picks up where the archive ends, so the index and events of the session so far come from it
+        for n, chunk in enumerate(archive.chunks):
+            lines = archive.read_chunk(n)
+            self.search_index.extend(chunk.first_line, lines)
+            for event in parse_events(LogLine(chunk.first_line + i, None, text) for i, text in enumerate(lines)):
+                self.events.add(event)
+
     @property
     def config(self) -> HunterConfig:
         return self.persistent_store.config
@@ -109,6 +198,15 @@ class Hunter:
     def config(self, conf: HunterConfig):
         self.persistent_store.config = conf
 
+    @property
+    def session_id(self) -> int | None:
+        """The ID of the :class:`~bot.models.HunterSession` for the current container, if any."""
+        return self.persistent_store.session_id
+
+    @session_id.setter
+    def session_id(self, session_id: int | None):
+        self.persistent_store.session_id = session_id
+
     @property
     def exists(self):
         if self.container is None:
@@ -129,19 +227,124 @@ class Hunter:
 
         return self.container.status == "running"
 
+    @property
+    def exit_code(self) -> int | None:
+        if not self.exists or self.container.status == "running":
+            return None
+
+        return self.container.attrs["State"]["ExitCode"]
+
+    def published_ports(self) -> list[int]:
+        """
+        Returns the host ports the container's ports are published on. Call :attr:`exists` first to refresh the
+        container's attributes.
+        """
+        if self.container is None:
+            return []
+        if self.container.attrs.get("HostConfig", {}).get("NetworkMode") == "host":
+            return list(self.mp_ports)
+        bindings = self.container.attrs.get("NetworkSettings", {}).get("Ports") or {}
+        return [int(binding["HostPort"]) for host_bindings in bindings.values() for binding in host_bindings or ()]
+
+    def reclaim_resources(self):
+        """
+        Rebuilds the port allocations and core plans from the containers that still exist, freeing the resources of any
+        that are gone.
+        """
+        containers = self.client.containers.list(all=True, filters={"label": PORT_LABEL})
+        self.ports.reclaim((container.name, container.labels[PORT_LABEL]) for container in containers)
+        self.core_planner.reclaim(
+            (container.name, cpuset)
+            for container in containers
+            if (cpuset := container.attrs.get("HostConfig", {}).get("CpusetCpus"))
+        )
+
+    def profile_for(self, scenario: str) -> ResourceProfile:
+        return self.profiles.get(scenario, self.default_profile)
+
+    def _new_session(self, keep_position: bool = False):
+        self.session_id = int(Snowflake.new())
+        self.log_follower.reset(keep_position=keep_position)
+        self.search_index.clear()
+        self.archives.begin(str(self.session_id))
+
+    def _follow(self):
+        # The log follower is left running on stop, so it picks up the last lines before the container exits
+        self.stats.start(self.container)
+        self.log_follower.start(self.container)
+
+    @property
+    def image(self) -> str:
+        return f"{self.image_name}:{self.version}"
+
     def pull(self):
         # docker pull vanosten/hunter_container:1.12.0
         self.client.images.pull(self.image_name, tag=self.version)
 
-    def run(self, config: HunterConfig):
+    def ensure_image(self):
+        try:
+            self.client.images.get(self.image)
+        except docker.errors.ImageNotFound:
+            self.pull()
+
+    def run(self, config: HunterConfig, progress: Callable[[str], None] = lambda phase: None):
+        """
+        Creates and starts a new container. Each phase is reported to ``progress`` before it begins.
+        """
         if self.running:
             raise HunterRunningError("Container already running")
 
+        progress("Checking image")
+        self.ensure_image()
+
+        progress("Creating container")
         if self.exists:
             self.container.remove()
+        self.ports.release(self.container_name)
+        if self.network_mode == "host":
+            block = None
+            conflicts = find_udp_conflicts(
+                self.mp_ports,
+                self.client.containers.list(),
+                self.container_name,
+                probe=on_host_network(self.client),
+            )
+            if conflicts:
+                raise PortConflictError(
+                    "Hunter's MP ports are already in use on the host:\n" + "\n".join(conflicts),
+                    recommendation="Stop whatever uses the ports, or run hunter without `HUNTER_NETWORK_MODE=host`",
+                )
+        else:
+            block = self.ports.allocate(self.container_name)
+        profile = self.profile_for(config.scenario)
+        cpuset = self.core_planner.plan(self.container_name, profile.cores)
+
+        try:
+            self.container = self._create(config, block, profile.create_kwargs(cpuset))
+        except docker.errors.APIError:
+            self.ports.release(self.container_name)
+            self.core_planner.release(self.container_name)
+            raise
+        self.config = config
 
-        self.container = self.client.containers.run(
-            self.image_name,
+        progress("Starting container")
+        self.started_at = time.monotonic()
+        self.container.start()
+        self._new_session()
+        self._follow()
+
+    def _create(self, config: HunterConfig, block: PortBlock | None, limits: dict[str, Any]) -> Container:
+        if block is None:
+            # Labelled without a block, so the container's core plan is still reclaimed on startup
+            network: dict[str, Any] = {"network_mode": "host", "labels": {PORT_LABEL: "host"}}
+        else:
+            # Publish the MP ports on the allocated block, so clients can find the session
+            network = {
+                "ports": {f"{port}/udp": block.start + offset for offset, port in enumerate(self.mp_ports)},
+                "labels": {PORT_LABEL: str(block)},
+            }
+        return self.client.containers.create(
+            self.image,
             " ".join((
                 "-i OPFOR",
                 # "-c "  # MP Chat controller callsign
@@ -152,13 +355,11 @@ class Hunter:
                 f"-y {config.human_defenders}" if config.human_defenders else ""
             )),
             # auto_remove=True,
-            detach=True,
             name=self.container_name,
-            # ports={"5001-5110": "5001-5110/udp"},
-            publish_all_ports=True,
             volumes=[f"{os.path.dirname(os.path.dirname(os.path.realpath(__file__)))}/hunter-scenarios:/hunter-scenarios"],
+            **network,
+            **limits,
         )
-        self.config = config
 
     def start(self):
         if self.running:
@@ -167,18 +368,25 @@ class Hunter:
         if not self.exists:
             raise HunterRunningError("Container does not exist yet")
 
+        self.started_at = time.monotonic()
         self.container.start()
+        self._new_session(keep_position=True)
+        self._follow()
 
     def restart(self):
         if not self.running:
             raise HunterRunningError("Container not running!")
 
         self.container.restart()
+        # Restarting stops the container first, so hunter only starts once restart returns
+        self.started_at = time.monotonic()
+        self._follow()
 
     def stop(self):
         if not self.running:
             raise HunterRunningError("Container not running")
 
+        self.stats.stop()
         self.container.stop()
 
     def logs(self):
@@ -186,3 +394,23 @@ class Hunter:
             raise HunterRunningError("Container does not exist")
 
         return self.container.logs().decode("utf-8")
+
+    def index_for(self, session_id: str) -> InvertedIndex:
+        """
+        Returns the search index for a session. The current session's index is maintained as logs stream in, older
+        sessions are indexed from their archive on first use, and the two most recent of those are cached.
+        """
+        if session_id == str(self.session_id):
+            return self.search_index
+        if (index := self._archive_indexes.get(session_id)) is None:
+            index = InvertedIndex.from_archive(self.archives.open(session_id))
+            self._archive_indexes[session_id] = index
+            if len(self._archive_indexes) > 2:
+                self._archive_indexes.popitem(last=False)
+        self._archive_indexes.move_to_end(session_id)
+        return index
+
+    def close(self):
+        self.stats.stop()
+        self.log_follower.stop()
+        self.archives.flush()
@@ -0,0 +1,222 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import datetime
+import logging
+import statistics
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import humanize
+from discord import HTTPException
+
+from .error import BaseError
+from .logs import EventKind, LogEvent
+from .models import HunterSession
+
+if TYPE_CHECKING:
+    from .core import Bot
+
+__all__ = ("IdleMonitor",)
+
+_log = logging.getLogger(__name__)
+
+
+class IdleMonitor:
+    """
+    Stops hunter sessions that nobody uses.
+
+    A session is active while any MP client is connected, as seen from connect and disconnect events in the log, or
+    while its CPU use is clearly above the baseline of an empty session. The baseline is learned from the CPU use of
+    the session while nobody is connected and it isn't active, and is learned again for every session. Once a session
+    was idle for ``warning`` seconds less than ``timeout``, the channel it was started from is warned, and once it was
+    idle for ``timeout`` seconds it is stopped.
+
+    Stopped sessions would otherwise have kept using their baseline CPU, which is counted as reclaimed until the next
+    session starts. The total is kept in the persistent store.
+
+    Parameters
+    ----------
+    bot: Bot
+        The bot.
+    timeout: float
+        The number of idle seconds after which a session is stopped. Zero disables the monitor.
+    warning: float
+        The number of seconds before stopping to warn.
+    cpu_margin: float
+        How many percentage points above the baseline CPU use counts as activity.
+    interval: float
+        The number of seconds between checks.
+    """
+
+    # How much each idle check moves the baseline towards the current CPU use
+    baseline_weight = 0.1
+
+    def __init__(
+            self,
+            bot: "Bot",
+            timeout: float = 30 * 60,
+            warning: float = 5 * 60,
+            cpu_margin: float = 10.0,
+            interval: float = 30.0,
+    ) -> None:
+        self.bot = bot
+        self.timeout = timeout
+        self.warning = warning
+        self.cpu_margin = cpu_margin
+        self.interval = interval
+        self.clients: set[str] = set()
+        self.baseline: float | None = None
+        self.last_activity = time.monotonic()
+        self.warned = False
+        # The session may have survived a restart of the bot
+        self._session_id = bot.hunter.session_id
+        self._lock = threading.Lock()
+        self._task: asyncio.Task[None] | None = None
+        bot.hunter.events.subscribe(self._on_event)
+        self._replay_clients()
+
+    @property
+    def reclaimed_cpu_hours(self) -> float:
+        """The CPU-hours idle sessions would have used if they weren't stopped."""
+        store = self.bot.hunter.persistent_store
+        total = store.idle_reclaimed or 0.0
+        if store.idle_stopped is not None:
+            stopped_at, cores = store.idle_stopped
+            total += (time.time() - stopped_at) / 3600 * cores
+        return total
+
+    def start(self) -> None:
+        """Starts checking for idle sessions, unless the monitor is disabled."""
+        if self.timeout > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop())
+
+    def stop(self) -> None:
+        """Stops checking for idle sessions."""
+        if self._task is not None:
+            self._task.cancel()
+
+    def _replay_clients(self) -> None:
+        # Events replayed from the archive of a resumed session were stored before anyone subscribed
+        events = self.bot.hunter.events
+        replayed = events.find(EventKind.CLIENT_CONNECTED) + events.find(EventKind.CLIENT_DISCONNECTED)
+        for event in sorted(replayed, key=lambda e: e.line):
+            self._on_event(event)
+
+    def _on_event(self, event: LogEvent) -> None:
+        # Called from the log follower thread
+        if event.kind not in (EventKind.CLIENT_CONNECTED, EventKind.CLIENT_DISCONNECTED):
+            return
+        with self._lock:
+            if event.kind == EventKind.CLIENT_CONNECTED:
+                self.clients.add(event.subject)
+            else:
+                self.clients.discard(event.subject)
+            self.last_activity = time.monotonic()
+
+    def _reset(self) -> None:
+        with self._lock:
+            self.clients.clear()
+            self.last_activity = time.monotonic()
+            self.warned = False
+            self.baseline = None
+            self._session_id = self.bot.hunter.session_id
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception:  # pylint: disable=broad-except
+                _log.exception("Idle check failed")
+
+    def _cpu_active(self, learn: bool) -> bool:
+        if not (samples := self.bot.hunter.stats.history("cpu_percent", int(self.interval))):
+            return False
+        cpu = statistics.fmean(samples)
+        if self.baseline is not None and cpu > self.baseline + self.cpu_margin:
+            return True
+        # Only learn from idle periods, so activity doesn't raise the baseline
+        if not learn:
+            return False
+        if self.baseline is None:
+            self.baseline = cpu
+        else:
+            self.baseline += (cpu - self.baseline) * self.baseline_weight
+        return False
+
+    async def check(self) -> None:
+        """Checks whether the current session is idle, and warns or stops it."""
+        hunter = self.bot.hunter
+        if not await asyncio.to_thread(lambda: hunter.running):
+            return
+        store = hunter.persistent_store
+        if store.idle_stopped is not None:
+            # A new session started, so the stopped one stops counting as reclaimed
+            store.idle_reclaimed = self.reclaimed_cpu_hours
+            store.idle_stopped = None
+        if hunter.session_id != self._session_id:
+            self._reset()
+
+        with self._lock:
+            if connected := bool(self.clients):
+                self.last_activity = time.monotonic()
+        if self._cpu_active(learn=not connected):
+            self.last_activity = time.monotonic()
+            self.warned = False
+
+        idle = time.monotonic() - self.last_activity
+        if idle >= self.timeout:
+            await self._stop_idle(idle)
+        elif idle >= self.timeout - self.warning and not self.warned:
+            self.warned = True
+            remaining = datetime.timedelta(seconds=self.timeout - idle)
+            await self._notify(
+                f"Hunter has been idle for {humanize.naturaldelta(idle)}, and will be stopped in "
+                f"{humanize.naturaldelta(remaining)} unless someone connects."
+            )
+        elif idle < self.timeout - self.warning:
+            self.warned = False
+
+    async def _stop_idle(self, idle: float) -> None:
+        cores = (self.baseline or 0.0) / 100
+        try:
+            await self.bot.lifecycle.stop()
+        except BaseError as e:
+            # Someone else stopped it in the meantime
+            _log.info("Idle stop skipped: %s", e.message)
+            return
+        self.bot.hunter.persistent_store.idle_stopped = (time.time(), cores)
+        _log.info("Stopped hunter after %.0f idle seconds, idle CPU use %.2f cores", idle, cores)
+        await self._notify(
+            f"Stopped hunter after {humanize.naturaldelta(idle)} without activity. Idle shutdowns have reclaimed "
+            f"about {self.reclaimed_cpu_hours:.1f} CPU-hours so far."
+        )
+
+    async def _notify(self, message: str) -> None:
+        if (session_id := self.bot.hunter.session_id) is None:
+            return
+        session = await HunterSession.get_or_none(id=session_id)
+        if session is None or session.channel_id is None:
+            return
+        channel = self.bot.get_partial_messageable(session.channel_id)
+        try:
+            await self.bot.outbound.send(channel, message)
+        except HTTPException:
+            _log.warning("Failed to send idle notice to channel %s", session.channel_id, exc_info=True)
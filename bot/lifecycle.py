@@ -0,0 +1,389 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable, Hashable
+from typing import TYPE_CHECKING, Any
+
+from discord import HTTPException
+from docker.errors import APIError
+
+from .error import ErrorExc, InfoExc
+from .hunter import HunterConfig
+from .metrics import Histogram
+from .models import HunterSession
+
+if TYPE_CHECKING:
+    from .core import Bot
+
+__all__ = "ProgressReporter", "LifecycleQueue"
+
+_log = logging.getLogger(__name__)
+
+
+Progress = Callable[[str], None]
+
+
+class ProgressReporter:
+    """
+    Streams the phases of a lifecycle operation into a message. Phases can be reported as often as they happen, but the
+    message is edited at most once per ``interval`` seconds, and phases reported in between are coalesced.
+
+    Parameters
+    ----------
+    title: str
+        The first line of the message.
+    edit: Callable[[str], Awaitable[Any]]
+        Edits the message to the given content.
+    interval: float
+        The minimum number of seconds between edits.
+    """
+
+    def __init__(self, title: str, edit: Callable[[str], Awaitable[Any]], interval: float = 1.5) -> None:
+        self.title = title
+        self.edit = edit
+        self.interval = interval
+        self.phases: list[str] = []
+        self.result: str | None = None
+        self.failed = False
+        self.finished = False
+        self._last_edit = time.monotonic()
+        self._task: asyncio.Task[None] | None = None
+
+    def __call__(self, phase: str) -> None:
+        self.phases.append(phase)
+        if not self.finished and (self._task is None or self._task.done()):
+            delay = max(self._last_edit + self.interval - time.monotonic(), 0)
+            self._task = asyncio.create_task(self._flush(delay))
+
+    def render(self) -> str:
+        """
+        Renders the message.
+
+        Returns
+        -------
+        str
+            The message content.
+        """
+        lines = [self.title]
+        for n, phase in enumerate(self.phases, 1):
+            if n < len(self.phases) or self.result is not None:
+                lines.append(f"✅ {phase}")
+            else:
+                lines.append(f"{"❌" if self.failed else "⏳"} {phase}")
+        if self.failed and not self.phases:
+            lines.append("❌ Failed")
+        if self.result is not None:
+            lines.append(self.result)
+        return "\n".join(lines)
+
+    async def _flush(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._last_edit = time.monotonic()
+        try:
+            await self.edit(self.render())
+        except HTTPException:
+            _log.warning("Failed to update progress message", exc_info=True)
+
+    async def finish(self, result: str | None = None, failed: bool = False) -> None:
+        """
+        Edits the message a final time, right away.
+
+        Parameters
+        ----------
+        result: str | None
+            A line to append once every phase completed.
+        failed: bool
+            Whether the operation failed during the last phase.
+        """
+        if self._task is not None:
+            self._task.cancel()
+        self.finished = True
+        self.failed = failed
+        if not failed:
+            self.result = result
+        await self._flush(0)
+
+
+class _Operation:
+    __slots__ = ("key", "func", "future", "phases", "listeners", "_loop")
+
+    def __init__(self, key: Hashable, func: Callable[[Progress], Awaitable[Any]]) -> None:
+        self.key = key
+        self.func = func
+        self._loop = asyncio.get_running_loop()
+        self.future: asyncio.Future[Any] = self._loop.create_future()
+        self.phases: list[str] = []
+        self.listeners: list[Progress] = []
+
+    def listen(self, progress: Progress) -> None:
+        for phase in self.phases:
+            progress(phase)
+        self.listeners.append(progress)
+
+    def report(self, phase: str) -> None:
+        # Docker calls report progress from a worker thread
+        self._loop.call_soon_threadsafe(self._report, phase)
+
+    def _report(self, phase: str) -> None:
+        self.phases.append(phase)
+        for progress in self.listeners:
+            progress(phase)
+
+
+class LifecycleQueue:
+    """
+    Runs hunter lifecycle operations (run, start, restart, stop) one at a time, in the order they were requested.
+
+    State checks happen inside the queue, right before the operation, so two requests can't both pass a check and then
+    act. A request that is identical to one that is queued or in progress is not queued again: it waits for the existing
+    operation and gets the same result (or exception), so five Stop clicks make a single Docker call.
+
+    Operations that start hunter wait until it is ready, and record how long that took in :attr:`time_to_ready`, keyed
+    by scenario and version. The wait happens after the operation leaves the queue, so a stop is never stuck behind a
+    start that doesn't get ready.
+
+    Parameters
+    ----------
+    bot: Bot
+        The bot.
+    """
+
+    def __init__(self, bot: "Bot") -> None:
+        self.bot = bot
+        self.executed = 0
+        self.collapsed = 0
+        self.ready_timeout = float(os.getenv("HUNTER_READY_TIMEOUT", 300))
+        self.time_to_ready = Histogram((5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300))
+        self._queue: asyncio.Queue[_Operation] = asyncio.Queue()
+        self._operations: dict[Hashable, _Operation] = {}
+        self._worker: asyncio.Task[None] | None = None
+
+    @property
+    def pending(self) -> int:
+        """The number of operations that are queued or in progress."""
+        return len(self._operations)
+
+    async def submit(
+            self,
+            key: Hashable,
+            func: Callable[[Progress], Awaitable[Any]],
+            progress: Progress | None = None,
+    ) -> Any:
+        """
+        Queues an operation, or joins an identical one that is already queued or in progress.
+
+        Parameters
+        ----------
+        key: Hashable
+            Identifies the operation. Operations with equal keys are collapsed.
+        func: Callable[[Progress], Awaitable[Any]]
+            The operation. It is passed a callable to report the phases of the operation with, which is safe to call
+            from any thread.
+        progress: Progress | None
+            Called on the event loop with each phase of the operation, including phases reported before joining it.
+
+        Returns
+        -------
+        Any
+            The result of the operation.
+        """
+        if (operation := self._operations.get(key)) is not None:
+            self.collapsed += 1
+        else:
+            operation = self._operations[key] = _Operation(key, func)
+            self._queue.put_nowait(operation)
+            if self._worker is None or self._worker.done():
+                self._worker = asyncio.create_task(self._work())
+        if progress is not None:
+            operation.listen(progress)
+        # A requester giving up must not cancel the operation for everyone else
+        return await asyncio.shield(operation.future)
+
+    async def _work(self) -> None:
+        while True:
+            operation = await self._queue.get()
+            try:
+                result = await operation.func(operation.report)
+            except Exception as exc:  # pylint: disable=broad-except
+                operation.future.set_exception(exc)
+            else:
+                operation.future.set_result(result)
+            finally:
+                self.executed += 1
+                del self._operations[operation.key]
+                # Everyone viewing the status should see the outcome
+                self.bot.live_status.invalidate()
+            # Retrieve the exception, so it isn't reported as unhandled if every requester gave up
+            if not operation.future.cancelled():
+                operation.future.exception()
+
+    async def run(
+            self,
+            config: HunterConfig,
+            user_id: int | None = None,
+            channel_id: int | None = None,
+            progress: Progress | None = None,
+    ) -> float:
+        """
+        Creates and starts a new hunter container, records a new session, and waits until hunter is ready.
+
+        Parameters
+        ----------
+        config: HunterConfig
+            The hunter configuration.
+        user_id: int | None
+            The ID of the user who requested the session.
+        channel_id: int | None
+            The ID of the channel the session was requested in.
+        progress: Progress | None
+            Called with each phase of the operation.
+        """
+        key = ("run", tuple(config.to_dict().items()))
+        ready = await self.submit(key, lambda report: self._run(report, config, user_id, channel_id), progress)
+        return await asyncio.shield(ready)
+
+    async def start(
+            self,
+            user_id: int | None = None,
+            channel_id: int | None = None,
+            progress: Progress | None = None,
+    ) -> float:
+        """
+        Starts the existing hunter container with its last configuration, records a new session, and waits until hunter
+        is ready.
+
+        Parameters
+        ----------
+        user_id: int | None
+            The ID of the user who requested the session.
+        channel_id: int | None
+            The ID of the channel the session was requested in.
+        progress: Progress | None
+            Called with each phase of the operation.
+        """
+        ready = await self.submit(("start",), lambda report: self._start(report, user_id, channel_id), progress)
+        return await asyncio.shield(ready)
+
+    async def restart(self, progress: Progress | None = None) -> float:
+        """
+        Restarts the running hunter container, and waits until hunter is ready.
+
+        Parameters
+        ----------
+        progress: Progress | None
+            Called with each phase of the operation.
+        """
+        ready = await self.submit(("restart",), self._restart, progress)
+        return await asyncio.shield(ready)
+
+    async def stop(self, progress: Progress | None = None) -> None:
+        """
+        Stops the running hunter container, and ends its session.
+
+        Parameters
+        ----------
+        progress: Progress | None
+            Called with each phase of the operation.
+        """
+        await self.submit(("stop",), self._stop, progress)
+
+    async def _running(self) -> bool:
+        return await asyncio.to_thread(lambda: self.bot.hunter.running)
+
+    async def _run(
+            self,
+            report: Progress,
+            config: HunterConfig,
+            user_id: int | None,
+            channel_id: int | None,
+    ) -> asyncio.Task[float]:
+        if await self._running():
+            raise InfoExc("Hunter is already running!")
+        await self._close_session()
+        ready = self.bot.hunter.readiness.arm()
+        try:
+            await asyncio.to_thread(self.bot.hunter.run, config, report)
+        except APIError as e:
+            raise ErrorExc(
+                "Could not start session. Likely the docker daemon is disconnected, "
+                "please contact the owner of this bot"
+            ) from e
+        await self._open_session(config, user_id, channel_id)
+        return self._await_ready(report, ready)
+
+    async def _start(self, report: Progress, user_id: int | None, channel_id: int | None) -> asyncio.Task[float]:
+        if await self._running():
+            raise InfoExc("Hunter is already running!")
+        if not self.bot.hunter.exists:
+            raise InfoExc("Hunter container unavailable!")
+        await self._close_session()
+        report("Starting container")
+        ready = self.bot.hunter.readiness.arm()
+        await asyncio.to_thread(self.bot.hunter.start)
+        await self._open_session(self.bot.hunter.config, user_id, channel_id)
+        return self._await_ready(report, ready)
+
+    async def _restart(self, report: Progress) -> asyncio.Task[float]:
+        if not await self._running():
+            raise InfoExc("Hunter is not running yet!")
+        report("Restarting container")
+        ready = self.bot.hunter.readiness.arm()
+        await asyncio.to_thread(self.bot.hunter.restart)
+        return self._await_ready(report, ready)
+
+    def _await_ready(self, report: Progress, ready: asyncio.Future[float]) -> asyncio.Task[float]:
+        # Runs outside the queue, every requester of the operation awaits the same task
+        task = asyncio.create_task(self._wait_ready(report, ready))
+        # Retrieve the exception, so it isn't reported as unhandled if every requester gave up
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _wait_ready(self, report: Progress, ready: asyncio.Future[float]) -> float:
+        hunter = self.bot.hunter
+        report("Waiting for hunter to be ready")
+        seen = await hunter.readiness.wait(ready, lambda: hunter.running, self.ready_timeout)
+        # Restarts only record the start time once the restart returns, which a quick hunter can beat
+        elapsed = max(seen - hunter.started_at, 0)
+        self.time_to_ready.observe(elapsed, (hunter.config.scenario, hunter.version))
+        return elapsed
+
+    async def _stop(self, report: Progress) -> None:
+        if not await self._running():
+            raise InfoExc("Hunter is not running yet!")
+        report("Stopping container")
+        await asyncio.to_thread(self.bot.hunter.stop)
+        await self._close_session()
+
+    async def _open_session(self, config: HunterConfig, user_id: int | None, channel_id: int | None) -> None:
+        await HunterSession.begin(
+            self.bot.hunter.session_id,
+            config.to_dict(),
+            version=self.bot.hunter.version,
+            started_by=user_id,
+            channel_id=channel_id,
+        )
+
+    async def _close_session(self) -> None:
+        if self.bot.hunter.session_id is None:
+            return
+        session = await HunterSession.get_or_none(id=self.bot.hunter.session_id)
+        if session is not None:
+            await session.end(await asyncio.to_thread(lambda: self.bot.hunter.exit_code))
@@ -0,0 +1,350 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any, Self
+
+import discord
+import humanize
+from discord import Embed, HTTPException, Message, NotFound, PartialMessage
+from discord.ui import View
+
+from .models import HunterSession
+from .ports import format_port_ranges
+from .resources import describe_limits
+from .utils import embed, sparkline
+
+if TYPE_CHECKING:
+    from .core import Bot
+
+__all__ = "StatusSnapshot", "LiveStatus"
+
+_log = logging.getLogger(__name__)
+
+
+class StatusSnapshot:
+    """
+    A point-in-time capture of everything the status message shows. Capturing makes a single request to the Docker
+    daemon, no matter how many messages are rendered from the snapshot.
+    """
+
+    def __init__(
+            self,
+            status: str,
+            exists: bool,
+            running: bool,
+            config: dict[str, Any] | None,
+            resources: str | None,
+            last_session: HunterSession | None,
+            ports: str | None = None,
+            limits: str | None = None,
+    ) -> None:
+        self.status = status
+        self.exists = exists
+        self.running = running
+        self.config = config
+        self.resources = resources
+        self.last_session = last_session
+        self.ports = ports
+        self.limits = limits
+        self.taken_at = time.monotonic()
+
+    @classmethod
+    async def capture(cls, bot: "Bot") -> Self:
+        """
+        Captures the current status.
+
+        Parameters
+        ----------
+        bot: Bot
+            The bot to capture the hunter status of.
+
+        Returns
+        -------
+        StatusSnapshot
+            The snapshot.
+        """
+        hunter = bot.hunter
+        exists = await asyncio.to_thread(lambda: hunter.exists)
+        status = hunter.container.status if exists else "unavailable"
+        running = status == "running"
+        return cls(
+            status=status,
+            exists=exists,
+            running=running,
+            config=hunter.config.to_dict() if hunter.config is not None else None,
+            resources=cls._render_resources(bot) if running else None,
+            last_session=next(iter(await HunterSession.page(limit=1)), None),
+            # Only published while the container runs
+            ports=format_port_ranges(hunter.published_ports()) or None if running else None,
+            limits=describe_limits(hunter.container.attrs.get("HostConfig", {})) if exists else None,
+        )
+
+    @staticmethod
+    def _render_resources(bot: "Bot", window: int = 5 * 60) -> str | None:
+        stats = bot.hunter.stats
+        if (current := stats.current())["rss"] is None:
+            return None
+        net = (current["net_rx"] or 0) + (current["net_tx"] or 0)
+        blk = (current["blk_read"] or 0) + (current["blk_write"] or 0)
+        return "\n".join((
+            f"CPU: `{current["cpu_percent"]:.1f}%` `{sparkline(stats.history("cpu_percent", window), minimum=0)}`",
+            f"Memory: `{humanize.naturalsize(current["rss"], binary=True)}` "
+            f"`{sparkline(stats.history("rss", window), minimum=0)}`",
+            f"Network: `{humanize.naturalsize(net, binary=True)}/s` "
+            f"`{sparkline(stats.history("net_rx", window), minimum=0)}`",
+            f"Block I/O: `{humanize.naturalsize(blk, binary=True)}/s`",
+        ))
+
+    def signature(self) -> tuple[Any, ...]:
+        """
+        Returns a value that changes whenever the rendered status would change.
+
+        Returns
+        -------
+        tuple
+            The signature.
+        """
+        last_session = self.last_session
+        return (
+            self.status,
+            self.config,
+            self.resources,
+            self.ports,
+            self.limits,
+            (last_session.id, last_session.stopped_at) if last_session is not None else None,
+        )
+
+    def to_embed(self) -> Embed:
+        """
+        Renders the snapshot as an embed.
+
+        Returns
+        -------
+        Embed
+            The status embed.
+        """
+        em = embed(
+            title="Hunter Status",
+            description=self.status.title(),
+        )
+        if self.config is not None:
+            em.add_field(name="Scenario", value=self.config["scenario"].title())
+            em.add_field(name="GCI", value=self.config["gci"])
+            em.add_field(name="Hostility", value=self.config["hostility"])
+            em.add_field(name="Human Defenders", value=self.config["human_defenders"])
+        if self.ports is not None:
+            em.add_field(name="MP Ports (UDP)", value=f"`{self.ports}`")
+        if self.limits is not None:
+            em.add_field(name="Limits", value=self.limits)
+        if self.resources is not None:
+            em.add_field(name="Resources (last 5 minutes)", value=self.resources, inline=False)
+        if (last_session := self.last_session) is not None:
+            em.add_field(
+                name="Last Session",
+                value=f"`{last_session.id}` started {discord.utils.format_dt(last_session.started_at, "R")}"
+                + (f" by <@{last_session.started_by}>" if last_session.started_by is not None else ""),
+                inline=False,
+            )
+        return em
+
+
+class _Registration:
+    __slots__ = ("message", "registered_at", "last_edit", "task")
+
+    def __init__(self, message: PartialMessage) -> None:
+        self.message = message
+        self.registered_at = self.last_edit = time.monotonic()
+        self.task: asyncio.Task[None] | None = None
+
+
+class LiveStatus:
+    """
+    Keeps every status message up to date from a single shared :class:`StatusSnapshot`.
+
+    The snapshot is refreshed when something invalidates it (e.g. a lifecycle button) and periodically while any
+    message is registered. Each refresh is rendered into every registered message, but edits to each message are
+    debounced: at most one edit is made per ``edit_interval``, and updates that arrive in between are coalesced into
+    that edit. Messages stop receiving updates ``message_ttl`` seconds after they were registered, so the number of
+    tracked messages stays bounded.
+
+    Messages are edited with the bot token rather than the interaction token, which expires after 15 minutes. Button
+    states are rendered with :attr:`render_view`, which should return a view that is not stored by the client.
+
+    Parameters
+    ----------
+    bot: Bot
+        The bot.
+    edit_interval: float
+        The minimum number of seconds between edits to the same message.
+    refresh_interval: float
+        The number of seconds between periodic refreshes while messages are registered.
+    message_ttl: float
+        The number of seconds a message receives updates for after it was registered.
+    """
+
+    def __init__(
+            self,
+            bot: "Bot",
+            edit_interval: float = 5.0,
+            refresh_interval: float = 30.0,
+            message_ttl: float = 60 * 60,
+    ) -> None:
+        self.bot = bot
+        self.edit_interval = edit_interval
+        self.refresh_interval = refresh_interval
+        self.message_ttl = message_ttl
+        self.render_view: Callable[[StatusSnapshot], View] | None = None
+        self.snapshot: StatusSnapshot | None = None
+        self.edits = 0
+        self.coalesced = 0
+        self._registrations: dict[int, _Registration] = {}
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task[None] | None = None
+        self._dirty = False
+        self._loop_task: asyncio.Task[None] | None = None
+
+    async def get_snapshot(self, max_age: float | None = None) -> StatusSnapshot:
+        """
+        Returns the current snapshot, refreshing it if it is older than ``max_age`` seconds.
+
+        Parameters
+        ----------
+        max_age: float | None
+            The maximum age of the snapshot. Defaults to the edit interval.
+
+        Returns
+        -------
+        StatusSnapshot
+            The snapshot.
+        """
+        if max_age is None:
+            max_age = self.edit_interval
+        if self.snapshot is None or time.monotonic() - self.snapshot.taken_at > max_age:
+            await self.refresh()
+        assert self.snapshot is not None
+        return self.snapshot
+
+    async def refresh(self) -> StatusSnapshot:
+        """
+        Captures a new snapshot. Concurrent callers share a single capture.
+
+        Returns
+        -------
+        StatusSnapshot
+            The new snapshot.
+        """
+        requested = time.monotonic()
+        async with self._refresh_lock:
+            # Someone else captured a snapshot while we were waiting
+            if self.snapshot is not None and self.snapshot.taken_at >= requested:
+                return self.snapshot
+            self.snapshot = await StatusSnapshot.capture(self.bot)
+            return self.snapshot
+
+    def register(self, message: Message) -> None:
+        """
+        Registers a status message to receive updates. Registering a message again restarts its TTL.
+
+        Parameters
+        ----------
+        message: Message
+            The status message.
+        """
+        self.unregister(message.id)
+        partial = self.bot.get_partial_messageable(message.channel.id).get_partial_message(message.id)
+        self._registrations[message.id] = _Registration(partial)
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._refresh_loop())
+
+    def unregister(self, message_id: int) -> None:
+        """
+        Stops updating a status message.
+
+        Parameters
+        ----------
+        message_id: int
+            The ID of the message.
+        """
+        if (registration := self._registrations.pop(message_id, None)) is not None and registration.task is not None:
+            registration.task.cancel()
+
+    def invalidate(self) -> None:
+        """
+        Marks the snapshot as stale. A new snapshot is captured and fanned out to every registered message. If a
+        refresh is already running, another one follows it, since the running one may have captured the old state.
+        """
+        self._dirty = True
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_until_clean())
+
+    async def _refresh_until_clean(self) -> None:
+        while self._dirty:
+            self._dirty = False
+            await self._refresh_and_fan_out(force=True)
+
+    async def _refresh_loop(self) -> None:
+        while self._registrations:
+            await asyncio.sleep(self.refresh_interval)
+            self._expire()
+            await self._refresh_and_fan_out()
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.message_ttl
+        for message_id, registration in list(self._registrations.items()):
+            if registration.registered_at < deadline:
+                self.unregister(message_id)
+
+    async def _refresh_and_fan_out(self, force: bool = False) -> None:
+        previous = self.snapshot.signature() if self.snapshot is not None else None
+        try:
+            snapshot = await self.refresh()
+        except Exception:  # pylint: disable=broad-except
+            _log.exception("Failed to refresh hunter status")
+            return
+        if not force and snapshot.signature() == previous:
+            return
+        for registration in list(self._registrations.values()):
+            self._schedule_edit(registration)
+
+    def _schedule_edit(self, registration: _Registration) -> None:
+        if registration.task is not None and not registration.task.done():
+            # An edit is already waiting, and it will render the newest snapshot
+            self.coalesced += 1
+            return
+        delay = max(registration.last_edit + self.edit_interval - time.monotonic(), 0)
+        registration.task = asyncio.create_task(self._edit(registration, delay))
+
+    async def _edit(self, registration: _Registration, delay: float) -> None:
+        await asyncio.sleep(delay)
+        snapshot = self.snapshot
+        if snapshot is None:
+            return
+        kwargs: dict[str, Any] = {"embed": snapshot.to_embed()}
+        if self.render_view is not None:
+            kwargs["view"] = self.render_view(snapshot)
+        registration.last_edit = time.monotonic()
+        try:
+            await self.bot.outbound.edit(registration.message, **kwargs)
+            self.edits += 1
+        except NotFound:
+            self._registrations.pop(registration.message.id, None)
+        except HTTPException:
+            _log.warning("Failed to update status message %s", registration.message.id, exc_info=True)
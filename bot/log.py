@@ -0,0 +1,178 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import atexit
+import copy
+import datetime
+import json
+import logging
+import queue
+import sys
+import time
+import traceback
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+__all__ = "fingerprint", "JsonFormatter", "TracebackDeduplicator", "setup_logging"
+
+# Attributes every LogRecord has, so anything else was passed through `extra`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def fingerprint(exc: BaseException) -> tuple[Any, ...]:
+    """
+    Identifies an exception by its type and the chain of frames it was raised through, ignoring the message, so
+    repeats of the same failure with different details are grouped together.
+
+    Parameters
+    ----------
+    exc: BaseException
+        The exception.
+
+    Returns
+    -------
+    tuple
+        The fingerprint.
+    """
+    # Chains can loop, e.g. when a handler re-raises an exception from one it caused. Stop at a repeat, like traceback
+    chain: list[BaseException] = []
+    seen: set[int] = set()
+    current: BaseException | None = exc
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        chain.append(current)
+        current = current.__cause__ or current.__context__
+    result: tuple[Any, ...] | None = None
+    for link in reversed(chain):
+        frames = tuple((frame.filename, frame.lineno, frame.name) for frame in traceback.extract_tb(link.__traceback__))
+        result = type(link).__qualname__, frames, result
+    assert result is not None
+    return result
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as JSON lines. Values passed through ``extra`` are included as fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: dict[str, Any] = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = value
+        return json.dumps(data, default=str)
+
+
+class TracebackDeduplicator(logging.Filter):
+    """
+    Drops the traceback of records that repeat an exception seen within the last ``window`` seconds. The record itself
+    is still logged, with a note of how often the exception repeated. Runs on the logging thread, so fingerprinting
+    costs the event loop nothing.
+
+    Parameters
+    ----------
+    window: float
+        The number of seconds after a full traceback during which repeats are shortened.
+    """
+
+    def __init__(self, window: float = 60.0) -> None:
+        super().__init__()
+        self.window = window
+        self._seen: dict[tuple[Any, ...], tuple[float, int]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not record.exc_info or record.exc_info[1] is None:
+            return True
+        key = fingerprint(record.exc_info[1])
+        now = time.monotonic()
+        first, repeats = self._seen.get(key, (0.0, 0))
+        if now - first > self.window:
+            self._seen[key] = (now, 0)
+            if len(self._seen) > 1024:
+                self._seen = {k: v for k, v in self._seen.items() if now - v[0] <= self.window}
+            return True
+        self._seen[key] = (first, repeats + 1)
+        record.msg = f"{record.getMessage()} ({record.exc_info[0].__name__} repeated {repeats + 1} times in the " \
+                     f"last {now - first:.0f}s, traceback omitted)"
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike the default, don't format the traceback here: it's formatted on the listener thread instead. The
+        # message is merged now, in case its arguments change before the record is handled.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level: int = logging.INFO, json_lines: bool = False, dedupe_window: float = 60.0) -> QueueListener:
+    """
+    Routes all logging through a queue, so formatting and writing happen on a background thread instead of the event
+    loop.
+
+    Parameters
+    ----------
+    level: int
+        The level of the root logger.
+    json_lines: bool
+        Whether to write JSON lines instead of plain text.
+    dedupe_window: float
+        The window in which repeated tracebacks are shortened. See :class:`TracebackDeduplicator`.
+
+    Returns
+    -------
+    QueueListener
+        The running listener. It is stopped, flushing any queued records, at exit.
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    if json_lines:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s:%(levelname)s:%(name)s:%(message)s"))
+    handler.addFilter(TracebackDeduplicator(dedupe_window))
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop, listener)
+    return listener
+
+
+def _stop(listener: QueueListener) -> None:
+    # QueueListener.stop fails if the listener was already stopped
+    if listener._thread is not None:  # pylint: disable=protected-access
+        listener.stop()
@@ -0,0 +1,400 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import bisect
+import logging
+import math
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import NamedTuple
+
+from bot.logs import LogLine
+
+__all__ = "ChunkInfo", "LogArchive", "LogArchiveWriter", "LogArchiveStore"
+
+_log = logging.getLogger(__name__)
+
+# offset, compressed size, first line, line count, first timestamp, last timestamp
+_INDEX_RECORD = struct.Struct("<QIQIdd")
+
+
+class ChunkInfo(NamedTuple):
+    """
+    An entry in the chunk index of a log archive.
+    """
+    offset: int
+    size: int
+    first_line: int
+    line_count: int
+    first_timestamp: float
+    last_timestamp: float
+
+
+class LogArchive:
+    """
+    Read access to the log archive of a single session.
+
+    An archive is a data file of independently zlib-compressed chunks, and an index file of fixed-size records that map
+    each chunk to its byte range, line range and time range. Reading a chunk only decompresses that chunk.
+
+    Parameters
+    ----------
+    path: str
+        The path of the archive, without extension.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        try:
+            with open(f"{path}.idx", "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            # Nothing has been written to the archive yet
+            data = b""
+        # A partially written trailing record is ignored
+        data = data[:len(data) - len(data) % _INDEX_RECORD.size]
+        self.chunks = [ChunkInfo(*record) for record in _INDEX_RECORD.iter_unpack(data)]
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def line_count(self) -> int:
+        """The number of archived lines."""
+        if not self.chunks:
+            return 0
+        return self.chunks[-1].first_line + self.chunks[-1].line_count
+
+    @property
+    def last_timestamp(self) -> float | None:
+        """The timestamp of the last archived line, if known."""
+        for chunk in reversed(self.chunks):
+            if not math.isnan(chunk.last_timestamp):
+                return chunk.last_timestamp
+        return None
+
+    def read_chunk(self, n: int) -> list[str]:
+        """
+        Reads and decompresses a single chunk.
+
+        Parameters
+        ----------
+        n: int
+            The index of the chunk. Negative indices count from the end.
+
+        Returns
+        -------
+        list[str]
+            The lines in the chunk.
+        """
+        chunk = self.chunks[n]
+        with open(f"{self.path}.log", "rb") as f:
+            f.seek(chunk.offset)
+            data = f.read(chunk.size)
+        return zlib.decompress(data).decode("utf-8").split("\n")
+
+    def chunk_for_line(self, line: int) -> int:
+        """
+        Finds the chunk containing a line.
+
+        Parameters
+        ----------
+        line: int
+            The line number.
+
+        Returns
+        -------
+        int
+            The index of the chunk.
+        """
+        return max(bisect.bisect_right(self.chunks, line, key=lambda chunk: chunk.first_line) - 1, 0)
+
+    def chunk_for_time(self, timestamp: float) -> int:
+        """
+        Finds the chunk containing the lines logged at a point in time.
+
+        Parameters
+        ----------
+        timestamp: float
+            The POSIX timestamp.
+
+        Returns
+        -------
+        int
+            The index of the chunk.
+        """
+        starts = [-math.inf if math.isnan(chunk.first_timestamp) else chunk.first_timestamp for chunk in self.chunks]
+        return max(bisect.bisect_right(starts, timestamp) - 1, 0)
+
+
+class LogArchiveWriter:
+    """
+    Appends log lines to a session's archive, compressing a chunk each time ``chunk_size`` bytes of text are buffered.
+
+    Parameters
+    ----------
+    path: str
+        The path of the archive, without extension.
+    chunk_size: int
+        The uncompressed size at which a chunk is written.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 64 * 1024) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.pending: list[str] = []
+        self._pending_size = 0
+        self._first_line: int | None = None
+        self._first_timestamp = math.nan
+        self._last_timestamp = math.nan
+        self.lock = threading.Lock()
+        if os.path.exists(f"{path}.idx"):
+            self.next_line = LogArchive(path).line_count
+        else:
+            self.next_line = 0
+
+    def append(self, line: LogLine) -> int:
+        """
+        Appends a line, writing a chunk if enough lines are buffered.
+
+        Parameters
+        ----------
+        line: LogLine
+            The line to append.
+
+        Returns
+        -------
+        int
+            The number of bytes written to disk.
+        """
+        with self.lock:
+            if self._first_line is None:
+                self._first_line = self.next_line
+                self._first_timestamp = line.timestamp if line.timestamp is not None else math.nan
+            if line.timestamp is not None:
+                self._last_timestamp = line.timestamp
+            self.pending.append(line.text)
+            self._pending_size += len(line.text) + 1
+            self.next_line += 1
+            if self._pending_size >= self.chunk_size:
+                return self._write_chunk()
+        return 0
+
+    def flush(self) -> int:
+        """
+        Writes any buffered lines as a (possibly smaller) chunk.
+
+        Returns
+        -------
+        int
+            The number of bytes written to disk.
+        """
+        with self.lock:
+            return self._write_chunk()
+
+    def _write_chunk(self) -> int:
+        if not self.pending:
+            return 0
+        data = zlib.compress("\n".join(self.pending).encode("utf-8"))
+        with open(f"{self.path}.log", "ab") as f:
+            offset = f.tell()
+            f.write(data)
+        record = _INDEX_RECORD.pack(
+            offset,
+            len(data),
+            self._first_line,
+            len(self.pending),
+            self._first_timestamp,
+            self._last_timestamp,
+        )
+        # The index is written after the data, so a crash never leaves an index entry pointing at missing data
+        with open(f"{self.path}.idx", "ab") as f:
+            f.write(record)
+        self.pending = []
+        self._pending_size = 0
+        self._first_line = None
+        self._first_timestamp = self._last_timestamp = math.nan
+        return len(data) + len(record)
+
+
+class LogArchiveStore:
+    """
+    A directory of per-session log archives with size-based retention. When the archives exceed ``max_bytes``, the
+    least recently used archives are deleted. Use is tracked through the modification time of the index file, so the
+    order survives restarts.
+
+    Parameters
+    ----------
+    root: str
+        The directory to store archives in.
+    max_bytes: int
+        The maximum total size of all archives.
+    chunk_size: int
+        The uncompressed size of each chunk.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 1024 ** 3, chunk_size: int = 64 * 1024) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.writer: LogArchiveWriter | None = None
+        self.active: str | None = None
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+        archives = []
+        for entry in os.scandir(root):
+            name, ext = os.path.splitext(entry.name)
+            if ext == ".idx":
+                archives.append((entry.stat().st_mtime, name))
+        for _, name in sorted(archives):
+            self._sizes[name] = self._disk_size(name)
+
+    @property
+    def total_bytes(self) -> int:
+        """The total size of all archives on disk."""
+        return sum(self._sizes.values())
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _disk_size(self, name: str) -> int:
+        return sum(
+            os.path.getsize(path)
+            for ext in (".log", ".idx")
+            if os.path.exists(path := f"{self._path(name)}{ext}")
+        )
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._sizes
+
+    def begin(self, name: str) -> LogArchiveWriter:
+        """
+        Starts (or resumes) writing to an archive. The previous archive is flushed.
+
+        Parameters
+        ----------
+        name: str
+            The name of the archive, usually the session ID.
+
+        Returns
+        -------
+        LogArchiveWriter
+            The writer for the archive.
+        """
+        self.flush()
+        with self._lock:
+            self.writer = LogArchiveWriter(self._path(name), chunk_size=self.chunk_size)
+            self.active = name
+            self._sizes.setdefault(name, 0)
+            self._sizes.move_to_end(name)
+        return self.writer
+
+    def append(self, line: LogLine) -> None:
+        """
+        Appends a line to the active archive. This is a log line sink.
+
+        Parameters
+        ----------
+        line: LogLine
+            The line to append.
+        """
+        if (writer := self.writer) is None:
+            return
+        if writer.append(line):
+            self._written(writer)
+
+    def flush(self) -> None:
+        """Writes any buffered lines of the active archive to disk."""
+        if (writer := self.writer) is not None and writer.flush():
+            self._written(writer)
+
+    def _written(self, writer: LogArchiveWriter) -> None:
+        name = os.path.basename(writer.path)
+        with self._lock:
+            self._sizes[name] = self._disk_size(name)
+            self._sizes.move_to_end(name)
+        self.enforce_retention()
+
+    def open(self, name: str) -> LogArchive:
+        """
+        Opens an archive for reading, and marks it as recently used. Lines of the active archive that are not yet
+        written to disk are not included, see :meth:`pending`.
+
+        Parameters
+        ----------
+        name: str
+            The name of the archive.
+
+        Returns
+        -------
+        LogArchive
+            The archive.
+
+        Raises
+        ------
+        KeyError
+            The archive does not exist.
+        """
+        if name not in self._sizes:
+            raise KeyError(name)
+        path = self._path(name)
+        with self._lock:
+            self._sizes.move_to_end(name)
+        if os.path.exists(f"{path}.idx"):
+            os.utime(f"{path}.idx")
+        return LogArchive(path)
+
+    def pending(self, name: str) -> list[str]:
+        """
+        Returns the lines of an archive that are buffered but not yet written to disk.
+
+        Parameters
+        ----------
+        name: str
+            The name of the archive.
+
+        Returns
+        -------
+        list[str]
+            The buffered lines. Empty if the archive is not active.
+        """
+        if (writer := self.writer) is None or name != self.active:
+            return []
+        with writer.lock:
+            return list(writer.pending)
+
+    def enforce_retention(self) -> None:
+        """Deletes the least recently used archives until the total size is within :attr:`max_bytes`."""
+        with self._lock:
+            total = sum(self._sizes.values())
+            for name in list(self._sizes):
+                if total <= self.max_bytes:
+                    break
+                if name == self.active:
+                    continue
+                total -= self._sizes.pop(name)
+                for ext in (".log", ".idx"):
+                    try:
+                        os.remove(f"{self._path(name)}{ext}")
+                    except FileNotFoundError:
+                        pass
+                _log.info("Evicted log archive %s", name)
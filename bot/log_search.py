@@ -0,0 +1,281 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import bisect
+import re
+import threading
+from array import array
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from bot.log_archive import LogArchive
+from bot.logs import LogLine
+
+__all__ = "SearchHit", "InvertedIndex", "highlight"
+
+# Underscores split tokens, so `tank` finds `tank_12`
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> set[str]:
+    """
+    Splits text into the lowercase word tokens used by the index.
+
+    Parameters
+    ----------
+    text: str
+        The text to split.
+
+    Returns
+    -------
+    set[str]
+        The unique tokens.
+    """
+    return set(_TOKEN.findall(text.casefold()))
+
+
+class SearchHit(NamedTuple):
+    """
+    A line matching a search, with surrounding context.
+    """
+    line: int
+    text: str
+    spans: list[tuple[int, int]]
+    before: list[tuple[int, str]]
+    after: list[tuple[int, str]]
+
+
+class InvertedIndex:
+    """
+    An incremental inverted index over log lines, mapping each token to a sorted posting list of line numbers.
+
+    Lines are expected to be added in increasing line number order, which keeps every posting list sorted without
+    extra work. Once more than ``max_lines`` lines are stored, the oldest half is dropped and the postings are rebuilt.
+
+    Parameters
+    ----------
+    max_lines: int
+        The maximum number of lines to keep.
+    """
+
+    def __init__(self, max_lines: int = 1_000_000) -> None:
+        self.max_lines = max_lines
+        self.first_line = 0
+        self._lines: list[str] = []
+        self._postings: dict[str, array[int]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    @classmethod
+    def from_archive(cls, archive: LogArchive, max_lines: int = 1_000_000) -> "InvertedIndex":
+        """
+        Builds an index over every line of an archive.
+
+        Parameters
+        ----------
+        archive: LogArchive
+            The archive to index.
+        max_lines: int
+            The maximum number of lines to keep.
+
+        Returns
+        -------
+        InvertedIndex
+            The index.
+        """
+        index = cls(max_lines=max_lines)
+        index.extend_from_archive(archive)
+        return index
+
+    def extend_from_archive(self, archive: LogArchive) -> None:
+        """
+        Adds every line of an archive to the index.
+
+        Parameters
+        ----------
+        archive: LogArchive
+            The archive to index.
+        """
+        for n, chunk in enumerate(archive.chunks):
+            self.extend(chunk.first_line, archive.read_chunk(n))
+
+    def clear(self) -> None:
+        """Removes every line from the index."""
+        with self._lock:
+            self.first_line = 0
+            self._lines = []
+            self._postings = {}
+
+    def add(self, line: LogLine) -> None:
+        """
+        Adds a line to the index. This is a log line sink.
+
+        Parameters
+        ----------
+        line: LogLine
+            The line to add.
+        """
+        self.extend(line.number, (line.text,))
+
+    def extend(self, first_line: int, lines: Iterable[str]) -> None:
+        """
+        Adds consecutive lines to the index.
+
+        Parameters
+        ----------
+        first_line: int
+            The line number of the first line.
+        lines: Iterable[str]
+            The lines to add.
+        """
+        with self._lock:
+            if not self._lines:
+                self.first_line = first_line
+            elif first_line != self.first_line + len(self._lines):
+                # Line numbers restarted (a new session), so the old lines can't be addressed anymore
+                self.first_line = first_line
+                self._lines = []
+                self._postings = {}
+            for number, text in enumerate(lines, first_line):
+                self._lines.append(text)
+                for token in tokenize(text):
+                    if (posting := self._postings.get(token)) is None:
+                        self._postings[token] = posting = array("Q")
+                    posting.append(number)
+            if len(self._lines) > self.max_lines:
+                self._drop(len(self._lines) // 2)
+
+    def _drop(self, amount: int) -> None:
+        self.first_line += amount
+        del self._lines[:amount]
+        postings = {}
+        for token, posting in self._postings.items():
+            if (start := bisect.bisect_left(posting, self.first_line)) < len(posting):
+                postings[token] = posting[start:]
+        self._postings = postings
+
+    def _candidates(self, tokens: set[str]) -> Iterable[int]:
+        if not tokens:
+            return range(self.first_line, self.first_line + len(self._lines))
+        postings = sorted((self._postings.get(token, array("Q")) for token in tokens), key=len)
+        # Intersect starting from the rarest token, so the candidate set only shrinks
+        result = postings[0]
+        for posting in postings[1:]:
+            if not result:
+                break
+            result = [number for number in result if _contains(posting, number)]
+        return result
+
+    def search(
+            self,
+            query: str = "",
+            pattern: re.Pattern[str] | None = None,
+            limit: int = 20,
+            context: int = 2,
+    ) -> tuple[list[SearchHit], bool]:
+        """
+        Searches the index, newest lines first. Lines must contain every word of the query, and match the pattern if
+        one is given. The pattern is only run on the lines the index selected.
+
+        Parameters
+        ----------
+        query: str
+            The words to search for. If empty, every line is a candidate.
+        pattern: re.Pattern[str] | None
+            A regex the line must also match.
+        limit: int
+            The maximum number of hits to return.
+        context: int
+            The number of lines of context before and after each hit.
+
+        Returns
+        -------
+        tuple[list[SearchHit], bool]
+            The newest hits in log order, and whether there were more hits than the limit.
+        """
+        tokens = tokenize(query)
+        token_pattern = re.compile(
+            "|".join(
+                rf"(?<![^\W_]){re.escape(token)}(?![^\W_])" for token in sorted(tokens, key=len, reverse=True)
+            ),
+            re.IGNORECASE,
+        ) if tokens else None
+        with self._lock:
+            matches: list[tuple[int, str, list[tuple[int, int]]]] = []
+            truncated = False
+            for number in reversed(self._candidates(tokens)):
+                text = self._lines[number - self.first_line]
+                highlighter = pattern if pattern is not None else token_pattern
+                spans = [match.span() for match in highlighter.finditer(text)] if highlighter is not None else []
+                if pattern is not None and not spans:
+                    continue
+                if len(matches) == limit:
+                    truncated = True
+                    break
+                matches.append((number, text, [span for span in spans if span[1] > span[0]]))
+
+            hits = []
+            for number, text, spans in reversed(matches):
+                offset = number - self.first_line
+                before_start = max(offset - context, 0)
+                hits.append(SearchHit(
+                    number,
+                    text,
+                    spans,
+                    [(self.first_line + before_start + i, line)
+                     for i, line in enumerate(self._lines[before_start:offset])],
+                    [(number + 1 + i, line) for i, line in enumerate(self._lines[offset + 1:offset + 1 + context])],
+                ))
+        return hits, truncated
+
+
+def _contains(posting: array[int], number: int) -> bool:
+    index = bisect.bisect_left(posting, number)
+    return index < len(posting) and posting[index] == number
+
+
+def highlight(text: str, spans: list[tuple[int, int]], start: str = "\u001b[1;33m", end: str = "\u001b[0m") -> str:
+    """
+    Wraps spans of text in markers. The default markers highlight the span in a Discord ``ansi`` code block.
+
+    Parameters
+    ----------
+    text: str
+        The text to highlight.
+    spans: list[tuple[int, int]]
+        The (start, end) spans to highlight, in order.
+    start: str
+        The marker to insert before each span.
+    end: str
+        The marker to insert after each span.
+
+    Returns
+    -------
+    str
+        The highlighted text.
+    """
+    parts = []
+    position = 0
+    for span_start, span_end in spans:
+        if span_start < position:
+            continue
+        parts.extend((text[position:span_start], start, text[span_start:span_end], end))
+        position = span_end
+    parts.append(text[position:])
+    return "".join(parts)
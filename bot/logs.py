@@ -0,0 +1,529 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import bisect
+import codecs
+import datetime
+import functools
+import logging
+import re
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from enum import StrEnum
+from typing import NamedTuple
+
+import docker.errors
+from docker.models.containers import Container
+from requests.exceptions import RequestException
+
+__all__ = (
+    "EventKind",
+    "LogLine",
+    "LogEvent",
+    "iter_lines",
+    "split_timestamps",
+    "parse_events",
+    "EventStore",
+    "LogFollower",
+)
+
+_log = logging.getLogger(__name__)
+
+
+class EventKind(StrEnum):
+    """
+    The kinds of structured events recognized in hunter's logs.
+    """
+    SCENARIO_LOADED = "scenario_loaded"
+    ASSET_SPAWNED = "asset_spawned"
+    ASSET_DESTROYED = "asset_destroyed"
+    CLIENT_CONNECTED = "client_connected"
+    CLIENT_DISCONNECTED = "client_disconnected"
+    EXCEPTION = "exception"
+
+
+class LogLine(NamedTuple):
+    """
+    A single line of container output.
+    """
+    number: int
+    timestamp: float | None
+    text: str
+
+
+class LogEvent(NamedTuple):
+    """
+    A structured event parsed from one or more log lines.
+    """
+    kind: EventKind
+    line: int
+    timestamp: float | None
+    subject: str | None
+    detail: str
+
+
+# Patterns are tried in order, so more specific patterns must come first. A kind can have more than one pattern.
+EVENT_PATTERNS: tuple[tuple[EventKind, re.Pattern[str]], ...] = (
+    (EventKind.SCENARIO_LOADED, re.compile(r"(?i)\bscenario\s+['\"]?(?P<subject>[\w-]+)['\"]?\s+(?:\w+\s+)?loaded\b")),
+    (EventKind.SCENARIO_LOADED, re.compile(r"(?i)\bloaded\s+scenario\W+(?P<subject>[\w-]+)")),
+    (
+        EventKind.CLIENT_DISCONNECTED,
+        re.compile(
+            r"(?i)\b(?:client|callsign|pilot)\W+(?P<subject>[\w-]{1,7})['\"]?\s+(?:has\s+)?"
+            r"(?:disconnected|left|timed out)\b"
+        ),
+    ),
+    (
+        EventKind.CLIENT_CONNECTED,
+        re.compile(
+            r"(?i)\b(?:client|callsign|pilot)\W+(?P<subject>[\w-]{1,7})['\"]?\s+(?:has\s+)?"
+            r"(?:connected|joined)\b"
+        ),
+    ),
+    (
+        EventKind.CLIENT_CONNECTED,
+        re.compile(r"(?i)\bnew\s+(?:mp\s+)?(?:client|callsign|pilot)\W+(?P<subject>[\w-]{1,7})"),
+    ),
+    (
+        EventKind.ASSET_DESTROYED,
+        re.compile(r"(?i)\b(?P<subject>[\w.-]+)['\"]?\s+(?:was\s+|has\s+been\s+)?(?:destroyed|killed|shot down)\b"),
+    ),
+    (
+        EventKind.ASSET_SPAWNED,
+        re.compile(r"(?i)\b(?:spawned|activated|added)\s+(?:asset|target)?\W*(?P<subject>[\w.-]+)"),
+    ),
+    (EventKind.ASSET_SPAWNED, re.compile(r"(?i)\b(?P<subject>[\w.-]+)['\"]?\s+(?:was\s+|has\s+been\s+)?spawned\b")),
+)
+# A cheap prefilter, so lines that can't be an event never run the individual patterns
+_EVENT_KEYWORDS = re.compile(r"(?i)scenario|client|callsign|pilot|destroyed|killed|shot down|spawned|activated|added")
+_DOCKER_TIMESTAMP = re.compile(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:\d\d) ")
+_TRACEBACK_START = "Traceback (most recent call last):"
+_TRACEBACK_CHAINING = ("During handling of the above exception", "The above exception was the direct cause")
+_EXCEPTION_LINE = re.compile(
+    r"(?P<subject>[A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt|Warning))(?::\s*(?P<detail>.*))?$"
+)
+
+
+def parse_docker_timestamp(value: str) -> float:
+    """
+    Parses an RFC3339 timestamp as emitted by ``docker logs --timestamps`` into a POSIX timestamp.
+
+    Parameters
+    ----------
+    value: str
+        The timestamp, e.g. ``2024-03-01T12:00:00.123456789Z``.
+
+    Returns
+    -------
+    float
+        The POSIX timestamp.
+    """
+    match = _DOCKER_TIMESTAMP.match(value + " ")
+    if match is None:
+        raise ValueError(f"Invalid docker timestamp: {value}")
+    return _match_to_timestamp(match)
+
+
+@functools.lru_cache(maxsize=64)
+def _parse_seconds(seconds: str, zone: str) -> float:
+    # Consecutive lines mostly share the same second, so this is almost always a cache hit
+    return datetime.datetime.fromisoformat(seconds + ("+00:00" if zone == "Z" else zone)).timestamp()
+
+
+def _match_to_timestamp(match: re.Match[str]) -> float:
+    seconds, fraction, zone = match.groups()
+    return _parse_seconds(seconds, zone) + (float(f"0.{fraction}") if fraction else 0)
+
+
+def iter_lines(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """
+    Incrementally splits a stream of byte chunks into lines. Chunks may end in the middle of a line, or in the middle
+    of a multibyte character.
+
+    Parameters
+    ----------
+    chunks: Iterable[bytes]
+        The chunks to split, e.g. from ``container.logs(stream=True)``.
+    encoding: str
+        The encoding of the stream. Undecodable bytes are replaced.
+
+    Yields
+    ------
+    str
+        Each line, without the trailing newline.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        if "\n" not in pending:
+            continue
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def split_timestamps(lines: Iterable[str], start: int = 0) -> Iterator[LogLine]:
+    """
+    Numbers lines and splits off the docker timestamp prefix, if present.
+
+    Parameters
+    ----------
+    lines: Iterable[str]
+        The lines to process.
+    start: int
+        The number of the first line.
+
+    Yields
+    ------
+    LogLine
+        Each line.
+    """
+    for number, line in enumerate(lines, start):
+        if (match := _DOCKER_TIMESTAMP.match(line)) is not None:
+            yield LogLine(number, _match_to_timestamp(match), line[match.end():])
+        else:
+            yield LogLine(number, None, line)
+
+
+def parse_events(lines: Iterable[LogLine]) -> Iterator[LogEvent]:
+    """
+    Classifies log lines into structured events. Python tracebacks spanning multiple lines are reported as a single
+    :attr:`EventKind.EXCEPTION` event, located at the line the traceback started on.
+
+    Parameters
+    ----------
+    lines: Iterable[LogLine]
+        The lines to classify.
+
+    Yields
+    ------
+    LogEvent
+        Each event, in log order.
+    """
+    traceback_start: LogLine | None = None
+    for line in lines:
+        text = line.text
+        if traceback_start is not None:
+            if not text or text[:1].isspace() or text.startswith(_TRACEBACK_CHAINING) or _TRACEBACK_START in text:
+                continue
+            match = _EXCEPTION_LINE.search(text)
+            yield LogEvent(
+                EventKind.EXCEPTION,
+                traceback_start.number,
+                traceback_start.timestamp,
+                match["subject"] if match is not None else None,
+                (match["detail"] or "") if match is not None else text,
+            )
+            traceback_start = None
+            continue
+        if _TRACEBACK_START in text:
+            traceback_start = line
+            continue
+        if _EVENT_KEYWORDS.search(text) is None:
+            continue
+        for kind, pattern in EVENT_PATTERNS:
+            if (match := pattern.search(text)) is not None:
+                yield LogEvent(kind, line.number, line.timestamp, match["subject"], text)
+                break
+    if traceback_start is not None:
+        yield LogEvent(EventKind.EXCEPTION, traceback_start.number, traceback_start.timestamp, None, "")
+
+
+class EventStore:
+    """
+    An in-memory store of log events, indexed by kind and by subject. Once more than ``capacity`` events are stored, the
+    oldest half is dropped.
+
+    Parameters
+    ----------
+    capacity: int
+        The maximum number of events to keep.
+    """
+
+    def __init__(self, capacity: int = 100_000) -> None:
+        self.capacity = capacity
+        self._events: list[LogEvent] = []
+        self._offset = 0
+        self._by_kind: dict[EventKind, list[int]] = {kind: [] for kind in EventKind}
+        self._by_subject: dict[str, list[int]] = {}
+        self._subscribers: list[Callable[[LogEvent], None]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def subscribe(self, callback: Callable[[LogEvent], None]) -> Callable[[], None]:
+        """
+        Registers a callback that is called with every new event. Callbacks are called from the thread that adds the
+        event, so they must be thread-safe and fast.
+
+        Parameters
+        ----------
+        callback: Callable[[LogEvent], None]
+            The callback.
+
+        Returns
+        -------
+        Callable[[], None]
+            A function that unsubscribes the callback.
+        """
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    def add(self, event: LogEvent) -> None:
+        """
+        Stores an event and notifies subscribers.
+
+        Parameters
+        ----------
+        event: LogEvent
+            The event to store.
+        """
+        with self._lock:
+            position = self._offset + len(self._events)
+            self._events.append(event)
+            self._by_kind[event.kind].append(position)
+            if event.subject is not None:
+                self._by_subject.setdefault(event.subject.casefold(), []).append(position)
+            if len(self._events) > self.capacity:
+                self._trim(len(self._events) // 2)
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception:  # pylint: disable=broad-except
+                _log.exception("Log event subscriber %r failed", callback)
+
+    def _trim(self, amount: int) -> None:
+        self._offset += amount
+        del self._events[:amount]
+        for index in (*self._by_kind.values(), *self._by_subject.values()):
+            del index[:bisect.bisect_left(index, self._offset)]
+        self._by_subject = {subject: index for subject, index in self._by_subject.items() if index}
+
+    def clear(self) -> None:
+        """Removes all events. Subscribers are kept."""
+        with self._lock:
+            self._offset += len(self._events)
+            self._events.clear()
+            for index in self._by_kind.values():
+                index.clear()
+            self._by_subject.clear()
+
+    def find(
+            self,
+            kind: EventKind | None = None,
+            subject: str | None = None,
+            since_line: int | None = None,
+            limit: int | None = None,
+    ) -> list[LogEvent]:
+        """
+        Finds stored events, in log order.
+
+        Parameters
+        ----------
+        kind: EventKind | None
+            Only return events of this kind.
+        subject: str | None
+            Only return events about this subject (case-insensitive), e.g. a callsign or asset.
+        since_line: int | None
+            Only return events at or after this line number.
+        limit: int | None
+            Only return the newest this many matching events.
+
+        Returns
+        -------
+        list[LogEvent]
+            The matching events.
+        """
+        with self._lock:
+            if kind is None and subject is None:
+                positions: Iterable[int] = range(self._offset, self._offset + len(self._events))
+            elif subject is None:
+                positions = self._by_kind[kind]
+            else:
+                positions = self._by_subject.get(subject.casefold(), ())
+                if kind is not None:
+                    positions = [
+                        position for position in positions if self._events[position - self._offset].kind == kind
+                    ]
+            events = [self._events[position - self._offset] for position in positions]
+        if since_line is not None:
+            events = events[bisect.bisect_left(events, since_line, key=lambda event: event.line):]
+        if limit is not None:
+            events = events[-limit:]
+        return events
+
+    def latest(self, kind: EventKind) -> LogEvent | None:
+        """
+        Returns the newest event of a kind.
+
+        Parameters
+        ----------
+        kind: EventKind
+            The kind of event.
+
+        Returns
+        -------
+        LogEvent | None
+            The newest event of that kind, or None if there is none.
+        """
+        with self._lock:
+            if not (index := self._by_kind[kind]):
+                return None
+            return self._events[index[-1] - self._offset]
+
+    def count(self, kind: EventKind) -> int:
+        """
+        Returns the number of stored events of a kind.
+
+        Parameters
+        ----------
+        kind: EventKind
+            The kind of event.
+
+        Returns
+        -------
+        int
+            The number of stored events of that kind.
+        """
+        return len(self._by_kind[kind])
+
+
+class LogFollower:
+    """
+    Follows the log stream of a container on a daemon thread, and feeds every line through the parsing pipeline.
+
+    Line sinks receive every :class:`LogLine`, and parsed events are added to :attr:`events`. Line numbers and
+    timestamps continue across restarts of the same container, and lines that were already seen are skipped.
+
+    Parameters
+    ----------
+    events: EventStore
+        The store to add parsed events to.
+    """
+
+    def __init__(self, events: EventStore) -> None:
+        self.events = events
+        self.line_count = 0
+        self.last_timestamp: float | None = None
+        self._sinks: list[Callable[[LogLine], None]] = []
+        self._end_callbacks: list[Callable[[], None]] = []
+        self._thread: threading.Thread | None = None
+        self._stop_event = threading.Event()
+
+    def add_sink(self, sink: Callable[[LogLine], None]) -> None:
+        """
+        Registers a callable that receives every log line. Sinks are called from the follower thread.
+
+        Parameters
+        ----------
+        sink: Callable[[LogLine], None]
+            The sink.
+        """
+        self._sinks.append(sink)
+
+    def add_end_callback(self, callback: Callable[[], None]) -> None:
+        """
+        Registers a callable that is called whenever a log stream ends, e.g. because the container stopped. Callbacks
+        are called from the follower thread.
+
+        Parameters
+        ----------
+        callback: Callable[[], None]
+            The callback.
+        """
+        self._end_callbacks.append(callback)
+
+    def reset(self, keep_position: bool = False) -> None:
+        """
+        Restarts line numbering and clears the event store, for use when a new session begins.
+
+        Parameters
+        ----------
+        keep_position: bool
+            Whether to keep skipping the lines that were already seen. Use this when a new session begins in the same
+            container.
+        """
+        self.stop()
+        self.line_count = 0
+        if not keep_position:
+            self.last_timestamp = None
+        self.events.clear()
+
+    def start(self, container: Container) -> None:
+        """
+        Starts following a container, replacing any previous follower thread.
+
+        Parameters
+        ----------
+        container: Container
+            The container to follow.
+        """
+        self.stop()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(container, self._stop_event),
+            name=f"logs-{container.name}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops following. The thread exits after the next line arrives or when the stream ends."""
+        self._stop_event.set()
+        self._thread = None
+
+    def _run(self, container: Container, stop_event: threading.Event) -> None:
+        since = None
+        if self.last_timestamp is not None:
+            since = datetime.datetime.fromtimestamp(self.last_timestamp, datetime.timezone.utc)
+        try:
+            stream = container.logs(stream=True, follow=True, timestamps=True, since=since)
+            lines = split_timestamps(iter_lines(stream), start=self.line_count)
+            for event in parse_events(self._feed(lines, stop_event)):
+                self.events.add(event)
+        except (docker.errors.APIError, RequestException):
+            _log.warning("Log stream for %s ended unexpectedly", container.name, exc_info=True)
+        for callback in self._end_callbacks:
+            try:
+                callback()
+            except Exception:  # pylint: disable=broad-except
+                _log.exception("Log stream end callback %r failed", callback)
+
+    def _feed(self, lines: Iterable[LogLine], stop_event: threading.Event) -> Iterator[LogLine]:
+        last_timestamp = self.last_timestamp
+        for line in lines:
+            if stop_event.is_set():
+                return
+            if last_timestamp is not None and line.timestamp is not None and line.timestamp <= last_timestamp:
+                # `since` only has second precision, so the tail of the previous stream is sent again
+                continue
+            line = line._replace(number=self.line_count)
+            self.line_count += 1
+            if line.timestamp is not None:
+                self.last_timestamp = line.timestamp
+            for sink in self._sinks:
+                try:
+                    sink(line)
+                except Exception:  # pylint: disable=broad-except
+                    _log.exception("Log line sink %r failed", sink)
+            yield line
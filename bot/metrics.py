@@ -0,0 +1,284 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import bisect
+import datetime
+import math
+import threading
+import time
+import traceback
+from collections.abc import Hashable, Sequence
+from typing import Any, NamedTuple
+
+from .log import fingerprint
+
+__all__ = "Counter", "Histogram", "ErrorAggregator", "ErrorStats"
+
+Key = tuple[Hashable, ...]
+
+
+class Counter:
+    """
+    A set of monotonically increasing counts, keyed by label values. Thread-safe.
+    """
+
+    def __init__(self) -> None:
+        self._values: dict[Key, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key: Key = (), amount: float = 1) -> None:
+        """
+        Increments a count.
+
+        Parameters
+        ----------
+        key: tuple
+            The label values.
+        amount: float
+            The amount to add.
+        """
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, key: Key = ()) -> float:
+        """
+        Returns a count.
+
+        Parameters
+        ----------
+        key: tuple
+            The label values.
+
+        Returns
+        -------
+        float
+            The count, zero if nothing was counted for the key.
+        """
+        return self._values.get(key, 0)
+
+    def items(self) -> list[tuple[Key, float]]:
+        """Returns every key and its count."""
+        with self._lock:
+            return list(self._values.items())
+
+
+class _Series:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets: int) -> None:
+        self.counts = [0] * buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets, keyed by label values. Memory use is constant per key no matter how many
+    values are observed, and quantiles are estimated by interpolating within a bucket. Thread-safe.
+
+    Parameters
+    ----------
+    buckets: Sequence[float]
+        The upper bounds of the buckets. A bucket for values above the highest bound is always added.
+    """
+
+    def __init__(self, buckets: Sequence[float] = (1, 2.5, 5, 10, 25, 50, 100, 250, 500)) -> None:
+        self.bounds = sorted(buckets)
+        if self.bounds[-1] != math.inf:
+            self.bounds.append(math.inf)
+        self._series: dict[Key, _Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, key: Key = ()) -> None:
+        """
+        Records an observation.
+
+        Parameters
+        ----------
+        value: float
+            The observed value.
+        key: tuple
+            The label values.
+        """
+        with self._lock:
+            if (series := self._series.get(key)) is None:
+                series = self._series[key] = _Series(len(self.bounds))
+            series.counts[bisect.bisect_left(self.bounds, value)] += 1
+            series.sum += value
+            series.count += 1
+
+    def keys(self) -> list[Key]:
+        """Returns every key with at least one observation."""
+        with self._lock:
+            return list(self._series)
+
+    def count(self, key: Key = ()) -> int:
+        """Returns the number of observations for a key."""
+        return series.count if (series := self._series.get(key)) is not None else 0
+
+    def mean(self, key: Key = ()) -> float | None:
+        """Returns the mean of the observations for a key, or ``None`` if there are none."""
+        if (series := self._series.get(key)) is None or not series.count:
+            return None
+        return series.sum / series.count
+
+    def quantile(self, q: float, key: Key = ()) -> float | None:
+        """
+        Estimates a quantile of the observations for a key.
+
+        Parameters
+        ----------
+        q: float
+            The quantile, between 0 and 1.
+        key: tuple
+            The label values.
+
+        Returns
+        -------
+        float | None
+            The estimate, or ``None`` if there are no observations. Estimates in the overflow bucket are reported as
+            the highest finite bound.
+        """
+        with self._lock:
+            if (series := self._series.get(key)) is None or not series.count:
+                return None
+            rank = q * series.count
+            seen = 0
+            for n, count in enumerate(series.counts):
+                if count and seen + count >= rank:
+                    lower = self.bounds[n - 1] if n else 0.0
+                    upper = self.bounds[n]
+                    if math.isinf(upper):
+                        return lower
+                    return lower + (upper - lower) * (rank - seen) / count
+                seen += count
+            return self.bounds[-2] if len(self.bounds) > 1 else None
+
+
+class ErrorStats(NamedTuple):
+    """
+    What an :class:`ErrorAggregator` knows about one kind of error.
+    """
+    name: str
+    """The qualified name of the exception type."""
+    location: str
+    """Where the exception was raised, as ``file:line in function``."""
+    message: str
+    """The message of the latest occurrence."""
+    total: int
+    """The number of occurrences since the bot started."""
+    recent: int
+    """The number of occurrences in the requested period."""
+    last_seen: datetime.datetime
+    """When the latest occurrence happened."""
+
+
+class _ErrorEntry:
+    __slots__ = ("name", "location", "message", "total", "buckets", "last_seen")
+
+    def __init__(self, exc: BaseException) -> None:
+        frames = traceback.extract_tb(exc.__traceback__)
+        self.name = type(exc).__qualname__
+        self.location = f"{frames[-1].filename}:{frames[-1].lineno} in {frames[-1].name}" if frames else "unknown"
+        self.message = str(exc)
+        self.total = 0
+        self.buckets: dict[int, int] = {}
+        self.last_seen = datetime.datetime.now(datetime.timezone.utc)
+
+
+class ErrorAggregator:
+    """
+    Groups exceptions by their fingerprint (type and frame chain, see :func:`~bot.log.fingerprint`) and counts them in
+    time buckets, so the most frequent failures can be listed with a rate. Only counts: repeated tracebacks are
+    collapsed by :class:`~bot.log.TracebackDeduplicator` when they are logged. Thread-safe.
+
+    Parameters
+    ----------
+    bucket: float
+        The width of each time bucket, in seconds.
+    retention: float
+        How long buckets are kept, in seconds. This is the longest period rates can be reported for.
+    """
+
+    def __init__(self, bucket: float = 60.0, retention: float = 24 * 60 * 60) -> None:
+        self.bucket = bucket
+        self.retention = retention
+        self._entries: dict[tuple[Any, ...], _ErrorEntry] = {}
+        self._lock = threading.Lock()
+
+    def record(self, exc: BaseException) -> None:
+        """
+        Records an occurrence of an exception.
+
+        Parameters
+        ----------
+        exc: BaseException
+            The exception.
+        """
+        key = fingerprint(exc)
+        now = time.monotonic()
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                if len(self._entries) >= 512:
+                    self._prune(now)
+                entry = self._entries[key] = _ErrorEntry(exc)
+            entry.message = str(exc)
+            entry.total += 1
+            entry.last_seen = datetime.datetime.now(datetime.timezone.utc)
+            index = int(now // self.bucket)
+            entry.buckets[index] = entry.buckets.get(index, 0) + 1
+            oldest = int((now - self.retention) // self.bucket)
+            for stale in [i for i in entry.buckets if i < oldest]:
+                del entry.buckets[stale]
+
+    def _prune(self, now: float) -> None:
+        # Forget errors that have not occurred within the retention period
+        oldest = int((now - self.retention) // self.bucket)
+        self._entries = {
+            key: entry for key, entry in self._entries.items() if any(i >= oldest for i in entry.buckets)
+        }
+
+    def top(self, limit: int = 10, period: float = 60 * 60) -> list[ErrorStats]:
+        """
+        Returns the most frequent errors of a recent period.
+
+        Parameters
+        ----------
+        limit: int
+            The maximum number of errors to return.
+        period: float
+            The period to count occurrences in, in seconds. Rounded up to whole buckets.
+
+        Returns
+        -------
+        list[ErrorStats]
+            The errors, most frequent first. Errors that did not occur in the period are left out.
+        """
+        since = int((time.monotonic() - period) // self.bucket) + 1
+        with self._lock:
+            stats = [
+                ErrorStats(
+                    entry.name,
+                    entry.location,
+                    entry.message,
+                    entry.total,
+                    sum(count for i, count in entry.buckets.items() if i >= since),
+                    entry.last_seen,
+                )
+                for entry in self._entries.values()
+            ]
+        return sorted((s for s in stats if s.recent), key=lambda s: s.recent, reverse=True)[:limit]
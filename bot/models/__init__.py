@@ -17,3 +17,5 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 from .core import DBUser, DBGuild
 from .ping import Ping
+from .schedule import ScheduleState, ScheduledSession
+from .session import HunterSession
@@ -0,0 +1,88 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from enum import StrEnum
+from typing import Self
+
+from tortoise import Model  # type: ignore[attr-defined]
+from tortoise.fields import BigIntField, CharEnumField, DatetimeField, JSONField, TextField
+
+__all__ = "ScheduleState", "ScheduledSession"
+
+
+class ScheduleState(StrEnum):
+    PENDING = "pending"
+    STARTED = "started"
+    FAILED = "failed"
+    MISSED = "missed"
+    CANCELLED = "cancelled"
+
+
+class ScheduledSession(Model):  # type: ignore[misc]
+    """
+    A hunter session that should start at a point in time. Keyed by a :class:`~bot.snowflake.Snowflake`.
+    """
+    id = BigIntField(pk=True, generated=False)
+    config = JSONField()
+    run_at = DatetimeField()
+    created_by = BigIntField()
+    channel_id = BigIntField(null=True)
+    state = CharEnumField(ScheduleState, default=ScheduleState.PENDING)
+    session_id = BigIntField(null=True)
+    error = TextField(null=True)
+
+    class Meta:
+        # Serves loading the pending jobs on startup (state = 'pending' ORDER BY run_at)
+        indexes = (("state", "run_at"),)
+
+    @classmethod
+    async def pending(cls, created_by: int | None = None) -> list[Self]:
+        """
+        Returns the jobs that have not run yet, soonest first.
+
+        Parameters
+        ----------
+        created_by: int | None
+            Only return jobs created by this user.
+
+        Returns
+        -------
+        list[ScheduledSession]
+            The pending jobs.
+        """
+        query = cls.filter(state=ScheduleState.PENDING)
+        if created_by is not None:
+            query = query.filter(created_by=created_by)
+        return await query.order_by("run_at")  # type: ignore[no-any-return]
+
+    async def finish(self, state: ScheduleState, session_id: int | None = None, error: str | None = None) -> None:
+        """
+        Records the outcome of the job.
+
+        Parameters
+        ----------
+        state: ScheduleState
+            The new state.
+        session_id: int | None
+            The ID of the session the job started.
+        error: str | None
+            Why the job failed.
+        """
+        self.state = state
+        self.session_id = session_id
+        self.error = error
+        await self.save(update_fields=("state", "session_id", "error"))
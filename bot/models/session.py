@@ -0,0 +1,143 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import datetime
+from typing import Any, Self
+
+from tortoise import Model  # type: ignore[attr-defined]
+from tortoise.fields import BigIntField, CharField, DatetimeField, IntField, JSONField
+
+from bot.snowflake import Snowflake
+
+__all__ = ("HunterSession",)
+
+
+class HunterSession(Model):  # type: ignore[misc]
+    """
+    A single hunter session, from the moment the container is started until it stops.
+
+    Sessions are keyed by a :class:`~bot.snowflake.Snowflake`, so the primary key is also a creation timestamp. Paging
+    through history is done with a keyset on the primary key (``id < cursor ORDER BY id DESC``), which is served
+    directly from the primary key index regardless of how many sessions are stored.
+    """
+    id = BigIntField(pk=True, generated=False)
+    config = JSONField()
+    version = CharField(max_length=32, null=True)
+    started_by = BigIntField(null=True)
+    channel_id = BigIntField(null=True)
+    started_at = DatetimeField()
+    stopped_at = DatetimeField(null=True)
+    exit_code = IntField(null=True)
+    log_archive = CharField(max_length=255, null=True)
+
+    class Meta:
+        # Serves per-user history (started_by = ? AND id < ? ORDER BY id DESC) without a sort.
+        indexes = (("started_by", "id"),)
+
+    @property
+    def snowflake(self) -> Snowflake:
+        """The snowflake of this session."""
+        return Snowflake(self.id)
+
+    @property
+    def duration(self) -> datetime.timedelta | None:
+        """The duration of the session, or None if it is still running."""
+        if self.stopped_at is None:
+            return None
+        return self.stopped_at - self.started_at  # type: ignore[no-any-return]
+
+    @classmethod
+    async def begin(
+            cls,
+            session_id: int,
+            config: dict[str, Any],
+            version: str | None = None,
+            started_by: int | None = None,
+            channel_id: int | None = None,
+    ) -> Self:
+        """
+        Records the start of a new session.
+
+        Parameters
+        ----------
+        session_id: int
+            The snowflake of the session. This is also the name of the session's log archive.
+        config: dict[str, Any]
+            The hunter configuration the session was started with.
+        version: str | None
+            The hunter version the session is running.
+        started_by: int | None
+            The ID of the user who started the session.
+        channel_id: int | None
+            The ID of the channel the session was started from.
+
+        Returns
+        -------
+        HunterSession
+            The new session.
+        """
+        return await cls.create(
+            id=session_id,
+            config=config,
+            version=version,
+            started_by=started_by,
+            channel_id=channel_id,
+            started_at=Snowflake(session_id).datetime(),
+            log_archive=str(session_id),
+        )
+
+    async def end(self, exit_code: int | None = None) -> None:
+        """
+        Records the end of this session. Does nothing if the session has already ended.
+
+        Parameters
+        ----------
+        exit_code: int | None
+            The exit code of the hunter container, if known.
+        """
+        if self.stopped_at is not None:
+            return
+        self.stopped_at = datetime.datetime.now(datetime.timezone.utc)
+        self.exit_code = exit_code
+        await self.save(update_fields=("stopped_at", "exit_code"))
+
+    @classmethod
+    async def page(cls, before: int | None = None, limit: int = 10, started_by: int | None = None) -> list[Self]:
+        """
+        Returns a page of sessions, newest first, using keyset pagination.
+
+        Parameters
+        ----------
+        before: int | None
+            Only return sessions with an ID lower than this. Pass the ID of the last session of the previous page to
+            get the next page. If None, the newest sessions are returned.
+        limit: int
+            The maximum number of sessions to return.
+        started_by: int | None
+            Only return sessions started by this user.
+
+        Returns
+        -------
+        list[HunterSession]
+            The sessions, newest first.
+        """
+        query = cls.all()
+        if before is not None:
+            query = query.filter(id__lt=before)
+        if started_by is not None:
+            query = query.filter(started_by=started_by)
+        return await query.order_by("-id").limit(limit)  # type: ignore[no-any-return]
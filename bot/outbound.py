@@ -0,0 +1,235 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from discord import HTTPException, Interaction, Message, PartialMessage
+from discord.abc import Messageable
+
+from .metrics import Histogram
+
+__all__ = ("Outbound",)
+
+_log = logging.getLogger(__name__)
+
+
+class _Request:
+    __slots__ = ("call", "key", "fields", "futures", "queued_at")
+
+    def __init__(self, call: Callable[..., Awaitable[Any]], key: Hashable | None, fields: dict[str, Any]) -> None:
+        self.call = call
+        self.key = key
+        self.fields = fields
+        self.futures: list[asyncio.Future[Any]] = [asyncio.get_running_loop().create_future()]
+        self.queued_at = time.monotonic()
+
+
+class _Lane:
+    __slots__ = ("queue", "pending", "sent", "task")
+
+    def __init__(self, sent: deque[float]) -> None:
+        self.queue: deque[_Request] = deque()
+        # Queued requests that later requests to the same target can still be merged into
+        self.pending: dict[Hashable, _Request] = {}
+        # When the last requests to the bucket were made, to pace the lane. Outlives the lane
+        self.sent = sent
+        self.task: asyncio.Task[None] | None = None
+
+
+class Outbound:
+    """
+    Sends and edits messages through one queue per rate limit bucket.
+
+    Discord limits message requests per channel (and per interaction, for interaction responses), and the client
+    serializes requests to the same bucket. Without a queue in front, an edit that is superseded by a newer edit to the
+    same message is still sent, and waits for its turn like any other request. Here, an edit to a message that already
+    has an edit queued is merged into the queued one instead: the fields are combined, newer values win, and every
+    caller receives the result of the single request that is made.
+
+    Each queue is paced to ``rate`` requests per ``per`` seconds, which is Discord's limit for messages in a channel, so
+    the bucket is not exhausted in the first place. The pacing history of a bucket is kept for ``per`` seconds after its
+    queue drains, so requests that are made one after another are paced too. Requests that are rate limited anyway
+    are retried after the delay Discord asks for.
+
+    Parameters
+    ----------
+    rate: int
+        The number of requests each queue may make per ``per`` seconds.
+    per: float
+        The pacing period, in seconds.
+    retries: int
+        The number of times a rate limited request is retried.
+    """
+
+    def __init__(self, rate: int = 5, per: float = 5.0, retries: int = 3) -> None:
+        self.rate = rate
+        self.per = per
+        self.retries = retries
+        self.requests = 0
+        self.merged = 0
+        self.rate_limited = 0
+        self.max_depth = 0
+        self.wait_time = Histogram((0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+        self._lanes: dict[Hashable, _Lane] = {}
+        self._sent: dict[Hashable, deque[float]] = {}
+
+    @property
+    def depth(self) -> int:
+        """The number of queued requests."""
+        return sum(len(lane.queue) for lane in self._lanes.values())
+
+    @property
+    def lanes(self) -> int:
+        """The number of queues with pending requests."""
+        return len(self._lanes)
+
+    async def send(self, channel: Messageable, content: str | None = None, **fields: Any) -> Message:
+        """
+        Sends a message to a channel.
+
+        Parameters
+        ----------
+        channel: Messageable
+            The channel. Must have an ``id``, e.g. a guild channel or a partial messageable.
+        content: str | None
+            The content of the message.
+        **fields
+            The other arguments of :meth:`~discord.abc.Messageable.send`.
+
+        Returns
+        -------
+        Message
+            The sent message.
+        """
+        fields["content"] = content
+        return await self._submit(("channel", getattr(channel, "id")), None, channel.send, fields)  # type: ignore
+
+    async def edit(self, message: Message | PartialMessage, **fields: Any) -> Any:
+        """
+        Edits a message, merging the edit into one that is already queued for the message, if any.
+
+        Parameters
+        ----------
+        message: Message | PartialMessage
+            The message.
+        **fields
+            The arguments of :meth:`~discord.Message.edit`.
+
+        Returns
+        -------
+        Any
+            The result of the edit.
+        """
+        return await self._submit(("channel", message.channel.id), ("message", message.id), message.edit, fields)
+
+    async def edit_original(self, interaction: Interaction, **fields: Any) -> Any:
+        """
+        Edits the original response of an interaction, merging the edit into one that is already queued, if any.
+
+        Parameters
+        ----------
+        interaction: Interaction
+            The interaction.
+        **fields
+            The arguments of :meth:`~discord.Interaction.edit_original_response`.
+
+        Returns
+        -------
+        Any
+            The result of the edit.
+        """
+        # Interaction responses are edited through a webhook, which has its own bucket
+        lane = ("interaction", interaction.id)
+        return await self._submit(lane, ("original", interaction.id), interaction.edit_original_response, fields)
+
+    async def _submit(
+            self,
+            lane_key: Hashable,
+            key: Hashable | None,
+            call: Callable[..., Awaitable[Any]],
+            fields: dict[str, Any],
+    ) -> Any:
+        if (lane := self._lanes.get(lane_key)) is None:
+            lane = self._lanes[lane_key] = _Lane(self._history(lane_key))
+        if key is not None and (request := lane.pending.get(key)) is not None:
+            request.fields.update(fields)
+            future = asyncio.get_running_loop().create_future()
+            request.futures.append(future)
+            self.merged += 1
+        else:
+            request = _Request(call, key, fields)
+            future = request.futures[0]
+            lane.queue.append(request)
+            if key is not None:
+                lane.pending[key] = request
+            self.max_depth = max(self.max_depth, self.depth)
+        if lane.task is None:
+            lane.task = asyncio.create_task(self._drain(lane_key, lane))
+        return await future
+
+    def _history(self, lane_key: Hashable) -> deque[float]:
+        now = time.monotonic()
+        # Forget buckets whose last request no longer affects pacing. Buckets with a queue are kept, their history may
+        # still be empty
+        for stale in [
+            key for key, sent in self._sent.items() if key not in self._lanes and sent[-1] + self.per <= now
+        ]:
+            del self._sent[stale]
+        if (sent := self._sent.get(lane_key)) is None:
+            sent = self._sent[lane_key] = deque(maxlen=self.rate)
+        return sent
+
+    async def _drain(self, lane_key: Hashable, lane: _Lane) -> None:
+        while lane.queue:
+            if len(lane.sent) == self.rate and (delay := lane.sent[0] + self.per - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+            request = lane.queue.popleft()
+            if request.key is not None:
+                lane.pending.pop(request.key, None)
+            self.wait_time.observe(time.monotonic() - request.queued_at)
+            try:
+                result = await self._call(lane, request)
+            except Exception as e:  # pylint: disable=broad-except
+                for future in request.futures:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for future in request.futures:
+                    if not future.done():
+                        future.set_result(result)
+        del self._lanes[lane_key]
+
+    async def _call(self, lane: _Lane, request: _Request) -> Any:
+        attempt = 0
+        while True:
+            lane.sent.append(time.monotonic())
+            self.requests += 1
+            try:
+                return await request.call(**request.fields)
+            except HTTPException as e:
+                if e.status != 429 or attempt == self.retries:
+                    raise
+                attempt += 1
+                self.rate_limited += 1
+                retry_after = float(e.response.headers.get("Retry-After", self.per))
+                _log.warning("Outbound request was rate limited, retrying in %.2fs", retry_after)
+                await asyncio.sleep(retry_after)
@@ -83,5 +83,8 @@ class PersistentStore:
     #     return self._data.setdefault(key, default)
 
     def save(self):
-        with open(self._path, "wb") as f:
+        # Written to a temporary file first, so a failed pickle can't leave the store empty
+        path = os.fsdecode(self._path)
+        with open(f"{path}.tmp", "wb") as f:
             pickle.dump(self._data, f)
+        os.replace(f"{path}.tmp", path)
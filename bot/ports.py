@@ -0,0 +1,344 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import socket
+import threading
+from collections.abc import Iterable
+from typing import NamedTuple
+
+import docker
+import docker.errors
+from docker.models.containers import Container
+
+from .error import WarningExc
+
+__all__ = (
+    "PORT_LABEL",
+    "PortBlock",
+    "PortsExhaustedError",
+    "PortConflictError",
+    "PortAllocator",
+    "parse_port_range",
+    "format_port_ranges",
+    "find_udp_conflicts",
+    "on_host_network",
+)
+
+_log = logging.getLogger(__name__)
+
+# The container label that records which host ports a container was allocated
+PORT_LABEL = "hunter-bot.ports"
+
+
+class PortsExhaustedError(WarningExc):
+    pass
+
+
+class PortConflictError(WarningExc):
+    pass
+
+
+class PortBlock(NamedTuple):
+    """
+    A contiguous block of host ports.
+    """
+    start: int
+    size: int
+
+    @property
+    def end(self) -> int:
+        """The last port of the block."""
+        return self.start + self.size - 1
+
+    def __str__(self) -> str:
+        return f"{self.start}-{self.end}"
+
+
+def parse_port_range(value: str) -> tuple[int, int]:
+    """
+    Parses an inclusive port range like ``5001-5550``.
+
+    Parameters
+    ----------
+    value: str
+        The range.
+
+    Returns
+    -------
+    tuple[int, int]
+        The first and last port.
+    """
+    start, _, end = value.partition("-")
+    first, last = int(start), int(end or start)
+    if not 0 < first <= last < 65536:
+        raise ValueError(f"Invalid port range {value!r}")
+    return first, last
+
+
+def format_port_ranges(ports: Iterable[int]) -> str:
+    """
+    Formats ports as a compact list of ranges, e.g. ``5001-5110, 5200``.
+
+    Parameters
+    ----------
+    ports: Iterable[int]
+        The ports.
+
+    Returns
+    -------
+    str
+        The ranges.
+    """
+    ranges: list[list[int]] = []
+    for port in sorted(set(ports)):
+        if ranges and ranges[-1][1] == port - 1:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port])
+    return ", ".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+class PortAllocator:
+    """
+    Hands out contiguous blocks of host ports from a fixed range.
+
+    The range is split into blocks of ``block_size`` ports, and a bitmap (a Python int) has one bit per block. The
+    lowest free block is found with a single bit trick, freeing a block clears its bit, and the bitmap of a thousand
+    blocks is a 128 byte int. Allocations are recorded in a container label, so the bitmap is rebuilt from the
+    containers that still exist on startup, and blocks of containers that are gone are reclaimed.
+
+    Parameters
+    ----------
+    first: int
+        The first host port of the range.
+    last: int
+        The last host port of the range.
+    block_size: int
+        The number of ports in each block.
+    """
+
+    def __init__(self, first: int, last: int, block_size: int) -> None:
+        self.first = first
+        self.block_size = block_size
+        self.blocks = (last - first + 1) // block_size
+        if not self.blocks:
+            raise ValueError(f"Port range {first}-{last} is smaller than one block of {block_size} ports")
+        self._bitmap = 0
+        self._owners: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def free(self) -> int:
+        """The number of free blocks."""
+        return self.blocks - self._bitmap.bit_count()
+
+    def _block(self, index: int) -> PortBlock:
+        return PortBlock(self.first + index * self.block_size, self.block_size)
+
+    def get(self, owner: str) -> PortBlock | None:
+        """
+        Returns the block allocated to an owner, if any.
+
+        Parameters
+        ----------
+        owner: str
+            The owner, usually a container name.
+        """
+        return self._block(index) if (index := self._owners.get(owner)) is not None else None
+
+    def allocate(self, owner: str) -> PortBlock:
+        """
+        Allocates the lowest free block to an owner. An owner has at most one block, so allocating again returns the
+        same block.
+
+        Parameters
+        ----------
+        owner: str
+            The owner, usually a container name.
+
+        Returns
+        -------
+        PortBlock
+            The block.
+
+        Raises
+        ------
+        PortsExhaustedError
+            Every block is in use.
+        """
+        with self._lock:
+            if (index := self._owners.get(owner)) is not None:
+                return self._block(index)
+            # Adding one to the bitmap carries through the trailing ones, leaving only the lowest zero bit set
+            lowest = ~self._bitmap & (self._bitmap + 1)
+            index = lowest.bit_length() - 1
+            if index >= self.blocks:
+                raise PortsExhaustedError(
+                    "Every port block is in use by another session",
+                    recommendation="Stop another session, or widen `HUNTER_PORT_RANGE`",
+                )
+            self._bitmap |= lowest
+            self._owners[owner] = index
+            return self._block(index)
+
+    def release(self, owner: str) -> None:
+        """
+        Frees the block of an owner. Does nothing if the owner has no block.
+
+        Parameters
+        ----------
+        owner: str
+            The owner.
+        """
+        with self._lock:
+            if (index := self._owners.pop(owner, None)) is not None:
+                self._bitmap &= ~(1 << index)
+
+    def claim(self, owner: str, block: PortBlock) -> bool:
+        """
+        Marks a block as allocated to an owner, e.g. when rebuilding from container labels.
+
+        Parameters
+        ----------
+        owner: str
+            The owner.
+        block: PortBlock
+            The block.
+
+        Returns
+        -------
+        bool
+            Whether the block was claimed. Blocks outside the range, misaligned or owned by someone else are not.
+        """
+        offset = block.start - self.first
+        index, misaligned = divmod(offset, self.block_size)
+        with self._lock:
+            if offset < 0 or misaligned or block.size != self.block_size or index >= self.blocks:
+                return False
+            if self._bitmap >> index & 1 and self._owners.get(owner) != index:
+                return False
+            self._bitmap |= 1 << index
+            self._owners[owner] = index
+            return True
+
+    def reclaim(self, labelled: Iterable[tuple[str, str]]) -> None:
+        """
+        Rebuilds the allocations from the labels of existing containers. Blocks of containers that no longer exist are
+        freed.
+
+        Parameters
+        ----------
+        labelled: Iterable[tuple[str, str]]
+            The name and :data:`PORT_LABEL` value of each existing container.
+        """
+        with self._lock:
+            previous = set(self._owners)
+            self._bitmap = 0
+            self._owners = {}
+        for owner, label in labelled:
+            try:
+                first, last = parse_port_range(label)
+            except ValueError:
+                # Containers on the host network have no block
+                continue
+            if not self.claim(owner, PortBlock(first, last - first + 1)):
+                _log.warning("Container %s holds ports %s outside of the allocatable blocks", owner, label)
+        if leaked := previous - set(self._owners):
+            _log.info("Reclaimed port blocks of %s", ", ".join(sorted(leaked)))
+
+
+def on_host_network(client: docker.DockerClient) -> bool:
+    """
+    Returns whether the bot shares the host's network namespace, i.e. whether it sees the host's ports.
+
+    Parameters
+    ----------
+    client: docker.DockerClient
+        The Docker client.
+
+    Returns
+    -------
+    bool
+        False if the bot runs in a container that isn't on the host network.
+    """
+    try:
+        # A container's hostname is its ID, unless it is on the host network, where it is the host's
+        own = client.containers.get(socket.gethostname())
+    except docker.errors.NotFound:
+        return True
+    return own.attrs.get("HostConfig", {}).get("NetworkMode") == "host"
+
+
+def find_udp_conflicts(
+        ports: range,
+        containers: Iterable[Container],
+        exclude: str | None = None,
+        probe: bool = True,
+) -> list[str]:
+    """
+    Finds what else uses any of the given host UDP ports, before a container binds them on the host network.
+
+    Ports published by other containers are found through Docker. Ports bound by other processes are found by trying to
+    bind each port, which only sees the host's ports when the bot itself runs on the host network (see
+    :func:`on_host_network`). Otherwise, pass ``probe=False``: conflicts with other processes then go unnoticed until
+    hunter fails to bind.
+
+    Parameters
+    ----------
+    ports: range
+        The host ports.
+    containers: Iterable[Container]
+        The running containers.
+    exclude: str | None
+        The name of a container to ignore, usually the one that is about to be replaced.
+    probe: bool
+        Whether to try binding each port.
+
+    Returns
+    -------
+    list[str]
+        A description of each conflict. Empty if there are none.
+    """
+    conflicts = []
+    for container in containers:
+        if container.name == exclude:
+            continue
+        bindings = container.attrs.get("NetworkSettings", {}).get("Ports") or {}
+        used = [
+            int(binding["HostPort"])
+            for port, host_bindings in bindings.items()
+            if port.endswith("/udp")
+            for binding in host_bindings or ()
+            if int(binding["HostPort"]) in ports
+        ]
+        if used:
+            conflicts.append(f"Container `{container.name}` publishes {format_port_ranges(used)}")
+
+    if not probe:
+        _log.warning("The bot isn't on the host network, so ports bound by other host processes can't be detected")
+        return conflicts
+    bound = []
+    for port in ports:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            try:
+                sock.bind(("0.0.0.0", port))
+            except OSError:
+                bound.append(port)
+    if bound:
+        conflicts.append(f"Ports {format_port_ranges(bound)} are bound by another process")
+    return conflicts
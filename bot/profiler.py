@@ -0,0 +1,200 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import inspect
+import os
+import selectors
+import signal
+import sys
+import tracemalloc
+from collections import Counter
+from types import CodeType, FrameType
+from typing import NamedTuple
+
+from .error import InfoExc, ErrorExc
+
+__all__ = "StackProfile", "AllocationSite", "profile_stacks", "allocation_growth"
+
+# Only one profiler may run at a time, they share process-wide state
+_lock = asyncio.Lock()
+_SELECTORS = selectors.__file__
+
+
+def _frame_label(code: CodeType) -> str:
+    filename = code.co_filename
+    for path in sys.path:
+        if path and filename.startswith(path):
+            filename = os.path.relpath(filename, path)
+            break
+    # Frames of collapsed stacks are separated by semicolons. The count comes after the last space, so spaces are fine
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _loop_entry(frame: FrameType | None) -> FrameType | None:
+    # The frame below the outermost coroutine of the running task is the one that runs the loop
+    entry = None
+    while frame is not None:
+        if frame.f_code.co_flags & inspect.CO_COROUTINE:
+            entry = frame.f_back
+        frame = frame.f_back
+    return entry
+
+
+class StackProfile(NamedTuple):
+    """
+    The result of :func:`profile_stacks`.
+    """
+    stacks: Counter[str]
+    """The number of samples of each stack, root first and separated by semicolons."""
+    samples: int
+    """The total number of samples."""
+    seconds: float
+    """How long the profiler ran."""
+    idle: int
+    """The number of samples that found the loop waiting for events, which are left out of :attr:`stacks`."""
+
+    def collapsed(self) -> str:
+        """Renders the stacks in the collapsed format read by flamegraph.pl, speedscope and others."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = 10) -> list[tuple[str, int]]:
+        """Returns the functions that were running (as opposed to waiting for a callee) in the most samples."""
+        leaves: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rpartition(";")[2]] += count
+        return leaves.most_common(limit)
+
+
+async def profile_stacks(seconds: float, interval: float = 0.005) -> StackProfile:
+    """
+    Samples the stack of the main thread, which runs the event loop, every ``interval`` seconds of CPU time.
+
+    Sampling is driven by ``SIGPROF``, so it costs nothing between samples, and the loop keeps running while it
+    samples. The timer counts the CPU time of the whole process, so other threads (the stats sampler, the log follower,
+    ``to_thread`` workers) trigger samples too, and those may find the loop waiting for events. Such samples are only
+    counted in :attr:`StackProfile.idle`, so the stacks show what the loop spent CPU time on.
+
+    The asyncio loop waits in :meth:`selectors.BaseSelector.select`. uvloop waits in C, so with uvloop a sample whose
+    innermost frame is the one that started the loop counts as idle. That includes the time uvloop spends in its own
+    C code.
+
+    Parameters
+    ----------
+    seconds: float
+        How long to profile for.
+    interval: float
+        The CPU time between samples.
+
+    Returns
+    -------
+    StackProfile
+        The sampled stacks.
+    """
+    if not hasattr(signal, "setitimer"):
+        raise ErrorExc("Profiling needs SIGPROF, which this platform doesn't have")
+    if _lock.locked():
+        raise InfoExc("A profiler is already running", recommendation="Wait for it to finish")
+    async with _lock:
+        stacks: Counter[str] = Counter()
+        labels_by_code: dict[CodeType, str] = {}
+        idle = 0
+        uvloop_entry = None
+        if type(asyncio.get_running_loop()).__module__.startswith("uvloop"):
+            uvloop_entry = _loop_entry(inspect.currentframe())
+
+        def sample(_signum: int, frame: FrameType | None) -> None:
+            nonlocal idle
+            # Another thread used the CPU while the loop was waiting for events
+            if frame is not None and (
+                    frame is uvloop_entry
+                    if uvloop_entry is not None
+                    else frame.f_code.co_name == "select" and frame.f_code.co_filename == _SELECTORS
+            ):
+                idle += 1
+                return
+            labels = []
+            while frame is not None:
+                if (label := labels_by_code.get(frame.f_code)) is None:
+                    label = labels_by_code[frame.f_code] = _frame_label(frame.f_code)
+                labels.append(label)
+                frame = frame.f_back
+            stacks[";".join(reversed(labels))] += 1
+
+        previous = signal.signal(signal.SIGPROF, sample)
+        start = asyncio.get_running_loop().time()
+        signal.setitimer(signal.ITIMER_PROF, interval, interval)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, previous)
+        return StackProfile(stacks, stacks.total(), asyncio.get_running_loop().time() - start, idle)
+
+
+class AllocationSite(NamedTuple):
+    """
+    A line that allocated memory, from :func:`allocation_growth`.
+    """
+    location: str
+    """The file and line."""
+    size_diff: int
+    """The number of bytes the memory allocated by the line grew by."""
+    size: int
+    """The number of bytes allocated by the line at the end."""
+    count_diff: int
+    """The number of blocks the allocations of the line grew by."""
+
+
+async def allocation_growth(seconds: float, limit: int = 10) -> list[AllocationSite]:
+    """
+    Finds the lines whose allocations grew the most over a period. Allocations are only traced while this runs, unless
+    tracing was already started, so allocations from before the period are not seen.
+
+    Parameters
+    ----------
+    seconds: float
+        The length of the period.
+    limit: int
+        The maximum number of lines to return.
+
+    Returns
+    -------
+    list[AllocationSite]
+        The lines with the most growth, most first.
+    """
+    if _lock.locked():
+        raise InfoExc("A profiler is already running", recommendation="Wait for it to finish")
+    async with _lock:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            await asyncio.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+        finally:
+            if started:
+                tracemalloc.stop()
+        # Allocations made by tracemalloc itself are noise
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+        stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+        return [
+            AllocationSite(str(stat.traceback[0]), stat.size_diff, stat.size, stat.count_diff)
+            for stat in stats
+            if stat.size_diff > 0
+        ][:limit]
@@ -0,0 +1,151 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import time
+from collections.abc import Hashable
+from typing import NamedTuple
+
+import humanize
+
+from .error import InfoExc
+from .metrics import Counter
+
+__all__ = "Limit", "RateLimitedError", "RateLimiter"
+
+
+class RateLimitedError(InfoExc):
+    def __init__(self, retry_after: float, scope: str) -> None:
+        who = {"user": "You are", "guild": "This server is", "global": "Everyone is"}[scope]
+        super().__init__(
+            f"{who} using expensive commands too quickly",
+            recommendation=f"Try again in {humanize.naturaldelta(max(retry_after, 1))}",
+        )
+        self.retry_after = retry_after
+        self.scope = scope
+
+
+class Limit(NamedTuple):
+    """
+    The size of a token bucket.
+    """
+    capacity: float
+    """The maximum number of tokens, i.e. the largest burst."""
+    per: float
+    """The number of seconds it takes an empty bucket to refill."""
+
+    @property
+    def rate(self) -> float:
+        """The number of tokens added per second."""
+        return self.capacity / self.per
+
+
+class RateLimiter:
+    """
+    Limits expensive actions with token buckets per user, per guild and globally. Every action has a cost, and is only
+    allowed if each of its buckets holds that many tokens. Buckets refill continuously.
+
+    Buckets are stored as ``[tokens, updated]`` pairs in one dict, and are created on first use. Buckets that have
+    refilled completely are indistinguishable from new ones, so they are swept from the dict every ``sweep_interval``
+    seconds, which keeps it as small as the number of recently active users and guilds.
+
+    Parameters
+    ----------
+    user: Limit
+        The bucket of each user.
+    guild: Limit
+        The bucket of each guild. Direct messages share one bucket.
+    global_: Limit
+        The bucket shared by everyone.
+    sweep_interval: float
+        The number of seconds between sweeps.
+    """
+
+    def __init__(
+            self,
+            user: Limit = Limit(10, 60),
+            guild: Limit = Limit(30, 60),
+            global_: Limit = Limit(60, 60),
+            sweep_interval: float = 5 * 60,
+    ) -> None:
+        self.limits = {"user": user, "guild": guild, "global": global_}
+        self.sweep_interval = sweep_interval
+        self.throttled = Counter()
+        self._buckets: dict[tuple[str, Hashable], list[float]] = {}
+        self._last_sweep = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _tokens(self, key: tuple[str, Hashable], now: float) -> float:
+        limit = self.limits[key[0]]
+        if (bucket := self._buckets.get(key)) is None:
+            return limit.capacity
+        return min(bucket[0] + (now - bucket[1]) * limit.rate, limit.capacity)
+
+    def check(self, action: str, user_id: int, guild_id: int | None, cost: float = 1) -> None:
+        """
+        Takes the cost of an action from the buckets of a user, or raises if any of the buckets is short. Nothing is
+        taken if the action is not allowed.
+
+        Parameters
+        ----------
+        action: str
+            The name of the action, for metrics.
+        user_id: int
+            The ID of the user.
+        guild_id: int | None
+            The ID of the guild, or None in direct messages.
+        cost: float
+            The number of tokens the action costs.
+
+        Raises
+        ------
+        RateLimitedError
+            One of the buckets does not have enough tokens.
+        """
+        now = time.monotonic()
+        if now - self._last_sweep > self.sweep_interval:
+            self.sweep(now)
+        keys = ("user", user_id), ("guild", guild_id), ("global", None)
+        levels = [self._tokens(key, now) for key in keys]
+        for key, tokens in zip(keys, levels):
+            limit = self.limits[key[0]]
+            # A cost above the capacity could never be paid, so it's capped at a full bucket
+            needed = min(cost, limit.capacity)
+            if tokens < needed:
+                self.throttled.inc((action, key[0]))
+                raise RateLimitedError((needed - tokens) / limit.rate, key[0])
+        for key, tokens in zip(keys, levels):
+            self._buckets[key] = [tokens - min(cost, self.limits[key[0]].capacity), now]
+
+    def sweep(self, now: float | None = None) -> None:
+        """
+        Removes the buckets that have refilled completely.
+
+        Parameters
+        ----------
+        now: float | None
+            The current monotonic time.
+        """
+        if now is None:
+            now = time.monotonic()
+        self._buckets = {
+            key: bucket
+            for key, bucket in self._buckets.items()
+            if self._tokens(key, now) < self.limits[key[0]].capacity
+        }
+        self._last_sweep = now
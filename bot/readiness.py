@@ -0,0 +1,145 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import re
+import threading
+import time
+from collections.abc import Callable
+
+from .error import ErrorExc, WarningExc
+from .logs import LogLine
+
+__all__ = "DEFAULT_READY_PATTERN", "HunterNotReadyError", "HunterExitedError", "ReadinessProbe"
+
+# Hunter logs this once the scenario is set up and clients can connect
+DEFAULT_READY_PATTERN = r"(?i)\bscenario\b.*\bloaded\b"
+
+
+class HunterNotReadyError(WarningExc):
+    pass
+
+
+class HunterExitedError(ErrorExc):
+    pass
+
+
+class ReadinessProbe:
+    """
+    Detects when hunter is ready by watching its log lines for a marker.
+
+    Arm the probe before starting the container, so the marker can't be logged before anyone is watching, then
+    :meth:`wait` for it.
+
+    Parameters
+    ----------
+    pattern: re.Pattern[str]
+        The regex that matches hunter's ready marker.
+    """
+
+    def __init__(self, pattern: re.Pattern[str]) -> None:
+        self.pattern = pattern
+        self._future: asyncio.Future[float] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+
+    def arm(self) -> asyncio.Future[float]:
+        """
+        Starts watching for the marker. Any previous wait is replaced.
+
+        Returns
+        -------
+        asyncio.Future[float]
+            Resolves to the monotonic time the marker was seen at.
+        """
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._future = self._loop.create_future()
+            return self._future
+
+    def feed(self, line: LogLine) -> None:
+        """
+        Checks a line for the marker. This is a log line sink.
+
+        Parameters
+        ----------
+        line: LogLine
+            The line.
+        """
+        if (future := self._future) is None or future.done() or self.pattern.search(line.text) is None:
+            return
+        seen = time.monotonic()
+        with self._lock:
+            if future is self._future and self._loop is not None:
+                self._future = None
+                self._loop.call_soon_threadsafe(_resolve, future, seen)
+
+    async def wait(
+            self,
+            future: asyncio.Future[float],
+            is_running: Callable[[], bool],
+            timeout: float,
+            poll_interval: float = 2.0,
+    ) -> float:
+        """
+        Waits for the marker, checking that the container is still running in between.
+
+        Parameters
+        ----------
+        future: asyncio.Future[float]
+            The future returned by :meth:`arm`.
+        is_running: Callable[[], bool]
+            Returns whether the container is running. Called in a worker thread.
+        timeout: float
+            The maximum number of seconds to wait.
+        poll_interval: float
+            The number of seconds between running checks.
+
+        Returns
+        -------
+        float
+            The monotonic time the marker was seen at.
+
+        Raises
+        ------
+        HunterExitedError
+            The container stopped before hunter was ready.
+        HunterNotReadyError
+            The marker wasn't seen within the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), poll_interval)
+                except TimeoutError:
+                    pass
+                if not await asyncio.to_thread(is_running):
+                    raise HunterExitedError("Hunter exited before it was ready, check the logs for details")
+                if time.monotonic() > deadline:
+                    raise HunterNotReadyError(
+                        f"Hunter did not report ready within {timeout:.0f} seconds. It may still be starting up"
+                    )
+        finally:
+            with self._lock:
+                if self._future is future:
+                    self._future = None
+
+
+def _resolve(future: asyncio.Future[float], seen: float) -> None:
+    if not future.done():
+        future.set_result(seen)
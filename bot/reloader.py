@@ -0,0 +1,304 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import ast
+import hashlib
+import importlib
+import logging
+import sys
+import time
+from collections.abc import Iterable
+from graphlib import CycleError, TopologicalSorter
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+if TYPE_CHECKING:
+    from .core import Bot
+
+__all__ = "ReloadResult", "Reloader", "module_imports"
+
+_log = logging.getLogger(__name__)
+
+
+class ReloadResult(NamedTuple):
+    """
+    The outcome of :meth:`Reloader.reload`.
+    """
+    changed: list[str]
+    """The modules whose source changed."""
+    reloaded: list[str]
+    """The modules that were reloaded, in order. Includes dependents of changed modules."""
+    pinned: list[str]
+    """The changed modules that cannot be reloaded, and need a restart."""
+    rebound: int
+    """The number of live objects that were moved to their reloaded class."""
+    elapsed: float
+    """The number of seconds the reload took."""
+    error: str | None = None
+    """The error that stopped the reload, if any. Modules after the failed one were not reloaded."""
+
+
+def _module_name(root: Path, package: str, path: Path) -> str:
+    parts = path.relative_to(root).with_suffix("").parts
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join((package, *parts))
+
+
+def _runtime_imports(tree: ast.Module) -> Iterable[ast.Import | ast.ImportFrom]:
+    # Imports under `if TYPE_CHECKING:` don't run, and would otherwise make cycles like bot.core <-> bot.lifecycle
+    todo: list[ast.AST] = [tree]
+    while todo:
+        node = todo.pop()
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            yield node
+        elif isinstance(node, ast.If) and isinstance(node.test, ast.Name) and node.test.id == "TYPE_CHECKING":
+            todo.extend(node.orelse)
+        else:
+            todo.extend(ast.iter_child_nodes(node))
+
+
+def module_imports(name: str, source: bytes, is_package: bool = False) -> set[str]:
+    """
+    Finds the modules a module imports when it runs, from its source, without importing it.
+
+    Parameters
+    ----------
+    name: str
+        The name of the module, to resolve relative imports.
+    source: bytes
+        The source of the module.
+    is_package: bool
+        Whether the module is the ``__init__`` of a package.
+
+    Returns
+    -------
+    set[str]
+        The absolute names of the imported modules. ``from a import b`` yields both ``a`` and ``a.b``, since ``b`` may
+        be a submodule.
+    """
+    imports = set()
+    for node in _runtime_imports(ast.parse(source, name)):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+            continue
+        if node.level:
+            parts = name.split(".")
+            module = ".".join(parts[:len(parts) - node.level + is_package] + [node.module or ""]).rstrip(".")
+        else:
+            module = node.module or ""
+        imports.add(module)
+        imports.update(f"{module}.{alias.name}" for alias in node.names)
+    return imports
+
+
+class Reloader:
+    """
+    Reloads the modules of the bot whose source changed since they were loaded, and every module that imports them.
+
+    Changes are found by hashing the source of each module. Modules are reloaded in dependency order, so a module is
+    only reloaded after everything it imports. Extensions are reloaded through the bot, which re-registers their
+    commands, and other modules with :func:`importlib.reload`.
+
+    Reloading a module creates new classes, but objects the bot holds, like the :class:`~bot.hunter.Hunter` instance,
+    keep their state: they are moved to the new version of their class, so they run the new code with the same data.
+    Some modules are pinned and are never reloaded: the models, which are registered with the ORM, the bot itself and
+    the error types, which the error handler matches by identity. Changes to those need a restart.
+
+    Parameters
+    ----------
+    bot: Bot
+        The bot.
+    package: str
+        The package to watch.
+    pinned: Iterable[str]
+        The modules, and packages of modules, that are never reloaded.
+    """
+
+    def __init__(
+            self,
+            bot: "Bot",
+            package: str = "bot",
+            pinned: Iterable[str] = ("bot.core", "bot.error", "bot.models"),
+    ) -> None:
+        self.bot = bot
+        self.package = package
+        self.pinned = tuple(pinned)
+        self.root = Path(sys.modules[package].__file__ or "").parent
+        # The imports of each module, with the hash of the source they were found in
+        self._imports: dict[str, tuple[str, set[str]]] = {}
+        self._hashes = {name: digest for name, (digest, _) in self._scan().items()}
+
+    def _scan(self) -> dict[str, tuple[str, Path]]:
+        modules = {}
+        for path in self.root.rglob("*.py"):
+            modules[_module_name(self.root, self.package, path)] = hashlib.sha256(path.read_bytes()).hexdigest(), path
+        return modules
+
+    def _graph(self, modules: dict[str, tuple[str, Path]]) -> dict[str, set[str]]:
+        # Only modules whose source changed since their imports were last found are parsed again
+        graph = {}
+        for name, (digest, path) in modules.items():
+            cached = self._imports.get(name)
+            if cached is None or cached[0] != digest:
+                imports = module_imports(name, path.read_bytes(), path.name == "__init__.py")
+                cached = self._imports[name] = digest, imports
+            graph[name] = cached[1] & modules.keys() - {name}
+        return graph
+
+    def _is_pinned(self, name: str) -> bool:
+        return any(name == pinned or name.startswith(f"{pinned}.") for pinned in self.pinned)
+
+    async def reload(self) -> ReloadResult:
+        """
+        Reloads the changed modules and their dependents.
+
+        Returns
+        -------
+        ReloadResult
+            What was reloaded.
+        """
+        start = time.perf_counter()
+        modules = self._scan()
+        hashes = {name: digest for name, (digest, _) in modules.items()}
+        changed = sorted(name for name, digest in hashes.items() if self._hashes.get(name) != digest)
+        pinned = [name for name in changed if self._is_pinned(name)]
+        if not changed:
+            return ReloadResult([], [], [], 0, time.perf_counter() - start)
+        try:
+            graph = self._graph(modules)
+        except SyntaxError as e:
+            return ReloadResult(changed, [], pinned, 0, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+
+        dependents: dict[str, set[str]] = {}
+        for name, imports in graph.items():
+            for imported in imports:
+                dependents.setdefault(imported, set()).add(name)
+        stale = set()
+        todo = [name for name in changed if name not in pinned]
+        while todo:
+            if (name := todo.pop()) in stale or self._is_pinned(name):
+                continue
+            stale.add(name)
+            todo.extend(dependents.get(name, ()))
+        # Modules that were never imported are picked up when they are first imported
+        stale = {name for name in stale if name in sys.modules or name in self.bot.extensions}
+        try:
+            order = [name for name in TopologicalSorter(graph).static_order() if name in stale]
+        except CycleError as e:
+            return ReloadResult(changed, [], pinned, 0, time.perf_counter() - start, f"Import cycle: {e.args[1]}")
+
+        reloaded: list[str] = []
+        rebound = 0
+        error = None
+        for name in order:
+            old_classes = self._classes(name)
+            try:
+                if name in self.bot.extensions:
+                    self.bot.reload_extension(name)
+                else:
+                    importlib.reload(sys.modules[name])
+            except Exception as e:  # pylint: disable=broad-except
+                _log.exception("Failed to reload %s", name)
+                error = f"{name}: {type(e).__name__}: {e}"
+                break
+            reloaded.append(name)
+            rebound += self._rebind(name, old_classes)
+            self._hashes[name] = hashes[name]
+        for name in changed:
+            # Modules that are not loaded have nothing to reload. Pinned modules keep their old hash, so they are
+            # reported until the bot restarts, and so do modules that failed to reload, so they are retried
+            if name not in sys.modules and name not in self.bot.extensions:
+                self._hashes[name] = hashes[name]
+        if any(name in self.bot.extensions for name in reloaded):
+            await self.bot.sync_command_tree()
+
+        result = ReloadResult(changed, reloaded, pinned, rebound, time.perf_counter() - start, error)
+        _log.info("Reloaded %d modules in %.0fms", len(reloaded), result.elapsed * 1000)
+        return result
+
+    @staticmethod
+    def _classes(name: str) -> dict[str, type]:
+        module = sys.modules.get(name)
+        return {
+            key: value for key, value in vars(module).items()
+            if isinstance(value, type) and value.__module__ == name
+        } if module is not None else {}
+
+    @staticmethod
+    def _attributes(obj: Any) -> Iterable[Any]:
+        # Regular and slotted attributes, and the items of containers held in them, e.g. the values of a
+        # PersistentStore's data
+        try:
+            values = list(vars(obj).values())
+        except Exception:  # pylint: disable=broad-except
+            # No __dict__, and a __getattr__ like PersistentStore's may raise anything for it
+            values = []
+        for cls in type(obj).__mro__:
+            slots = cls.__dict__.get("__slots__", ())
+            for slot in (slots,) if isinstance(slots, str) else slots:
+                if slot in ("__dict__", "__weakref__"):
+                    continue
+                try:
+                    values.append(cls.__dict__[slot].__get__(obj, cls))
+                except AttributeError:
+                    pass
+        for value in values:
+            if isinstance(value, dict):
+                yield from value.values()
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                yield from value
+            else:
+                yield value
+
+    def _live_objects(self, depth: int = 3) -> list[Any]:
+        # The bot's attributes and theirs, e.g. bot.hunter, bot.hunter.persistent_store and the config it stores. Only
+        # objects of the package are walked into, so the client's caches aren't
+        seen = {id(self.bot)}
+        found: list[Any] = []
+        layer = [self.bot]
+        for _ in range(depth):
+            next_layer = []
+            for obj in layer:
+                for value in self._attributes(obj):
+                    if id(value) in seen or isinstance(value, (type, str, bytes, int, float)):
+                        continue
+                    seen.add(id(value))
+                    found.append(value)
+                    module = type(value).__module__
+                    if module == self.package or module.startswith(f"{self.package}."):
+                        next_layer.append(value)
+            layer = next_layer
+        return found
+
+    def _rebind(self, name: str, old_classes: dict[str, type]) -> int:
+        new_classes = self._classes(name)
+        replacements = {
+            old: new for key, old in old_classes.items()
+            if (new := new_classes.get(key)) is not None and new is not old
+        }
+        rebound = 0
+        for obj in self._live_objects():
+            if (new := replacements.get(type(obj))) is None:
+                continue
+            try:
+                obj.__class__ = new
+            except TypeError:
+                _log.warning("Could not move %r to the reloaded %s, it keeps running the old code", obj, name)
+            else:
+                rebound += 1
+        return rebound
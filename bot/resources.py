@@ -0,0 +1,229 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+import threading
+from collections.abc import Iterable, Mapping
+from typing import Any, NamedTuple, Self
+
+import humanize
+
+__all__ = "ResourceProfile", "load_profiles", "CorePlanner", "parse_cpuset", "describe_limits"
+
+
+class ResourceProfile(NamedTuple):
+    """
+    The resources a hunter container may use.
+    """
+    cores: int = 1
+    """The number of cores the container is pinned to."""
+    cpus: float = 1.0
+    """The CPU quota, in cores."""
+    mem_limit: str = "2g"
+    """The memory cap, in Docker's format."""
+    pids_limit: int = 512
+    """The maximum number of processes and threads."""
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any], base: Self | None = None) -> Self:
+        """
+        Creates a profile from a mapping, taking missing values from a base profile.
+
+        Parameters
+        ----------
+        data: Mapping[str, Any]
+            The values to set.
+        base: ResourceProfile | None
+            The profile to take missing values from. Defaults to the default profile.
+
+        Returns
+        -------
+        ResourceProfile
+            The profile.
+        """
+        if unknown := set(data) - set(cls._fields):
+            raise ValueError(f"Unknown resource profile fields: {", ".join(sorted(unknown))}")
+        return (base or cls())._replace(**data)
+
+    def create_kwargs(self, cpuset: str | None) -> dict[str, Any]:
+        """
+        Returns the keyword arguments for ``containers.create`` that apply this profile.
+
+        Parameters
+        ----------
+        cpuset: str | None
+            The cores to pin the container to, or None to not pin it.
+
+        Returns
+        -------
+        dict[str, Any]
+            The keyword arguments.
+        """
+        kwargs: dict[str, Any] = {
+            "nano_cpus": int(self.cpus * 1e9),
+            "mem_limit": self.mem_limit,
+            "pids_limit": self.pids_limit,
+        }
+        if cpuset is not None:
+            kwargs["cpuset_cpus"] = cpuset
+        return kwargs
+
+
+def load_profiles(value: str | None) -> tuple[ResourceProfile, dict[str, ResourceProfile]]:
+    """
+    Loads resource profiles from JSON, e.g. ``{"default": {"cpus": 1}, "nevada": {"cores": 2, "cpus": 1.5}}``.
+    Scenario profiles take missing values from the default profile.
+
+    Parameters
+    ----------
+    value: str | None
+        The JSON, or None for only the built-in default profile.
+
+    Returns
+    -------
+    tuple[ResourceProfile, dict[str, ResourceProfile]]
+        The default profile, and the profile of each scenario that has one.
+    """
+    data = json.loads(value) if value else {}
+    default = ResourceProfile.from_dict(data.pop("default", {}))
+    return default, {scenario: ResourceProfile.from_dict(profile, default) for scenario, profile in data.items()}
+
+
+def parse_cpuset(value: str) -> list[int]:
+    """
+    Parses a cpuset like ``0-2,5`` into a list of cores.
+
+    Parameters
+    ----------
+    value: str
+        The cpuset.
+
+    Returns
+    -------
+    list[int]
+        The cores.
+    """
+    cores = []
+    for part in filter(None, value.split(",")):
+        start, _, end = part.partition("-")
+        cores.extend(range(int(start), int(end or start) + 1))
+    return cores
+
+
+def describe_limits(host_config: Mapping[str, Any]) -> str | None:
+    """
+    Describes the limits that were applied to a container.
+
+    Parameters
+    ----------
+    host_config: Mapping[str, Any]
+        The ``HostConfig`` of the container, as returned by the Docker engine.
+
+    Returns
+    -------
+    str | None
+        The description, or None if no limits were applied.
+    """
+    parts = []
+    if cpuset := host_config.get("CpusetCpus"):
+        parts.append(f"Cores: `{cpuset}`")
+    if nano_cpus := host_config.get("NanoCpus"):
+        parts.append(f"CPU quota: `{nano_cpus / 1e9:g}`")
+    if memory := host_config.get("Memory"):
+        parts.append(f"Memory cap: `{humanize.naturalsize(memory, binary=True)}`")
+    if (pids := host_config.get("PidsLimit")) and pids > 0:
+        parts.append(f"Process limit: `{pids}`")
+    return "\n".join(parts) or None
+
+
+class CorePlanner:
+    """
+    Spreads containers across cores. Each container is pinned to the least loaded cores, counting how many containers
+    are pinned to each core, and the reserved cores (the ones the bot itself runs on) are never handed out.
+
+    Parameters
+    ----------
+    cores: int
+        The number of cores on the host.
+    reserved: Iterable[int]
+        The cores to keep free.
+    """
+
+    def __init__(self, cores: int, reserved: Iterable[int] = (0,)) -> None:
+        reserved = set(reserved)
+        self.cores = [core for core in range(cores) if core not in reserved]
+        self._load = dict.fromkeys(self.cores, 0)
+        self._plans: dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+
+    def plan(self, owner: str, count: int) -> str | None:
+        """
+        Picks cores for a container. Any previous plan of the owner is released first.
+
+        Parameters
+        ----------
+        owner: str
+            The owner, usually a container name.
+        count: int
+            The number of cores.
+
+        Returns
+        -------
+        str | None
+            The cpuset, or None if there are no cores to pin to, in which case the container should not be pinned.
+        """
+        self.release(owner)
+        with self._lock:
+            if not self.cores:
+                return None
+            # Ties go to the lowest core, so plans are deterministic
+            cores = sorted(sorted(self.cores, key=self._load.__getitem__)[:count])
+            for core in cores:
+                self._load[core] += 1
+            self._plans[owner] = cores
+            return ",".join(map(str, cores))
+
+    def release(self, owner: str) -> None:
+        """
+        Releases the cores of an owner.
+
+        Parameters
+        ----------
+        owner: str
+            The owner.
+        """
+        with self._lock:
+            for core in self._plans.pop(owner, ()):
+                self._load[core] -= 1
+
+    def reclaim(self, pinned: Iterable[tuple[str, str]]) -> None:
+        """
+        Rebuilds the plans from the cpusets of existing containers.
+
+        Parameters
+        ----------
+        pinned: Iterable[tuple[str, str]]
+            The name and cpuset of each existing container.
+        """
+        with self._lock:
+            self._load = dict.fromkeys(self.cores, 0)
+            self._plans = {}
+            for owner, cpuset in pinned:
+                cores = [core for core in parse_cpuset(cpuset) if core in self._load]
+                for core in cores:
+                    self._load[core] += 1
+                self._plans[owner] = cores
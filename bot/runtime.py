@@ -0,0 +1,131 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import gc
+import logging
+from typing import NamedTuple
+
+__all__ = "RuntimeProfile", "PROFILES", "get_profile", "install", "configure_loop", "freeze"
+
+_log = logging.getLogger(__name__)
+
+
+class RuntimeProfile(NamedTuple):
+    """
+    How the interpreter and the event loop are tuned.
+    """
+    name: str
+    uvloop: bool = False
+    """Whether to use uvloop for the event loop, if it is installed."""
+    eager_tasks: bool = False
+    """Whether tasks start running as soon as they are created, until they first suspend, instead of on the next
+    iteration of the loop. Tasks that finish without suspending never touch the loop at all."""
+    freeze_after_ready: bool = False
+    """Whether to move every object that exists once the bot is ready to the permanent generation, so the garbage
+    collector stops traversing the caches, commands and modules that live until shutdown."""
+    gc_thresholds: tuple[int, int, int] | None = None
+    """The thresholds of the garbage collector, or None to keep the defaults."""
+
+
+PROFILES = {
+    "default": RuntimeProfile("default"),
+    # Collect the youngest generation less often. The bot allocates many short-lived objects per gateway event, most
+    # of which are freed by reference counting, so frequent collections mostly find nothing
+    "fast": RuntimeProfile("fast", uvloop=True, eager_tasks=True, freeze_after_ready=True,
+                           gc_thresholds=(50_000, 20, 100)),
+}
+
+
+def get_profile(name: str) -> RuntimeProfile:
+    """
+    Looks up a profile by name, case-insensitively. Unknown names fall back to the default profile with a warning, so a
+    typo in the configuration doesn't keep the bot from starting.
+
+    Parameters
+    ----------
+    name: str
+        The name of the profile.
+
+    Returns
+    -------
+    RuntimeProfile
+        The profile.
+    """
+    if (profile := PROFILES.get(name.lower())) is None:
+        _log.warning("Unknown runtime profile %r, using the default. Valid profiles: %s", name, ", ".join(PROFILES))
+        profile = PROFILES["default"]
+    return profile
+
+
+def install(profile: RuntimeProfile) -> None:
+    """
+    Applies the parts of a profile that must be in place before the event loop is created.
+
+    Parameters
+    ----------
+    profile: RuntimeProfile
+        The profile.
+    """
+    if profile.gc_thresholds is not None:
+        gc.set_threshold(*profile.gc_thresholds)
+    if profile.uvloop:
+        try:
+            import uvloop  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            _log.warning("uvloop is not installed, using the default event loop")
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    _log.info("Using the %s runtime profile", profile.name)
+
+
+def configure_loop(profile: RuntimeProfile) -> None:
+    """
+    Applies the parts of a profile that configure the running event loop.
+
+    Parameters
+    ----------
+    profile: RuntimeProfile
+        The profile.
+    """
+    if profile.eager_tasks:
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+
+
+def freeze(profile: RuntimeProfile) -> int:
+    """
+    Moves every object that currently exists to the permanent generation, if the profile asks for it and nothing was
+    frozen yet. Meant to be called when startup is complete.
+
+    Parameters
+    ----------
+    profile: RuntimeProfile
+        The profile.
+
+    Returns
+    -------
+    int
+        The number of frozen objects.
+    """
+    if not profile.freeze_after_ready or gc.get_freeze_count():
+        return 0
+    # Collect first, so garbage from startup isn't kept alive forever
+    gc.collect()
+    gc.freeze()
+    frozen = gc.get_freeze_count()
+    _log.info("Froze %d objects after startup", frozen)
+    return frozen
@@ -0,0 +1,191 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import datetime
+import heapq
+import logging
+from typing import TYPE_CHECKING
+
+import discord
+from discord import HTTPException
+
+from .error import BaseError
+from .hunter import HunterConfig
+from .models import ScheduledSession, ScheduleState
+from .snowflake import Snowflake
+
+if TYPE_CHECKING:
+    from .core import Bot
+
+__all__ = ("Scheduler",)
+
+_log = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+    Starts scheduled sessions when they are due, from a single task.
+
+    Due times are kept in a min-heap, and the task sleeps until the earliest one, or until a job is added. Cancelled
+    jobs are left in the heap and skipped when they come up, since every job is reloaded from the database before it
+    runs. Jobs that come up more than ``grace`` late, e.g. because the bot was down, are marked as missed instead of
+    starting a session at an unexpected time. Due jobs run in their own tasks, since starting a session includes
+    waiting until hunter is ready, so lateness is always judged from when the job came up.
+
+    Parameters
+    ----------
+    bot: Bot
+        The bot.
+    grace: datetime.timedelta
+        How late a job may still start.
+    """
+
+    # Sleep at most this long at once, so changes to the wall clock are picked up
+    max_sleep = 60 * 60
+
+    def __init__(self, bot: "Bot", grace: datetime.timedelta = datetime.timedelta(minutes=15)) -> None:
+        self.bot = bot
+        self.grace = grace
+        self._heap: list[tuple[datetime.datetime, int]] = []
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._running: set[asyncio.Task[None]] = set()
+
+    async def start(self) -> None:
+        """Loads the pending jobs from the database and starts the scheduler task."""
+        self._heap = [(job.run_at, job.id) for job in await ScheduledSession.pending()]
+        heapq.heapify(self._heap)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    def stop(self) -> None:
+        """Stops the scheduler task."""
+        if self._task is not None:
+            self._task.cancel()
+
+    async def add(
+            self,
+            config: HunterConfig,
+            run_at: datetime.datetime,
+            created_by: int,
+            channel_id: int | None = None,
+    ) -> ScheduledSession:
+        """
+        Schedules a session.
+
+        Parameters
+        ----------
+        config: HunterConfig
+            The hunter configuration.
+        run_at: datetime.datetime
+            When to start the session. Must be timezone aware.
+        created_by: int
+            The ID of the user who scheduled the session.
+        channel_id: int | None
+            The ID of the channel to report to.
+
+        Returns
+        -------
+        ScheduledSession
+            The job.
+        """
+        job = await ScheduledSession.create(
+            id=int(Snowflake.new()),
+            config=config.to_dict(),
+            run_at=run_at,
+            created_by=created_by,
+            channel_id=channel_id,
+        )
+        heapq.heappush(self._heap, (run_at, job.id))
+        # The new job may be due before the one the task is sleeping for
+        self._wake.set()
+        return job
+
+    @staticmethod
+    async def cancel(job: ScheduledSession) -> None:
+        """
+        Cancels a pending job.
+
+        Parameters
+        ----------
+        job: ScheduledSession
+            The job.
+        """
+        await job.finish(ScheduleState.CANCELLED)
+
+    async def _loop(self) -> None:
+        while True:
+            self._wake.clear()
+            now = datetime.datetime.now(datetime.timezone.utc)
+            if self._heap and self._heap[0][0] <= now:
+                _, job_id = heapq.heappop(self._heap)
+                task = asyncio.create_task(self._run_job(job_id, now))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+                continue
+            timeout = self.max_sleep
+            if self._heap:
+                timeout = min((self._heap[0][0] - now).total_seconds(), timeout)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except TimeoutError:
+                pass
+
+    async def _run_job(self, job_id: int, now: datetime.datetime) -> None:
+        try:
+            await self._fire(job_id, now)
+        except Exception:  # pylint: disable=broad-except
+            _log.exception("Scheduled session %s failed", job_id)
+
+    async def _fire(self, job_id: int, now: datetime.datetime) -> None:
+        job = await ScheduledSession.get_or_none(id=job_id)
+        if job is None or job.state != ScheduleState.PENDING:
+            return
+        if now - job.run_at > self.grace:
+            await job.finish(ScheduleState.MISSED)
+            await self._notify(
+                job,
+                f"Scheduled session `{job.id}` was missed, it was due {discord.utils.format_dt(job.run_at, "R")}",
+            )
+            return
+        try:
+            config = HunterConfig(**job.config)
+            elapsed = await self.bot.lifecycle.run(config, job.created_by, job.channel_id)
+        except BaseError as e:
+            await job.finish(ScheduleState.FAILED, error=e.message)
+            await self._notify(job, f"Scheduled session `{job.id}` could not start: {e.message}")
+            return
+        except Exception as e:
+            # Don't leave the job pending forever
+            await job.finish(ScheduleState.FAILED, error=str(e) or type(e).__name__)
+            await self._notify(job, f"Scheduled session `{job.id}` could not start due to an unexpected error")
+            raise
+        await job.finish(ScheduleState.STARTED, session_id=self.bot.hunter.session_id)
+        await self._notify(
+            job,
+            f"<@{job.created_by}> Scheduled session `{job.id}` is up in `{config.scenario}`, "
+            f"ready after {elapsed:.0f}s",
+        )
+
+    async def _notify(self, job: ScheduledSession, message: str) -> None:
+        if job.channel_id is None:
+            return
+        try:
+            await self.bot.outbound.send(self.bot.get_partial_messageable(job.channel_id), message)
+        except HTTPException:
+            _log.warning("Failed to report scheduled session %s", job.id, exc_info=True)
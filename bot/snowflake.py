@@ -143,7 +143,7 @@ class Snowflake:
             The increment of the snowflake. This is a number incremented once for each object created during runtime on
             the current process.
         """
-        return cls(timestamp << 22 | worker_id << 17 | process_id << 12 | increment)
+        return cls(timestamp << 22 | (worker_id & 0x1F) << 17 | (process_id & 0x1F) << 12 | (increment & 0xFFF))
 
     @classmethod
     def new(cls) -> Self:
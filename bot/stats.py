@@ -0,0 +1,257 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import threading
+import time
+from array import array
+from typing import Any
+
+import docker.errors
+from docker.models.containers import Container
+from requests.exceptions import RequestException
+
+__all__ = "RingBuffer", "StatsSampler"
+
+_log = logging.getLogger(__name__)
+
+
+class RingBuffer:
+    """
+    A fixed-size ring buffer of floats, backed by an :class:`array.array`. Once full, the oldest value is overwritten.
+
+    Parameters
+    ----------
+    capacity: int
+        The maximum number of values to keep.
+    """
+    __slots__ = ("_data", "_index", "_count")
+
+    def __init__(self, capacity: int) -> None:
+        self._data = array("d", bytes(8 * capacity))
+        self._index = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def capacity(self) -> int:
+        """The maximum number of values the buffer can hold."""
+        return len(self._data)
+
+    def append(self, value: float) -> None:
+        """
+        Appends a value, overwriting the oldest value if the buffer is full.
+
+        Parameters
+        ----------
+        value: float
+            The value to append.
+        """
+        self._data[self._index] = value
+        self._index = (self._index + 1) % len(self._data)
+        self._count = min(self._count + 1, len(self._data))
+
+    def last(self) -> float | None:
+        """
+        Returns the most recently appended value.
+
+        Returns
+        -------
+        float | None
+            The newest value, or None if the buffer is empty.
+        """
+        if not self._count:
+            return None
+        return self._data[self._index - 1]
+
+    def values(self, n: int | None = None) -> list[float]:
+        """
+        Returns the stored values, oldest first.
+
+        Parameters
+        ----------
+        n: int | None
+            Only return the newest n values.
+
+        Returns
+        -------
+        list[float]
+            The stored values.
+        """
+        count = self._count if n is None else min(n, self._count)
+        start = self._index - count
+        if start >= 0:
+            return self._data[start:self._index].tolist()
+        return self._data[start:].tolist() + self._data[:self._index].tolist()
+
+    def clear(self) -> None:
+        """Empties the buffer."""
+        self._index = 0
+        self._count = 0
+
+
+class StatsSampler:
+    """
+    Samples resource usage of a container in the background from the Docker stats stream.
+
+    The stream is consumed on a daemon thread and decoded one sample at a time, so reading the current values never
+    makes a request to the Docker daemon. Docker emits roughly one sample per second, so ``capacity`` is also the
+    window in seconds that is kept in memory.
+
+    Parameters
+    ----------
+    capacity: int
+        The number of samples to keep for each metric.
+    """
+    metrics = "cpu_percent", "rss", "net_rx", "net_tx", "blk_read", "blk_write"
+
+    def __init__(self, capacity: int = 600) -> None:
+        self.buffers: dict[str, RingBuffer] = {metric: RingBuffer(capacity) for metric in self.metrics}
+        self.totals: dict[str, float] = {}
+        self.memory_limit: float | None = None
+        self.last_sample: float | None = None
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stop_event = threading.Event()
+        self._previous: dict[str, float] | None = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the sampler thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, container: Container) -> None:
+        """
+        Starts sampling a container, replacing any previous sampler thread. Buffers are cleared.
+
+        Parameters
+        ----------
+        container: Container
+            The container to sample.
+        """
+        self.stop()
+        with self._lock:
+            for buffer in self.buffers.values():
+                buffer.clear()
+            self.totals = {}
+            self._previous = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(container, self._stop_event),
+            name=f"stats-{container.name}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops sampling. The thread exits after the next sample arrives or when the stream ends.
+        """
+        self._stop_event.set()
+        self._thread = None
+
+    def _run(self, container: Container, stop_event: threading.Event) -> None:
+        try:
+            for raw in container.stats(stream=True, decode=True):
+                if stop_event.is_set():
+                    break
+                self.ingest(raw)
+        except (docker.errors.APIError, RequestException):
+            _log.warning("Stats stream for %s ended unexpectedly", container.name, exc_info=True)
+
+    def ingest(self, raw: dict[str, Any]) -> None:
+        """
+        Decodes a single sample from the Docker stats stream and appends it to the buffers.
+
+        Parameters
+        ----------
+        raw: dict[str, Any]
+            A decoded stats object, as returned by the Docker engine.
+        """
+        cpu = raw.get("cpu_stats") or {}
+        precpu = raw.get("precpu_stats") or {}
+        cpu_delta = cpu.get("cpu_usage", {}).get("total_usage", 0) - precpu.get("cpu_usage", {}).get("total_usage", 0)
+        system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+        online_cpus = cpu.get("online_cpus") or len(cpu.get("cpu_usage", {}).get("percpu_usage") or ()) or 1
+        cpu_percent = cpu_delta / system_delta * online_cpus * 100 if system_delta > 0 and cpu_delta > 0 else 0.0
+
+        memory = raw.get("memory_stats") or {}
+        memory_detail = memory.get("stats") or {}
+        if "anon" in memory_detail:  # cgroup v2
+            rss = memory_detail["anon"]
+        elif "rss" in memory_detail:  # cgroup v1
+            rss = memory_detail["rss"]
+        else:
+            rss = memory.get("usage", 0) - memory_detail.get("inactive_file", memory_detail.get("cache", 0))
+
+        totals = {"net_rx": 0.0, "net_tx": 0.0, "blk_read": 0.0, "blk_write": 0.0}
+        for network in (raw.get("networks") or {}).values():
+            totals["net_rx"] += network.get("rx_bytes", 0)
+            totals["net_tx"] += network.get("tx_bytes", 0)
+        for entry in (raw.get("blkio_stats") or {}).get("io_service_bytes_recursive") or ():
+            match entry.get("op", "").casefold():
+                case "read":
+                    totals["blk_read"] += entry.get("value", 0)
+                case "write":
+                    totals["blk_write"] += entry.get("value", 0)
+
+        now = time.monotonic()
+        with self._lock:
+            self.buffers["cpu_percent"].append(cpu_percent)
+            self.buffers["rss"].append(rss)
+            # Network and block I/O are cumulative counters, so store them as rates in bytes per second
+            if self._previous is not None and (elapsed := now - self._previous["time"]) > 0:
+                for key, value in totals.items():
+                    self.buffers[key].append(max(value - self._previous[key], 0) / elapsed)
+            self._previous = totals | {"time": now}
+            self.totals = totals
+            self.memory_limit = memory.get("limit")
+            self.last_sample = now
+
+    def current(self) -> dict[str, float | None]:
+        """
+        Returns the newest value of each metric.
+
+        Returns
+        -------
+        dict[str, float | None]
+            The newest value of each metric, or None for metrics that have no samples yet.
+        """
+        with self._lock:
+            return {metric: buffer.last() for metric, buffer in self.buffers.items()}
+
+    def history(self, metric: str, seconds: int | None = None) -> list[float]:
+        """
+        Returns the recorded values of a metric, oldest first.
+
+        Parameters
+        ----------
+        metric: str
+            The metric to get. One of :attr:`metrics`.
+        seconds: int | None
+            Only return the values from roughly the last this many seconds.
+
+        Returns
+        -------
+        list[float]
+            The recorded values.
+        """
+        with self._lock:
+            return self.buffers[metric].values(seconds)
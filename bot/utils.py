@@ -23,7 +23,7 @@ from collections.abc import Sequence
 
 import discord
 
-__all__ = "var_to_title", "Timer", "humanize_sequence", "paginate_string", "embed", "error_embed"
+__all__ = "var_to_title", "Timer", "humanize_sequence", "paginate_string", "sparkline", "embed", "error_embed"
 
 
 class Timer:
@@ -156,6 +156,48 @@ def humanize_sequence(seq: Sequence[str]) -> str:
     return ", ".join(seq[:-1]) + ", and " + seq[-1]
 
 
+def sparkline(
+        values: Sequence[float],
+        width: int = 24,
+        minimum: float | None = None,
+        maximum: float | None = None,
+) -> str:
+    """
+    Renders a sequence of values as a compact unicode sparkline. If there are more values than fit in the width, they
+    are averaged into equally sized buckets.
+
+    Parameters
+    ----------
+    values: Sequence[float]
+        The values to render, oldest first.
+    width: int
+        The maximum number of characters in the sparkline.
+    minimum: float | None
+        The value of the lowest bar. Defaults to the smallest value.
+    maximum: float | None
+        The value of the highest bar. Defaults to the largest value.
+
+    Returns
+    -------
+    str
+        The sparkline.
+    """
+    bars = "▁▂▃▄▅▆▇█"
+    if not values:
+        return ""
+    if len(values) > width:
+        step = len(values) / width
+        values = [
+            sum(bucket) / len(bucket)
+            for i in range(width)
+            if (bucket := values[round(i * step):round((i + 1) * step)])
+        ]
+    low = min(values) if minimum is None else minimum
+    high = max(values) if maximum is None else maximum
+    scale = (len(bars) - 1) / (high - low) if high > low else 0
+    return "".join(bars[min(max(round((value - low) * scale), 0), len(bars) - 1)] for value in values)
+
+
 def embed(**kwargs) -> discord.Embed:
     kwargs.setdefault("color", discord.Color.blurple())
     return discord.Embed(**kwargs)
@@ -22,23 +22,34 @@ import time
 from itertools import batched
 
 import discord
-from discord import ApplicationContext, Intents, option
+from discord import ApplicationContext, option
 from discord.ext.pages import Paginator
 
 from bot.core import Bot
 from dotenv import load_dotenv
 
+from bot.gateway import gateway_options
 from bot.hunter import Hunter
+from bot.log import setup_logging
 from bot.prefix import get_prefix
+from bot.runtime import get_profile, install as install_runtime
 
 load_dotenv()
 
-logging.basicConfig(
-    format='%(asctime)s:%(levelname)s:%(name)s:%(message)s',
-    level=logging.INFO,
+setup_logging(
+    level=logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper()),
+    json_lines=os.getenv("LOG_FORMAT", "text").lower() == "json",
 )
 
-intents = Intents.all()
+runtime = get_profile(os.getenv("BOT_RUNTIME_PROFILE", "default"))
+# Must happen before the bot creates its event loop
+install_runtime(runtime)
+
+# BOT_GATEWAY_MODE=lean only subscribes to and caches what the bot uses, see gateway_options
+gateway = gateway_options(
+    lean=os.getenv("BOT_GATEWAY_MODE", "full").lower() == "lean",
+    max_messages=int(os.getenv("BOT_MAX_MESSAGES", 0)) or None,
+)
 # bot = Bot(
 #     command_prefix="!",
 #     intents=intents,
@@ -48,7 +59,10 @@ bot = Bot(
     command_prefix=get_prefix,
     description="hunter-bot - A discord bot for hunter written in pycord",
     debug_guilds=None,  # TODO: Remove
-    intents=intents,
+    **gateway,
+    runtime=runtime,
+    # Commands are registered by Bot.sync_command_tree, only when they change
+    auto_sync_commands=False,
     strip_after_prefix=True,
     allowed_mentions=discord.AllowedMentions(everyone=False, users=True, roles=False),
     activity=Bot.pick_activity(),
@@ -58,12 +72,6 @@ bot = Bot(
 bot.load_all_extensions()
 
 
-@bot.event
-async def on_connect():
-    # Override the default on_connect so it won't sync commands.
-    pass
-
-
 if __name__ == "__main__":
     with open(os.getenv("BOT_TOKEN_FILE"), "r") as f:
         bot.run(f.read().strip())
@@ -0,0 +1,71 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import unittest
+from types import SimpleNamespace
+
+import discord
+
+from bot.core import Bot
+
+
+class _Store(SimpleNamespace):
+    def save(self):
+        pass
+
+
+class _Bot(discord.Bot):
+    command_tree_hash = Bot.command_tree_hash
+    sync_command_tree = Bot.sync_command_tree
+    _map_command_ids = Bot._map_command_ids
+    on_connect = Bot.on_connect
+
+
+class CommandSyncTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.bot = _Bot(auto_sync_commands=False)
+        group = self.bot.create_group("hunter", "Hunter commands")
+
+        @group.command()
+        async def status(ctx):
+            pass
+
+        @self.bot.slash_command()
+        async def ping(ctx):
+            pass
+
+        self.bot._connection.application_id = 1
+        self.bot.hunter = SimpleNamespace(persistent_store=_Store(command_tree_hash=self.bot.command_tree_hash()))
+        self.calls = []
+
+        async def get_global_commands(application_id):
+            self.calls.append(application_id)
+            return [{"id": "11", "name": "hunter", "type": 1}, {"id": "12", "name": "ping", "type": 1}]
+
+        self.bot.http.get_global_commands = get_global_commands
+
+    async def test_unchanged_tree_maps_ids_once(self):
+        await self.bot.on_connect()
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(set(self.bot._application_commands), {"11", "12"})
+        # A reconnect makes no requests
+        await self.bot.on_connect()
+        self.assertEqual(self.calls, [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from bot.hunter import Hunter
+from bot.idle import IdleMonitor
+from bot.log_archive import LogArchiveStore
+from bot.log_search import InvertedIndex
+from bot.logs import EventStore, LogLine
+
+
+class RestartDuringSessionTest(unittest.TestCase):
+    def test_clients_survive_a_bot_restart(self):
+        with tempfile.TemporaryDirectory() as root:
+            # The bot archived the session before it restarted
+            store = LogArchiveStore(root)
+            writer = store.begin("1")
+            for number, text in enumerate((
+                    "Loaded scenario nevada",
+                    "Pilot VIPER1 connected",
+                    "Pilot VIPER2 connected",
+                    "Pilot VIPER1 disconnected",
+            )):
+                writer.append(LogLine(number, float(number), text))
+            writer.flush()
+
+            # A restarted bot resumes the session from its archive
+            hunter = Hunter.__new__(Hunter)
+            hunter.events = EventStore()
+            hunter.search_index = InvertedIndex()
+            hunter._replay(store.open("1"))
+            monitor = IdleMonitor(SimpleNamespace(hunter=SimpleNamespace(session_id=1, events=hunter.events)))
+
+            self.assertEqual(monitor.clients, {"VIPER2"})
+            # Events the follower adds after resuming still reach the monitor
+            hunter.events.add(next(iter(hunter.events.find(subject="VIPER1")))._replace(line=4))
+            self.assertEqual(monitor.clients, {"VIPER1", "VIPER2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import unittest
+
+from bot.log import fingerprint
+
+
+class FingerprintTest(unittest.TestCase):
+    def test_cyclic_chain(self):
+        try:
+            try:
+                raise ValueError("first")
+            except ValueError as first:
+                try:
+                    raise KeyError("second") from first
+                except KeyError as second:
+                    first.__cause__ = second
+                    raise first
+        except ValueError as e:
+            exc = e
+        name, _, (cause_name, _, cause) = fingerprint(exc)
+        self.assertEqual((name, cause_name, cause), ("ValueError", "KeyError", None))
+
+    def test_message_is_ignored(self):
+        fingerprints = []
+        for message in ("a", "b"):
+            try:
+                raise RuntimeError(message)
+            except RuntimeError as e:
+                fingerprints.append(fingerprint(e))
+        self.assertEqual(fingerprints[0], fingerprints[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
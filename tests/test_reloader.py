@@ -0,0 +1,54 @@
+"""
+hunter-bot - A discord bot for hunter written in pycord
+Copyright (C) 2024  BobDotCom
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from bot.hunter import Hunter, HunterConfig
+from bot.persistent_store import PersistentStore
+from bot.reloader import Reloader
+
+
+class ReloadTest(unittest.IsolatedAsyncioTestCase):
+    async def test_reload_keeps_the_persistent_store_saveable(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "store")
+            store = PersistentStore(path, ["config"])
+            store.config = HunterConfig(scenario="nevada")
+            store.save()
+            hunter = Hunter.__new__(Hunter)
+            hunter.persistent_store = store
+            reloader = Reloader(SimpleNamespace(hunter=hunter, extensions={}))
+
+            # Pretend bot.hunter changed on disk
+            reloader._hashes["bot.hunter"] = ""
+            result = await reloader.reload()
+
+            self.assertIsNone(result.error)
+            self.assertIn("bot.hunter", result.reloaded)
+            new_hunter = sys.modules["bot.hunter"]
+            self.assertIs(type(hunter), new_hunter.Hunter)
+            self.assertIs(type(store.config), new_hunter.HunterConfig)
+            store.save()
+            self.assertEqual(PersistentStore(path, ["config"]).config.scenario, "nevada")
+
+
+if __name__ == "__main__":
+    unittest.main()